@@ -5,7 +5,8 @@ import os
 import re
 import sys
 import json
-import shutil
+import queue
+import socket
 import webbrowser
 import subprocess
 
@@ -18,11 +19,14 @@ from PyQt5.QtCore import QThread, Qt
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QInputDialog
 
 import worker
-import worker_splitting
 import worker_progress
+import worker_splitting
 import worker_framecount
 import worker_scene
 import worker_audio
+import worker_index
+import commands
+import engine
 
 import psutil
 
@@ -33,6 +37,8 @@ class neav1e(QtWidgets.QMainWindow):
 
     encode_started = False
     encode_paused = False
+    splitting_finished = False
+    framecount_finished = False
 
     null_path = os.devnull
 
@@ -43,39 +49,31 @@ class neav1e(QtWidgets.QMainWindow):
     ffprobe_path = "ffprobe"
 
     audio_encoding = False
+    audio_finished = True
+    audio_success = True
+    audio_progress = 0
+    audio_encode = None
+    video_finished = False
+
+    job = None
+    # Chunks of the running scene detection, see encode_pool.encode_live()
+    live_queue = None
+    # Chunks which failed, the output isn't muxed and the temp files are kept for resuming
+    failed_chunks = []
+    # Error of the scene detection, the encode stops after the chunks found until then
+    splitting_error = None
 
-    video_queue_first_pass = []
-    video_queue_second_pass = []
-
-    encoder_settings = None
-    encoder_output = None
-    encoder_output_stats = None
-    encoder_passes = None
-    encoder_pass_one = None
-    encoder_pass_two = None
-    pipe_color_fmt = None
-    filter_command = None
     total_frame_count = 0
+    encode_fps = 0.0
+    progress_socket = None
 
     current_dir = os.path.dirname(os.path.abspath(__file__))
     tempDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Temp")
     temp_dir_file_name = None
     recommended_worker_count = None
 
-    # FFmpeg expects ISO 639-2 codes for languages https://en.wikipedia.org/wiki/List_of_ISO_639-2_codes
     # ComboBoxes will be filled with this dictionary
-    audioLanguageDictionary = {
-        "English":      "eng", "Bosnian":       "bos", "Bulgarian":     "bul", "Chinese":       "chi",
-        "Czech":        "cze", "Greek":         "gre", "Estonian":      "est", "Persian":       "per",
-        "Filipino":     "fil", "Finnish":       "fin", "French":        "fre", "Georgian":      "geo",
-        "German":       "ger", "Croatian":      "hrv", "Hungarian":     "hun", "Indonesian":    "ind",
-        "Icelandic":    "ice", "Italian":       "ita", "Japanese":      "jpn", "Korean":        "kor",
-        "Latin":        "lat", "Latvian":       "lav", "Lithuanian":    "lit", "Dutch":         "nld",
-        "Norwegian":    "nob", "Polish":        "pol", "Portuguese":    "por", "Russian":       "rus",
-        "Slovak":       "slk", "Slovenian":     "slv", "Spanish":       "spa", "Serbian":       "srp",
-        "Swedish":      "swe", "Thai":          "tha", "Turkish":       "tur", "Ukrainian":     "ukr",
-        "Vietnamese":   "vie"
-        }
+    audioLanguageDictionary = commands.AUDIO_LANGUAGES
 
     def __init__(self):
         super(neav1e, self).__init__()
@@ -95,7 +93,7 @@ class neav1e(QtWidgets.QMainWindow):
 
         # Controls Splitting
         self.comboBoxSplittingMethod.currentIndexChanged.connect(self.splitting_ui)
-        self.checkBoxSplittingReencode.stateChanged.connect(self.splitting_reencode)
+        self.checkBoxSplittingLossless.stateChanged.connect(self.splitting_lossless)
 
         self.horizontalSliderQ.valueChanged.connect(self.set_q_slider_value)
         self.horizontalSliderEncoderSpeed.valueChanged.connect(self.set_speed_slider_value)
@@ -109,6 +107,7 @@ class neav1e(QtWidgets.QMainWindow):
         self.radioButtonVBR.toggled.connect(self.toggle_vbr_q)
         self.checkBoxAdvancedSettings.stateChanged.connect(self.toggle_advanced_settings)
         self.checkBoxAomencDenoise.stateChanged.connect(self.toggle_aomenc_denoise)
+        self.checkBoxWorkerAdaptive.stateChanged.connect(self.toggle_adaptive_workers)
         self.checkBoxRav1eContentLight.stateChanged.connect(self.toggle_rav1e_content_light)
 
         # Custom Settings
@@ -118,6 +117,8 @@ class neav1e(QtWidgets.QMainWindow):
         self.checkBoxDeleteTempFiles.stateChanged.connect(self.save_preferences)
         self.checkBoxPixelAutoDetect.stateChanged.connect(self.save_preferences)
         self.checkBoxLogging.stateChanged.connect(self.save_preferences)
+        self.checkBoxProgressSocket.stateChanged.connect(self.save_preferences)
+        self.checkBoxIncrementalMux.stateChanged.connect(self.save_preferences)
         self.pushButtonGithub.clicked.connect(self.open_github)
         self.pushButtonDiscord.clicked.connect(self.open_discord)
         self.pushButtonPayPal.clicked.connect(self.open_paypal)
@@ -134,6 +135,11 @@ class neav1e(QtWidgets.QMainWindow):
         # !!! CHANGE IN UI FILE !!!
         self.doubleSpinBoxFFmpegSceneThreshold.hide()
         self.labelSplittingThreshold.hide()
+        self.comboBoxSceneAnalysis.hide()
+        self.labelSceneAnalysis.hide()
+        self.labelSceneLength.hide()
+        self.spinBoxSceneMin.hide()
+        self.spinBoxSceneMax.hide()
         self.groupBoxAom.show()
         self.groupBoxRav1e.hide()
         self.groupBoxSvtav1.hide()
@@ -145,6 +151,7 @@ class neav1e(QtWidgets.QMainWindow):
             self.comboBoxWorkerCount.addItem(str(i))
         self.comboBoxWorkerCount.setCurrentIndex(int((psutil.cpu_count(logical = False) - 1) * 0.75))
         self.recommended_worker_count = int((psutil.cpu_count(logical = False) - 1) * 0.75)
+        self.spinBoxWorkerMax.setValue(psutil.cpu_count(logical = False))
 
         self.fill_audio_language()
 
@@ -176,22 +183,12 @@ class neav1e(QtWidgets.QMainWindow):
     #  ═════════════════════════════════════════ Audio ════════════════════════════════════════
 
     def encode_audio(self):
-        command = ""
-        if self.groupBoxTrackOne.isChecked():
-            command += self.audio_cmd_generator("0", self.comboBoxTrackOneCodec.currentText(), str(self.spinBoxTrackOneBitrate.value()), self.switch_audio_channel_layout(str(self.comboBoxTrackOneLayout.currentIndex())), self.switch_audio_language(self.comboBoxTrackOneLanguage.currentText()))
-        if self.groupBoxTrackTwo.isChecked():
-            command += self.audio_cmd_generator("1", self.comboBoxTrackTwoCodec.currentText(), str(self.spinBoxTrackTwoBitrate.value()), self.switch_audio_channel_layout(str(self.comboBoxTrackTwoLayout.currentIndex())), self.switch_audio_language(self.comboBoxTrackTwoLanguage.currentText()))
-        if self.groupBoxTrackThree.isChecked():
-            command += self.audio_cmd_generator("2", self.comboBoxTrackThreeCodec.currentText(), str(self.spinBoxTrackThreeBitrate.value()), self.switch_audio_channel_layout(str(self.comboBoxTrackThreeLayout.currentIndex())), self.switch_audio_language(self.comboBoxTrackThreeLanguage.currentText()))
-        if self.groupBoxTrackThree.isChecked():
-            command += self.audio_cmd_generator("3", self.comboBoxTrackFourCodec.currentText(), str(self.spinBoxTrackFourBitrate.value()), self.switch_audio_channel_layout(str(self.comboBoxTrackFourLayout.currentIndex())), self.switch_audio_language(self.comboBoxTrackFourLanguage.currentText()))
-        command += " -af aformat=channel_layouts=" + '\u0022' + "7.1|5.1|stereo|mono" + '\u0022'
-        self.save_to_log(command)
-        if self.groupBoxTrackOne.isChecked() or self.groupBoxTrackTwo.isChecked() or self.groupBoxTrackThree.isChecked() or self.groupBoxTrackThree.isChecked():
-            out_path = Path(os.path.join(self.tempDir, self.temp_dir_file_name, "Audio"))
-            out_path.mkdir(parents=True, exist_ok=True)
-            audio_output = os.path.join(self.tempDir, self.temp_dir_file_name, "Audio", "audio.mkv")
+        # Every track is encoded in its own process, next to splitting and video encoding
+        self.audio_encode = self.job.start_audio()
+        self.audio_progress = 0
+        if self.audio_encode is not None:
             self.audio_encoding = True
+            self.audio_finished = False
             # Create a QThread object
             self.thread_encode_audio = QThread()
             # Create a worker object
@@ -199,56 +196,27 @@ class neav1e(QtWidgets.QMainWindow):
             # Move worker to the thread
             self.worker_encode_audio.moveToThread(self.thread_encode_audio)
             # Connect signals and slots
-            self.thread_encode_audio.started.connect(partial(self.worker_encode_audio.run, self.video_input, command, audio_output, self.ffmpeg_path))
+            self.thread_encode_audio.started.connect(partial(self.worker_encode_audio.run, self.audio_encode, self.job.get_duration))
+            self.worker_encode_audio.progress.connect(self.report_audio_progress)
             self.worker_encode_audio.finished.connect(self.thread_encode_audio.quit)
-            self.worker_encode_audio.finished.connect(self.splitting)
+            self.worker_encode_audio.finished.connect(self.audio_encode_finished)
             self.worker_encode_audio.finished.connect(self.worker_encode_audio.deleteLater)
             self.thread_encode_audio.finished.connect(self.thread_encode_audio.deleteLater)
             # Start the thread
             self.thread_encode_audio.start()
         else:
             self.audio_encoding = False
-            self.splitting()
-
-    def audio_cmd_generator(self, activetrackindex, audiocodec, activetrackbitrate, channellayout, lang):
-        # Audio Mapping
-        audio = '-map 0:a:' + activetrackindex + ' -c:a:' + activetrackindex
-        # Codec
-        audio += self.switch_audio_codec(audiocodec)
-        # Channel Layout / Bitrate
-        audio += ' -b:a:' + activetrackindex + ' ' + activetrackbitrate + 'k'
-        audio += ' -ac:a:' + activetrackindex + ' ' + channellayout
-        # Metadata
-        audio += ' -metadata:s:a:' + activetrackindex + ' language=' + lang
-        audio += ' -metadata:s:a:' + activetrackindex + ' title=' + '\u0022' + '[' + lang.upper() + '] ' + audiocodec + ' ' + activetrackbitrate + 'kbps' + '\u0022'
-        return audio
-
-    def switch_audio_language(self, lang):
-        return self.audioLanguageDictionary[lang]
-
-    def switch_audio_codec(self, codec):
-        value = ""
-        if codec == "Opus":
-            value = ' libopus'
-        elif codec == "AC3":
-            value = ' ac3'
-        elif codec == "AAC":
-            value = ' aac'
-        elif codec == "MP3":
-            value = ' libmp3lame'
-        return value
-
-    def switch_audio_channel_layout(self, layout):
-        value = ""
-        if layout == "0":
-            value = '1'
-        elif layout == "1":
-            value = '2'
-        elif layout == "3":
-            value = '6'
-        elif layout == "4":
-            value = '8'
-        return value
+            self.audio_finished = True
+        self.index_source()
+
+    def report_audio_progress(self, signal):
+        self.audio_progress = signal
+
+    def audio_encode_finished(self, success):
+        self.audio_finished = True
+        self.audio_success = success
+        self.save_to_log("Audio " + ("finished" if success else "failed"))
+        self.start_muxing()
 
     def ffprobe_audio_detect(self):
         cmd = '\u0022' + self.ffprobe_path + '\u0022' + " -i " + '\u0022' + self.video_input + '\u0022' + " -loglevel error -select_streams a -show_entries stream=index -of csv=p=1"
@@ -400,8 +368,7 @@ class neav1e(QtWidgets.QMainWindow):
             self.groupBoxAom.setEnabled(False)
             self.groupBoxRav1e.setEnabled(False)
             self.groupBoxSvtav1.setEnabled(False)
-            self.set_encoder_settings()
-            self.textEditCustomSettings.setPlainText(self.encoder_settings)
+            self.textEditCustomSettings.setPlainText(self.get_encoder_command())
         else:
             self.groupBoxAom.setEnabled(True)
             self.groupBoxRav1e.setEnabled(True)
@@ -411,6 +378,10 @@ class neav1e(QtWidgets.QMainWindow):
         self.spinBoxRav1eCll.setEnabled(self.checkBoxRav1eContentLight.isChecked() is True)
         self.spinBoxRav1eFall.setEnabled(self.checkBoxRav1eContentLight.isChecked() is True)
 
+    def toggle_adaptive_workers(self):
+        self.spinBoxWorkerMin.setEnabled(self.checkBoxWorkerAdaptive.isChecked() is True)
+        self.spinBoxWorkerMax.setEnabled(self.checkBoxWorkerAdaptive.isChecked() is True)
+
     def toggle_aomenc_denoise(self):
         self.spinBoxAomencDenoise.setEnabled(self.checkBoxAomencDenoise.isChecked() is True)
 
@@ -476,7 +447,15 @@ class neav1e(QtWidgets.QMainWindow):
 
     def report_progress(self, signal):
         self.progressBar.setValue(signal)
-        self.labelStatus.setText("Status: " + str(signal) + " / " + str(self.total_frame_count) + " Frames")
+        status = "Status: " + str(signal) + " / " + str(self.total_frame_count) + " Frames"
+        if self.encode_fps > 0:
+            status += " - " + str(round(self.encode_fps, 1)) + " fps"
+        if self.audio_encoding and not self.audio_finished:
+            status += " - Audio " + str(self.audio_progress) + "%"
+        self.labelStatus.setText(status)
+
+    def report_speed(self, signal):
+        self.encode_fps = signal
 
     def set_q_slider_value(self):
         self.labelQ.setText(str(self.horizontalSliderQ.value()))
@@ -485,28 +464,35 @@ class neav1e(QtWidgets.QMainWindow):
         self.labelSpeed.setText(str(self.horizontalSliderEncoderSpeed.value()))
         self.labelSummarySpeed.setText(str(self.horizontalSliderEncoderSpeed.value()))
 
-    def splitting_reencode(self):
-        if self.checkBoxSplittingReencode.isChecked() is True:
-            self.comboBoxSplittingReencode.setEnabled(True)
-        else:
-            self.comboBoxSplittingReencode.setEnabled(False)
+    def splitting_lossless(self):
+        self.comboBoxSplittingLossless.setEnabled(self.checkBoxSplittingLossless.isChecked())
 
     def splitting_ui(self):
         index = self.comboBoxSplittingMethod.currentIndex()
         if index == 0: # FFmpeg Scene Detection
             self.doubleSpinBoxFFmpegSceneThreshold.show()
             self.labelSplittingThreshold.show()
+            self.comboBoxSceneAnalysis.show()
+            self.labelSceneAnalysis.show()
+            self.labelSceneLength.show()
+            self.spinBoxSceneMin.show()
+            self.spinBoxSceneMax.show()
             self.labelSplittingChunkLength.hide()
             self.spinBoxChunking.hide()
-            self.checkBoxSplittingReencode.hide()
-            self.comboBoxSplittingReencode.hide()
+            self.checkBoxSplittingLossless.hide()
+            self.comboBoxSplittingLossless.hide()
         elif index == 1: # Equal Chunking
             self.doubleSpinBoxFFmpegSceneThreshold.hide()
             self.labelSplittingThreshold.hide()
+            self.comboBoxSceneAnalysis.hide()
+            self.labelSceneAnalysis.hide()
+            self.labelSceneLength.hide()
+            self.spinBoxSceneMin.hide()
+            self.spinBoxSceneMax.hide()
             self.labelSplittingChunkLength.show()
             self.spinBoxChunking.show()
-            self.checkBoxSplittingReencode.show()
-            self.comboBoxSplittingReencode.show()
+            self.checkBoxSplittingLossless.show()
+            self.comboBoxSplittingLossless.show()
 
     def open_video_source(self):
         fname, _ = QFileDialog.getOpenFileName(self, 'Select Video File', '',"Video files (*.mp4 *.mkv *.flv *.mov)")
@@ -546,9 +532,12 @@ class neav1e(QtWidgets.QMainWindow):
                 for p in data['settings']:
                     self.comboBoxSplittingMethod.setCurrentIndex(p['splitting_method'])
                     self.doubleSpinBoxFFmpegSceneThreshold.setValue(p['splitting_scene_threshold'])
+                    self.comboBoxSceneAnalysis.setCurrentIndex(p.get('splitting_scene_analysis', 0))
+                    self.spinBoxSceneMin.setValue(p.get('splitting_scene_min', 0))
+                    self.spinBoxSceneMax.setValue(p.get('splitting_scene_max', 0))
                     self.spinBoxChunking.setValue(p['splitting_chunking_length'])
-                    self.checkBoxSplittingReencode.setChecked(p['splitting_chunking_reencode'])
-                    self.comboBoxSplittingReencode.setCurrentIndex(p['splitting_chunking_codec'])
+                    self.checkBoxSplittingLossless.setChecked(p.get('splitting_chunking_lossless', False))
+                    self.comboBoxSplittingLossless.setCurrentIndex(p.get('splitting_chunking_codec', 0))
                     self.comboBoxEncoder.setCurrentIndex(p['video_encoder'])
                     self.comboBoxBitDepth.setCurrentIndex(p['video_bit_depth'])
                     self.comboBoxColorFormat.setCurrentIndex(p['video_color_fmt'])
@@ -560,6 +549,11 @@ class neav1e(QtWidgets.QMainWindow):
                     self.horizontalSliderQ.setValue(p['video_q_amount'])
                     self.spinBoxVBR.setValue(p['video_vbr_amount'])
                     self.comboBoxWorkerCount.setCurrentIndex(p['worker_count'])
+                    self.checkBoxWorkerAdaptive.setChecked(p.get('worker_adaptive', False))
+                    self.spinBoxWorkerMin.setValue(p.get('worker_min', 1))
+                    self.spinBoxWorkerMax.setValue(p.get('worker_max', psutil.cpu_count(logical = False)))
+                    self.checkBoxWorkerPinning.setChecked(p.get('worker_pinning', False))
+                    self.checkBoxWorkerTailSplit.setChecked(p.get('worker_tail_split', False))
                 for p in data['filters']:
                     self.groupBoxCrop.setChecked(p['filters_crop'])
                     self.spinBoxFilterCropTop.setValue(p['filters_crop_top'])
@@ -607,11 +601,52 @@ class neav1e(QtWidgets.QMainWindow):
                     self.groupBoxTrackFour.setEnabled(False)
                     self.groupBoxTrackFour.setChecked(False)
 
-                if self.checkBoxAdvancedSettings.isChecked():
-                    for p in data['advanced_settings']:
+                custom = self.checkBoxAdvancedSettings.isChecked()
+                for p in data['settings']:
+                    # Presets without the key stored the command line in advanced mode
+                    custom = p.get('video_custom', custom)
+                if not custom:
+                    self.groupBoxCustomSettings.setChecked(False)
+                for p in data.get('advanced_settings', []):
+                    if 'aomenc_threads' in p:
+                        self.load_advanced_settings(p)
+                    if custom and 'command_line' in p:
                         self.groupBoxCustomSettings.setChecked(True)
                         self.textEditCustomSettings.setPlainText(p['command_line'])
 
+    def load_advanced_settings(self, p):
+        self.comboBoxAomencThreads.setCurrentIndex(p['aomenc_threads'])
+        self.comboBoxAomencTileRows.setCurrentIndex(p['aomenc_tile_rows'])
+        self.comboBoxAomencTileCols.setCurrentIndex(p['aomenc_tile_cols'])
+        self.spinBoxAomencGOP.setValue(p['aomenc_gop'])
+        self.spinBoxAomencLagInFrames.setValue(p['aomenc_lag_in_frames'])
+        self.comboBoxAomencTune.setCurrentText(p['aomenc_tune'])
+        self.comboBoxAomencAQMode.setCurrentIndex(p['aomenc_aq_mode'])
+        self.comboBoxAomencColorPrimaries.setCurrentText(p['aomenc_color_primaries'])
+        self.comboBoxAomencColorTransfer.setCurrentText(p['aomenc_color_transfer'])
+        self.comboBoxAomencColorMatrix.setCurrentText(p['aomenc_color_matrix'])
+        self.checkBoxAomencDenoise.setChecked(p['aomenc_denoise'])
+        self.spinBoxAomencDenoise.setValue(p['aomenc_denoise_level'])
+        self.comboBoxRav1eThreads.setCurrentIndex(p['rav1e_threads'])
+        self.comboBoxRav1eTileRows.setCurrentIndex(p['rav1e_tile_rows'])
+        self.comboBoxRav1eTileCols.setCurrentIndex(p['rav1e_tile_cols'])
+        self.spinBoxRav1eGOP.setValue(p['rav1e_gop'])
+        self.comboBoxRav1eRange.setCurrentText(p['rav1e_range'])
+        self.comboBoxRav1eColorPrimaries.setCurrentText(p['rav1e_color_primaries'])
+        self.comboBoxRav1eColorTransfer.setCurrentText(p['rav1e_color_transfer'])
+        self.comboBoxRav1eColorMatrix.setCurrentText(p['rav1e_color_matrix'])
+        self.comboBoxRav1eTune.setCurrentText(p['rav1e_tune'])
+        self.checkBoxRav1eContentLight.setChecked(p['rav1e_content_light'])
+        self.spinBoxRav1eCll.setValue(p['rav1e_cll'])
+        self.spinBoxRav1eFall.setValue(p['rav1e_fall'])
+        self.groupBoxRav1eMastering.setChecked(p['rav1e_mastering'])
+        for spin_box, value in zip(self.get_rav1e_mastering_spin_boxes(), p['rav1e_mastering_display']):
+            spin_box.setValue(value)
+        self.comboBoxSvtTileCols.setCurrentIndex(p['svt_tile_cols'])
+        self.comboBoxSvtTileRows.setCurrentIndex(p['svt_tile_rows'])
+        self.spinBoxSvtGOP.setValue(p['svt_gop'])
+        self.comboBoxSvtAQ.setCurrentIndex(p['svt_aq'])
+
     def delete_preset(self):
         if os.path.isfile(os.path.join(self.current_dir, 'Presets', self.comboBoxPresets.currentText() + '.json')):
             os.remove(os.path.join(self.current_dir, 'Presets', self.comboBoxPresets.currentText() + '.json'))
@@ -630,21 +665,40 @@ class neav1e(QtWidgets.QMainWindow):
         out_path = Path(os.path.join(self.current_dir, "Presets"))
         out_path.mkdir(parents=True, exist_ok=True)
 
+        save_data = self.get_preset_data()
+
+        # Save JSON
+        with open(os.path.join(self.current_dir, 'Presets', preset_name + ".json"), 'w') as outfile:
+            json.dump(save_data, outfile)
+        self.comboBoxPresets.clear()
+        self.load_preset_startup()
+
+    def get_preset_data(self):
+        # Settings of the widgets in the preset file format, also used to start the encode
         save_data = {}
         save_data['settings'] = []
         save_data['settings'].append({
             'splitting_method': self.comboBoxSplittingMethod.currentIndex(),
             'splitting_scene_threshold': self.doubleSpinBoxFFmpegSceneThreshold.value(),
+            'splitting_scene_analysis': self.comboBoxSceneAnalysis.currentIndex(),
+            'splitting_scene_min': self.spinBoxSceneMin.value(),
+            'splitting_scene_max': self.spinBoxSceneMax.value(),
             'splitting_chunking_length': self.spinBoxChunking.value(),
-            'splitting_chunking_reencode': self.checkBoxSplittingReencode.isChecked(),
-            'splitting_chunking_codec': self.comboBoxSplittingReencode.currentIndex(),
+            'splitting_chunking_lossless': self.checkBoxSplittingLossless.isChecked(),
+            'splitting_chunking_codec': self.comboBoxSplittingLossless.currentIndex(),
             'worker_count': self.comboBoxWorkerCount.currentIndex(),
+            'worker_adaptive': self.checkBoxWorkerAdaptive.isChecked(),
+            'worker_min': self.spinBoxWorkerMin.value(),
+            'worker_max': self.spinBoxWorkerMax.value(),
+            'worker_pinning': self.checkBoxWorkerPinning.isChecked(),
+            'worker_tail_split': self.checkBoxWorkerTailSplit.isChecked(),
             'video_encoder': self.comboBoxEncoder.currentIndex(),
             'video_bit_depth': self.comboBoxBitDepth.currentIndex(),
             'video_color_fmt': self.comboBoxColorFormat.currentIndex(),
             'video_speed': self.horizontalSliderEncoderSpeed.value(),
             'video_passes': self.comboBoxPasses.currentIndex(),
             'video_advanced': self.checkBoxAdvancedSettings.isChecked(),
+            'video_custom': self.groupBoxCustomSettings.isChecked(),
             'video_q': self.radioButtonCQ.isChecked(),
             'video_vbr': self.radioButtonVBR.isChecked(),
             'video_q_amount': self.horizontalSliderQ.value(),
@@ -692,17 +746,54 @@ class neav1e(QtWidgets.QMainWindow):
         })
 
         if self.checkBoxAdvancedSettings.isChecked():
-            self.groupBoxCustomSettings.setChecked(True)
+            # The advanced settings are stored, so headless encodes don't need the custom command line
             save_data['advanced_settings'] = []
             save_data['advanced_settings'].append({
-                'command_line': self.textEditCustomSettings.toPlainText()
+                'aomenc_threads': self.comboBoxAomencThreads.currentIndex(),
+                'aomenc_tile_rows': self.comboBoxAomencTileRows.currentIndex(),
+                'aomenc_tile_cols': self.comboBoxAomencTileCols.currentIndex(),
+                'aomenc_gop': self.spinBoxAomencGOP.value(),
+                'aomenc_lag_in_frames': self.spinBoxAomencLagInFrames.value(),
+                'aomenc_tune': self.comboBoxAomencTune.currentText(),
+                'aomenc_aq_mode': self.comboBoxAomencAQMode.currentIndex(),
+                'aomenc_color_primaries': self.comboBoxAomencColorPrimaries.currentText(),
+                'aomenc_color_transfer': self.comboBoxAomencColorTransfer.currentText(),
+                'aomenc_color_matrix': self.comboBoxAomencColorMatrix.currentText(),
+                'aomenc_denoise': self.checkBoxAomencDenoise.isChecked(),
+                'aomenc_denoise_level': self.spinBoxAomencDenoise.value(),
+                'rav1e_threads': self.comboBoxRav1eThreads.currentIndex(),
+                'rav1e_tile_rows': self.comboBoxRav1eTileRows.currentIndex(),
+                'rav1e_tile_cols': self.comboBoxRav1eTileCols.currentIndex(),
+                'rav1e_gop': self.spinBoxRav1eGOP.value(),
+                'rav1e_range': self.comboBoxRav1eRange.currentText(),
+                'rav1e_color_primaries': self.comboBoxRav1eColorPrimaries.currentText(),
+                'rav1e_color_transfer': self.comboBoxRav1eColorTransfer.currentText(),
+                'rav1e_color_matrix': self.comboBoxRav1eColorMatrix.currentText(),
+                'rav1e_tune': self.comboBoxRav1eTune.currentText(),
+                'rav1e_content_light': self.checkBoxRav1eContentLight.isChecked(),
+                'rav1e_cll': self.spinBoxRav1eCll.value(),
+                'rav1e_fall': self.spinBoxRav1eFall.value(),
+                'rav1e_mastering': self.groupBoxRav1eMastering.isChecked(),
+                'rav1e_mastering_display': [spin_box.value() for spin_box in self.get_rav1e_mastering_spin_boxes()],
+                'svt_tile_cols': self.comboBoxSvtTileCols.currentIndex(),
+                'svt_tile_rows': self.comboBoxSvtTileRows.currentIndex(),
+                'svt_gop': self.spinBoxSvtGOP.value(),
+                'svt_aq': self.comboBoxSvtAQ.currentIndex()
             })
+        if self.groupBoxCustomSettings.isChecked():
+            if 'advanced_settings' not in save_data:
+                save_data['advanced_settings'] = [{}]
+            save_data['advanced_settings'][0]['command_line'] = self.textEditCustomSettings.toPlainText()
+        return save_data
 
-        # Save JSON
-        with open(os.path.join(self.current_dir, 'Presets', preset_name + ".json"), 'w') as outfile:
-            json.dump(save_data, outfile)
-        self.comboBoxPresets.clear()
-        self.load_preset_startup()
+    def get_rav1e_mastering_spin_boxes(self):
+        # Order of --mastering-display: G(x,y)B(x,y)R(x,y)WP(x,y)L(max,min)
+        return [self.spinBoxRav1eMasteringGx, self.spinBoxRav1eMasteringGy, self.spinBoxRav1eMasteringBx, self.spinBoxRav1eMasteringBy,
+                self.spinBoxRav1eMasteringRx, self.spinBoxRav1eMasteringRy, self.spinBoxRav1eMasteringWPx, self.spinBoxRav1eMasteringWPy,
+                self.spinBoxRav1eMasteringLx, self.spinBoxRav1eMasteringLy]
+
+    def get_preset(self):
+        return commands.flatten_preset(self.get_preset_data())
 
     def save_preferences(self):
         save_data = {}
@@ -711,7 +802,9 @@ class neav1e(QtWidgets.QMainWindow):
             'preset': self.comboBoxPresets.currentText(),
             'delete_temp_files': self.checkBoxDeleteTempFiles.isChecked(),
             'pixel_autodetect': self.checkBoxPixelAutoDetect.isChecked(),
-            'logging': self.checkBoxLogging.isChecked()
+            'logging': self.checkBoxLogging.isChecked(),
+            'progress_socket': self.checkBoxProgressSocket.isChecked(),
+            'incremental_mux': self.checkBoxIncrementalMux.isChecked()
         })
         # Save JSON
         with open(os.path.join(self.current_dir, "preferences.json"), 'w') as outfile:
@@ -726,6 +819,8 @@ class neav1e(QtWidgets.QMainWindow):
                         self.checkBoxDeleteTempFiles.setChecked(p['delete_temp_files'])
                         self.checkBoxPixelAutoDetect.setChecked(p['pixel_autodetect'])
                         self.checkBoxLogging.setChecked(p['logging'])
+                        self.checkBoxProgressSocket.setChecked(p.get('progress_socket', False))
+                        self.checkBoxIncrementalMux.setChecked(p.get('incremental_mux', False))
                         index = self.comboBoxPresets.findText(p['preset'], Qt.MatchFixedString)
                         if index >= 0:
                             self.comboBoxPresets.setCurrentIndex(index)
@@ -733,79 +828,33 @@ class neav1e(QtWidgets.QMainWindow):
                     except:
                         pass
 
-    #  ════════════════════════════════════════ Filters ═══════════════════════════════════════
-
-    def set_video_filters(self):
-        crop = self.groupBoxCrop.isChecked() is True
-        resize = self.groupBoxResize.isChecked() is True
-        deinterlace = self.groupBoxDeinterlace.isChecked() is True
-        rotate = self.groupBoxRotate.isChecked() is True
-        counter = 0
-        filter_command = ""
-
-        if crop or resize or deinterlace or rotate:
-            filter_command = " -vf "
-            if crop:
-                filter_command += self.video_crop()
-                counter += 1
-            if deinterlace:
-                if counter != 0:
-                    filter_command += ","
-                filter_command += self.video_deinterlace()
-                counter += 1
-            if rotate:
-                if counter != 0:
-                    filter_command += ","
-                filter_command += self.video_rotate()
-                counter += 1
-            if resize:
-                if counter != 0:
-                    filter_command += ","
-                filter_command += self.video_resize() # !!! Has to be last, else ffmpeg logic fails
-        self.filter_command = filter_command
-
-    def video_crop(self):
-        if self.groupBoxCrop.isChecked() is True:
-            width_new = str(self.spinBoxFilterCropRight.value() + self.spinBoxFilterCropLeft.value())
-            height_new = str(self.spinBoxFilterCropTop.value() + self.spinBoxFilterCropBottom.value())
-            return "crop=iw-" + width_new + ":ih-" + height_new + ":" + str(self.spinBoxCropLeft.value()) + ":" + str(self.spinBoxCropTop.value())
-        else:
-            return None  # Needs to be set, else it will crop if in the same instance it was active
-
-    def video_resize(self):
-        if self.groupBoxResize.isChecked() is True:
-            return "scale=" + str(self.spinBoxFilterResizeWidth.value()) + ":" + str(self.spinBoxFilterResizeHeight.value())
-        else:
-            return None
-
-    def video_deinterlace(self):
-        if self.groupBoxDeinterlace.isChecked() is True:
-            return "yadif=" + self.comboBoxDeinterlace.currentText()
-        else:
-            return None
-
-    def video_rotate(self):
-        if self.groupBoxRotate.isChecked() is True:
-            if self.comboBoxRotate.currentIndex() == 0:
-                return "transpose=1"
-            elif self.comboBoxRotate.currentIndex() == 1:
-                return "transpose=2"
-            elif self.comboBoxRotate.currentIndex() == 2:
-                return "transpose=2,transpose=2"
-            else:
-                return None # unimplemented
-
     #  ═══════════════════════════════════════ Splitting ══════════════════════════════════════
 
+    def index_source(self):
+        self.labelStatus.setText("Status: Indexing")
+        # Create a QThread object
+        self.thread_index = QThread()
+        # Create a worker object
+        self.worker_index = worker_index.WorkerIndex()
+        # Move worker to the thread
+        self.worker_index.moveToThread(self.thread_index)
+        # Connect signals and slots
+        self.thread_index.started.connect(partial(self.worker_index.run, self.video_input, self.job.get_index_file(), self.ffprobe_path))
+        self.worker_index.finished.connect(self.thread_index.quit)
+        self.worker_index.finished.connect(self.splitting)
+        self.worker_index.finished.connect(self.worker_index.deleteLater)
+        self.thread_index.finished.connect(self.thread_index.deleteLater)
+        # Start the thread
+        self.thread_index.start()
+
     def splitting(self):
-        # Create Temp Folder if not existant
-        out_path = Path(os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks"))
-        out_path.mkdir(parents=True, exist_ok=True)
-        out_path = Path(os.path.join(self.tempDir, self.temp_dir_file_name, "Progress"))
-        out_path.mkdir(parents=True, exist_ok=True)
         # Select the correct splitting method
         current_index = self.comboBoxSplittingMethod.currentIndex()
-        self.set_video_filters()
+        self.get_source_framecount()
+        # Resume: reuse the splits of the previous run if the source and splitting settings are unchanged
+        if self.job.resume_splitting():
+            self.ffmpeg_splitting_finished()
+            return
         if current_index == 0:
             # FFmpeg Scene Detect
             self.labelStatus.setText("Status: Detecting Scenes")
@@ -816,43 +865,57 @@ class neav1e(QtWidgets.QMainWindow):
             self.ffmpeg_chunking()
 
     def ffmpeg_chunking(self):
-        video_codec = ""
-        # Set Splitting Parameters
-        if self.checkBoxSplittingReencode.isChecked() is True:
-            if self.comboBoxSplittingReencode.currentIndex() == 0:
-                video_codec = "libx264 -crf 0 -preset ultrafast"
-            elif self.comboBoxSplittingReencode.currentIndex() == 1:
-                video_codec = "ffv1 -level 3 -threads 6 -coder 1 -context 1 -g 1 -slicecrc 0 -slices 4"
-            elif self.comboBoxSplittingReencode.currentIndex() == 2:
-                video_codec = "utvideo"
-        else:
-            video_codec = "copy"
-        seg_time = str(self.spinBoxChunking.value())
-        splitting_output = os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "split%6d.mkv")
-        video_codec += " " + self.filter_command
-
+        # The cuts are read from the keyframes of the index, nothing is decoded or written besides splits.txt
         # Create a QThread object
-        self.thread_split = QThread()
+        self.thread_chunking = QThread()
         # Create a worker object
-        self.worker_split = worker_splitting.WorkerSplitting()
+        self.worker_chunking = worker_splitting.WorkerSplitting()
         # Move worker to the thread
-        self.worker_split.moveToThread(self.thread_split)
+        self.worker_chunking.moveToThread(self.thread_chunking)
         # Connect signals and slots
-        self.thread_split.started.connect(partial(self.worker_split.run, self.video_input, video_codec, seg_time, splitting_output, self.ffmpeg_path))
-        self.worker_split.finished.connect(self.thread_split.quit)
-        self.worker_split.finished.connect(self.ffmpeg_splitting_finished)
-        self.worker_split.finished.connect(self.worker_split.deleteLater)
-        self.thread_split.finished.connect(self.thread_split.deleteLater)
+        self.thread_chunking.started.connect(partial(self.worker_chunking.run_keyframes, self.video_input, str(self.spinBoxChunking.value()), self.job.get_splits_file(), self.job.get_index_file()))
+        self.worker_chunking.keyframes_split.connect(self.thread_chunking.quit)
+        self.worker_chunking.keyframes_split.connect(self.ffmpeg_chunking_finished)
+        self.worker_chunking.keyframes_split.connect(self.worker_chunking.deleteLater)
+        self.thread_chunking.finished.connect(self.thread_chunking.deleteLater)
         # Start the thread
-        self.thread_split.start()
+        self.thread_chunking.start()
+
+    def ffmpeg_chunking_finished(self, error):
+        if error:
+            self.save_to_log("Splitting failed: " + error)
+            self.labelStatus.setText("Status: Failed")
+            self.encode_started = False
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Splitting failed: " + error)
+            msg.setWindowTitle("Attention")
+            msg.exec()
+            return
+        self.ffmpeg_splitting_finished()
 
     def ffmpeg_splitting_finished(self):
+        self.job.splitting_finished()
+        self.open_progress_socket()
         self.set_queue()
-        self.get_source_framecount()
+        self.splitting_finished = True
+        self.start_encode()
+
+    def start_encode(self):
+        # Splitting and frame counting run at the same time,
+        # encoding starts as soon as both are finished
+        if self.splitting_finished and self.framecount_finished:
+            self.main_encode()
 
     def ffmpeg_scene_detect(self):
         threshold = str(self.doubleSpinBoxFFmpegSceneThreshold.value())
-        splitting_output = os.path.join(self.tempDir, self.temp_dir_file_name, "splits.txt")
+        splitting_output = self.job.get_splits_file()
+        # The chunks encode while the scenes are detected,
+        # every chunk is queued as soon as the scene change at its end is found
+        self.open_progress_socket()
+        self.set_encoder()
+        self.job.start_queue()
+        self.live_queue = queue.Queue()
         # Create a QThread object
         self.thread_scene_detect = QThread()
         # Create a worker object
@@ -860,13 +923,44 @@ class neav1e(QtWidgets.QMainWindow):
         # Move worker to the thread
         self.worker_scene_detect.moveToThread(self.thread_scene_detect)
         # Connect signals and slots
-        self.thread_scene_detect.started.connect(partial(self.worker_scene_detect.run, self.video_input, threshold, splitting_output, self.ffmpeg_path))
+        self.thread_scene_detect.started.connect(partial(self.worker_scene_detect.run, self.video_input, threshold, splitting_output, self.ffmpeg_path, self.job.get_index_file(), engine.get_worker_count(self.job.preset), self.comboBoxSceneAnalysis.currentIndex(),
+                                                                self.spinBoxSceneMin.value(), self.spinBoxSceneMax.value(), self.job.cache_dir))
+        self.worker_scene_detect.scene_found.connect(self.scene_found)
         self.worker_scene_detect.finished.connect(self.thread_scene_detect.quit)
-        self.worker_scene_detect.finished.connect(self.ffmpeg_splitting_finished)
+        self.worker_scene_detect.finished.connect(self.ffmpeg_scene_detect_finished)
         self.worker_scene_detect.finished.connect(self.worker_scene_detect.deleteLater)
         self.thread_scene_detect.finished.connect(self.worker_scene_detect.deleteLater)
         # Start the thread
         self.thread_scene_detect.start()
+        # Encoding only waits for the framecount
+        self.splitting_finished = True
+        self.start_encode()
+
+    def scene_found(self, counter, seek_point):
+        chunk = self.job.queue_chunk(*self.job.get_chunk_input(counter, seek_point, self.job.get_index()))
+        if chunk is not None:
+            self.live_queue.put(chunk)
+
+    def ffmpeg_scene_detect_finished(self, error):
+        try:
+            if error:
+                self.splitting_error = error
+                self.save_to_log("Scene detection failed: " + error)
+                return
+            self.job.splitting_finished()
+            if self.checkBoxIncrementalMux.isChecked():
+                # All chunks are known now, it has to start before the encode can finish
+                self.job.start_incremental_mux(self.audio_encode)
+        finally:
+            # Without the end of the queue the encode workers never finish
+            self.live_queue.put(None)
+
+    #  ════════════════════════════════════════ Resume ════════════════════════════════════════
+
+    def chunk_finished(self, name, success):
+        # Marks the chunk as done in the manifest of the job
+        if not self.job.chunk_finished(name, success):
+            self.failed_chunks.append(name)
 
     #  ═════════════════════════════════════════ Main ═════════════════════════════════════════
 
@@ -875,6 +969,14 @@ class neav1e(QtWidgets.QMainWindow):
         if self.video_input and self.video_output:
             if self.encode_started is False:
                 self.progressBar.setValue(0)
+                self.splitting_finished = False
+                self.framecount_finished = False
+                self.video_finished = False
+                self.live_queue = None
+                self.failed_chunks = []
+                self.splitting_error = None
+                self.job = engine.Job(self.video_input, self.video_output, self.get_preset(), self.tempDir, self.get_tools(), self.save_to_log)
+                self.job.prepare()
                 # Audio Encoding
                 self.encode_started = True
                 self.encode_audio()
@@ -888,195 +990,30 @@ class neav1e(QtWidgets.QMainWindow):
 
     #  ══════════════════════════════════ Command Generator ═══════════════════════════════════
 
-    def set_pipe_color_fmt(self):
-        fmt = None
-        space = self.comboBoxColorFormat.currentIndex()
-        if space == 0:
-            fmt = "yuv420p"
-        elif space == 1:
-            fmt = "yuv422p"
-        elif space == 2:
-            fmt = "yuv444p"
-        depth = self.comboBoxBitDepth.currentIndex()
-        if depth == 0:
-            fmt += " -strict -1"
-        elif depth == 1:
-            fmt += "10le -strict -1"
-        elif depth == 2:
-            fmt += "12le -strict -1"
-        self.pipe_color_fmt = fmt
-
-    def set_encoder_settings(self):
-        encoder = self.comboBoxEncoder.currentIndex()
-        fmt = self.comboBoxColorFormat.currentIndex()
-        passes = self.comboBoxPasses.currentIndex()
-        settings = None
-        if encoder == 0: # aomenc
-            if passes == 0:
-                self.encoder_passes = " --passes=1 "
-            elif passes == 1:
-                self.encoder_passes = " --passes=2 "
-                self.encoder_pass_one = " --pass=1 "
-                self.encoder_pass_two = " --pass=2 "
-
-            self.encoder_output = " --output="
-            self.encoder_output_stats = " --fpf="
-
-            settings = '\u0022'+  self.aomenc_path + '\u0022' + " - --bit-depth=" + self.comboBoxBitDepth.currentText()
-
-            if fmt == 0: # Color Format
-                settings += " --i420"
-            elif fmt == 1:
-                settings += " --i422"
-            elif fmt == 2:
-                settings += " --i444"
-            settings += " --cpu-used=" + str(self.horizontalSliderEncoderSpeed.value())
-
-            if self.radioButtonCQ.isChecked() is True:
-                settings += " --end-usage=q --cq-level=" + str(self.horizontalSliderQ.value())
-            elif self.radioButtonVBR.isChecked() is True:
-                settings += " --end-usage=vbr --target-bitrate=" + str(self.spinBoxVBR.value())
-
-            if self.checkBoxAdvancedSettings.isChecked() is False:
-                # Basic Settings
-                settings += " --threads=4 --tile-columns=1 --tile-rows=2 "
-            else:
-                # Advanced Settings
-                settings += " --threads=" + str(self.comboBoxAomencThreads.currentIndex())                  # Threads
-                settings += " --tile-rows=" + str(self.comboBoxAomencTileRows.currentIndex())               # Tile Rows
-                settings += " --tile-columns=" + str(self.comboBoxAomencTileCols.currentIndex())            # Tile Columns
-                settings += " --kf-max-dist=" + str(self.spinBoxAomencGOP.value())                          # Max GOP
-                settings += " --lag-in-frames=" + str(self.spinBoxAomencLagInFrames.value())                # Frame Buffer
-                settings += " --tune=" + self.comboBoxAomencTune.currentText()                              # Tune
-                settings += " --aq-mode=" + str(self.comboBoxAomencAQMode.currentIndex())                   # AQ Mode
-                settings += " --color-primaries=" + self.comboBoxAomencColorPrimaries.currentText()         # Color Primaries
-                settings += " --transfer-characteristics=" + self.comboBoxAomencColorTransfer.currentText() # Color Transfer
-                settings += " --matrix-coefficients=" + self.comboBoxAomencColorMatrix.currentText()        # Color Matrix
-                if self.checkBoxAomencDenoise.isChecked() is True:
-                    settings += " --denoise-noise-level=" + str(self.spinBoxAomencDenoise.value())          # Denoise Noise Level
-        elif encoder == 1: # rav1e
-            self.encoder_output = " --output "
-            self.encoder_passes = " " # rav1e still does not support 2pass encoding
-            settings = '\u0022' + self.rav1e_path + '\u0022' + " - --speed " + str(self.horizontalSliderEncoderSpeed.value())
-            if self.radioButtonCQ.isChecked() is True:
-                settings += " --quantizer " + str(self.horizontalSliderQ.value())
-            elif self.radioButtonVBR.isChecked() is True:
-                settings += " --bitrate " + str(self.spinBoxVBR.value())
-
-            if self.checkBoxAdvancedSettings.isChecked() is False:
-                # Basic Settings
-                settings += " --threads 4 --tile-cols 1 --tile-rows 2"
-            else:
-                # Advanced Settings
-                settings += " --threads " + str(self.comboBoxRav1eThreads.currentIndex())                   # Threads
-                settings += " --tile-rows " + str(self.comboBoxRav1eTileRows.currentIndex())                # Tile Rows
-                settings += " --tile-cols " + str(self.comboBoxRav1eTileCols.currentIndex())                # Tile Columns
-                settings += " --keyint " + str(self.spinBoxRav1eGOP.value())                                # Max GOP
-                settings += " --range " + self.comboBoxRav1eRange.currentText()                             # Color Range
-                settings += " --primaries " + self.comboBoxRav1eColorPrimaries.currentText()                # Color Primaries
-                settings += " --transfer " + self.comboBoxRav1eColorTransfer.currentText()                  # Color Transfer
-                settings += " --matrix " + self.comboBoxRav1eColorMatrix.currentText()                      # Color Matrix
-                settings += " --tune " + self.comboBoxRav1eTune.currentText()                               # Tune
-                if self.checkBoxRav1eContentLight.isChecked() is True:
-                    settings += " --content-light " + str(self.spinBoxRav1eCll.value())                     # Content Light Cll
-                    settings += "," + str(self.spinBoxRav1eFall.value())                                    # Content Light Fall
-                if self.groupBoxRav1eMastering.isChecked() is True:
-                    settings += " --mastering-display G(" + str(self.spinBoxRav1eMasteringGx.value()) + "," # Mastering Gx
-                    settings += str(self.spinBoxRav1eMasteringGy.value()) + ")B("                           # Mastering Gy
-                    settings += str(self.spinBoxRav1eMasteringBx.value()) + ","                             # Mastering Bx
-                    settings += str(self.spinBoxRav1eMasteringBy.value()) + ")R("                           # Mastering By
-                    settings += str(self.spinBoxRav1eMasteringRx.value()) + ","                             # Mastering Rx
-                    settings += str(self.spinBoxRav1eMasteringRy.value()) + ")WP("                          # Mastering Ry
-                    settings += str(self.spinBoxRav1eMasteringWPx.value()) + ","                            # Mastering WPx
-                    settings += str(self.spinBoxRav1eMasteringWPy.value()) + ")L("                          # Mastering WPy
-                    settings += str(self.spinBoxRav1eMasteringLx.value()) + ","                             # Mastering Lx
-                    settings += str(self.spinBoxRav1eMasteringLy.value()) + ")"                             # Mastering Ly
-        elif encoder == 2: # svt-av1
-            if passes == 0:
-                self.encoder_passes = " --passes 1 "
-            elif passes == 1:
-                self.encoder_passes = " --irefresh-type 2 --passes 2 "
-                self.encoder_pass_one = " --pass 1 "
-                self.encoder_pass_two = " --pass 2 "
-            self.encoder_output = " -b "
-            settings = '\u0022' + self.svtav1_path + '\u0022' + " -i stdin --preset " + str(self.horizontalSliderEncoderSpeed.value())
-            if self.radioButtonCQ.isChecked() is True:
-                settings += " --rc 0 -q " + str(self.horizontalSliderQ.value())
-            elif self.radioButtonVBR.isChecked() is True:
-                settings += " --rc 1 --tbr " + str(self.spinBoxVBR.value())
-            if self.checkBoxRav1eContentLight.isChecked() is False:
-                settings += " --tile-columns " + str(self.comboBoxSvtTileCols.currentIndex())
-                settings += " --tile-rows " + str(self.comboBoxSvtTileRows.currentIndex())
-                settings += " --keyint " + str(self.spinBoxSvtGOP.value())
-                settings += " --adaptive-quantization " + str(self.comboBoxSvtAQ.currentIndex())
-        self.encoder_settings = settings
+    def get_tools(self):
+        return {'ffmpeg': self.ffmpeg_path, 'ffprobe': self.ffprobe_path, 'aomenc': self.aomenc_path, 'rav1e': self.rav1e_path, 'svtav1': self.svtav1_path}
 
-    def set_queue(self):
-        # Clear Queue
-        self.video_queue_first_pass = []
-        self.video_queue_second_pass = []
+    def get_advanced_settings(self):
+        # Arguments of the advanced settings tab, None in basic mode
+        return commands.get_advanced_settings(self.get_preset())
 
-        self.set_pipe_color_fmt()
-
-        if self.groupBoxCustomSettings.isChecked():
-            self.encoder_settings = self.textEditCustomSettings.toPlainText()
-        else:
-            self.set_encoder_settings()
+    def get_encoder_command(self):
+        # Encoder command of the current settings, shown in the custom settings
+        preset = self.get_preset()
+        index = self.job.get_index() if self.job is not None else None
+        return commands.get_encoder_settings(preset, self.get_tools(), engine.get_thread_settings(preset, index), self.get_advanced_settings())['settings']
 
-        passes = self.comboBoxPasses.currentIndex()
-        current_index = self.comboBoxSplittingMethod.currentIndex()
-        encoder = self.comboBoxEncoder.currentIndex()
+    def set_queue(self):
+        self.set_encoder()
+        self.job.set_queue()
 
-        if current_index == 0:
-            # FFmpeg Scene Detect
-            with open(os.path.join(self.tempDir, self.temp_dir_file_name, "splits.txt")) as file_splits:
-                counter = 0
-                for seek_point in file_splits:
-                    out_file_name = str(counter).zfill(6)
-                    temp_input_file = '\u0022' + self.video_input + '\u0022'
-                    temp_output_file = '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "split" + out_file_name + ".ivf") + '\u0022'
-
-                    if passes == 0:
-                        temp_progress = " -progress " + '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Progress", "split" + out_file_name + ".log") + '\u0022'
-                        if encoder == 2: # svt-av1 specific
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress + " -i " + temp_input_file + " " + seek_point.rstrip() + " -pix_fmt " + self.pipe_color_fmt + " " + self.filter_command + " -color_range 0 -vsync 0 -nostdin -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_output + temp_output_file)
-                        else:
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress + " -i " + temp_input_file + " " + seek_point.rstrip() + " -pix_fmt " + self.pipe_color_fmt + " " + self.filter_command + " -color_range 0 -vsync 0 -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_output + temp_output_file)
-                    elif passes == 1:
-                        temp_output_file_log = '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "split" + out_file_name + ".stats") + '\u0022'
-                        temp_progress_first = " -progress " + '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Progress", "1st_split" + out_file_name + ".log") + '\u0022'
-                        temp_progress_second = " -progress " + '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Progress", "2nd_split" + out_file_name + ".log") + '\u0022'
-                        if encoder == 2: # svt-av1 specific
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_first + " -i " + temp_input_file + " " + seek_point.rstrip() + " -pix_fmt " + self.pipe_color_fmt + " " + self.filter_command + " -color_range 0 -vsync 0 -nostdin -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_one + self.encoder_output + self.null_path + self.encoder_output_stats + temp_output_file_log)
-                            self.video_queue_second_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_second + " -i " + temp_input_file + " " + seek_point.rstrip() + " -pix_fmt " + self.pipe_color_fmt + " " + self.filter_command + " -color_range 0 -vsync 0 -nostdin -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_two + self.encoder_output + temp_output_file + self.encoder_output_stats + temp_output_file_log)
-                        else:
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_first + " -i " + temp_input_file + " " + seek_point.rstrip() + " -pix_fmt " + self.pipe_color_fmt + " " + self.filter_command + " -color_range 0 -vsync 0 -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_one + self.encoder_output + self.null_path + self.encoder_output_stats + temp_output_file_log)
-                            self.video_queue_second_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_second + " -i " + temp_input_file + " " + seek_point.rstrip() + " -pix_fmt " + self.pipe_color_fmt + " " + self.filter_command + " -color_range 0 -vsync 0 -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_two + self.encoder_output + temp_output_file + self.encoder_outputStats + temp_output_file_log)
-                    counter += 1
-        elif current_index == 1:
-            # Equal Chunking
-            files = os.listdir(os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks"))
-            # Iterate over all mkv files
-            for file in files:
-                if file.endswith(".mkv"):
-                    temp_input_file = '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", file) + '\u0022'
-                    temp_output_file = '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", os.path.splitext(os.path.basename(str(file)))[0] + ".ivf") + '\u0022'
-                    if passes == 0:
-                        temp_progress = " -progress " + '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Progress", os.path.splitext(os.path.basename(str(file)))[0] + ".log") + '\u0022'
-                        if encoder == 2: # svt-av1 specific
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress + " -i " + temp_input_file + " -pix_fmt " + self.pipe_color_fmt + " -color_range 0 -vsync 0 -nostdin -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_output + temp_output_file)
-                        else:
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress + " -i " + temp_input_file + " -pix_fmt " + self.pipe_color_fmt + " -color_range 0 -vsync 0 -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_output + temp_output_file)
-                    elif passes == 1:
-                        temp_output_file_log = '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", os.path.splitext(os.path.basename(str(file)))[0] + ".stats") + '\u0022'
-                        temp_progress_first = " -progress " + '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Progress", "1st_split" + os.path.splitext(os.path.basename(str(file)))[0] + ".log") + '\u0022'
-                        temp_progress_second = " -progress " + '\u0022' + os.path.join(self.tempDir, self.temp_dir_file_name, "Progress", "2nd_split" + os.path.splitext(os.path.basename(str(file)))[0] + ".log") + '\u0022'
-                        if encoder == 2: # svt-av1 specific
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_first + " -i " + temp_input_file + " -pix_fmt " + self.pipe_color_fmt + " -color_range 0 -vsync 0 -nostdin -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_one + self.encoder_output + self.null_path + self.encoder_output_stats + temp_output_file_log)
-                            self.video_queue_second_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_second + " -i " + temp_input_file + " -pix_fmt " + self.pipe_color_fmt + " -color_range 0 -vsync 0 -nostdin -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_two + self.encoder_output + temp_output_file + self.encoder_output_stats + temp_output_file_log)
-                        else:
-                            self.video_queue_first_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_first + " -i " + temp_input_file + " -pix_fmt " + self.pipe_color_fmt + " -color_range 0 -vsync 0 -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_one + self.encoder_output + self.null_path + self.encoder_output_stats + temp_output_file_log)
-                            self.video_queue_second_pass.append('\u0022' + self.ffmpeg_path + '\u0022' + " -loglevel 0 " + temp_progress_second + " -i " + temp_input_file + " -pix_fmt " + self.pipe_color_fmt + " -color_range 0 -vsync 0 -f yuv4mpegpipe - | " + self.encoder_settings + self.encoder_passes + self.encoder_pass_two + self.encoder_output + temp_output_file + self.encoder_output_stats + temp_output_file_log)
+    def set_encoder(self):
+        custom_settings = None
+        if self.groupBoxCustomSettings.isChecked():
+            custom_settings = self.textEditCustomSettings.toPlainText()
+        self.job.set_encoder(custom_settings, self.get_advanced_settings())
+        # Where ffmpeg writes its -progress output: the local listener or log files
+        self.job.progress_port = self.progress_socket.getsockname()[1] if self.progress_socket is not None else None
 
     #  ═══════════════════════════════════════ Encoding ═══════════════════════════════════════
 
@@ -1093,11 +1030,7 @@ class neav1e(QtWidgets.QMainWindow):
                 psutil.Process(proc.pid).resume()
 
     def set_framecount(self, count):
-        frame_count = count
-        if self.comboBoxPasses.currentIndex() == 1:
-            frame_count = frame_count * 2
-        if self.groupBoxDeinterlace.isChecked() and self.comboBoxDeinterlace.currentIndex() == 1:
-            frame_count = frame_count * 2
+        frame_count = self.job.get_total_frames(count)
         self.progressBar.setMaximum(frame_count)
         self.labelStatus.setText("Status: 0 / " + str(frame_count) + " Frames")
         self.save_to_log("Framecount : " + str(frame_count))
@@ -1111,25 +1044,44 @@ class neav1e(QtWidgets.QMainWindow):
         # Move worker to the thread
         self.frame_worker.moveToThread(self.frame_thread)
         # Connect signals and slots
-        self.frame_thread.started.connect(partial(self.frame_worker.run, self.video_input, self.ffmpeg_path))
+        self.frame_thread.started.connect(partial(self.frame_worker.run, self.video_input, self.ffmpeg_path, self.ffprobe_path, self.job.get_index_file()))
         self.frame_worker.finished.connect(self.frame_thread.quit)
         self.frame_worker.finished.connect(self.frame_worker.deleteLater)
-        self.frame_worker.finished.connect(self.main_encode)
+        self.frame_worker.finished.connect(self.framecount_worker_finished)
         self.frame_thread.finished.connect(self.frame_thread.deleteLater)
         self.frame_worker.framecount.connect(self.set_framecount)
         # Start the thread
         self.frame_thread.start()
 
+    def framecount_worker_finished(self):
+        self.framecount_finished = True
+        self.start_encode()
+
+    def open_progress_socket(self):
+        # The listener has to accept connections before the first chunk starts
+        self.progress_socket = None
+        if self.checkBoxProgressSocket.isChecked():
+            self.progress_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.progress_socket.bind(("127.0.0.1", 0))
+            self.progress_socket.listen(socket.SOMAXCONN)
+
     def calc_progress(self):
-        log_path = os.path.join(self.tempDir, self.temp_dir_file_name, "Progress")
+        log_path = self.job.get_progress_path()
         # Create a QThread object
         self.calc_thread = QThread()
         # Create a worker object
-        self.calc_worker = worker_progress.WorkerProgress()
+        if self.progress_socket is not None:
+            self.calc_worker = worker_progress.WorkerProgressSocket()
+        else:
+            self.calc_worker = worker_progress.WorkerProgress()
         # Move worker to the thread
         self.calc_worker.moveToThread(self.calc_thread)
         # Connect signals and slots
-        self.calc_thread.started.connect(partial(self.calc_worker.run, log_path))
+        if self.progress_socket is not None:
+            self.calc_thread.started.connect(partial(self.calc_worker.run, self.progress_socket, self.job.resumed_frames))
+            self.calc_worker.speed.connect(self.report_speed)
+        else:
+            self.calc_thread.started.connect(partial(self.calc_worker.run, log_path))
         self.calc_worker.finished.connect(self.calc_thread.quit)
         self.calc_worker.finished.connect(self.calc_worker.deleteLater)
         self.calc_thread.finished.connect(self.calc_thread.deleteLater)
@@ -1139,11 +1091,21 @@ class neav1e(QtWidgets.QMainWindow):
 
     def main_encode(self):
         pool_size = self.comboBoxWorkerCount.currentIndex() + 1
-        queue_one = self.video_queue_first_pass
-        queue_two = self.video_queue_second_pass
+        queue_one = self.job.queue_first_pass
+        queue_two = self.job.queue_second_pass
+        adaptive_bounds = engine.get_adaptive_bounds(self.job.preset)
         self.save_to_log("Pool Size: " + str(pool_size))
+        self.save_to_log("Adaptive Workers: " + str(adaptive_bounds))
         self.save_to_log("Queue One: " + str(queue_one))
         self.save_to_log("Queue Two: " + str(queue_two))
+        live_queue = self.live_queue
+        if self.checkBoxIncrementalMux.isChecked() and live_queue is None:
+            # Muxes the chunks in order while the others are encoding, job.mux() finishes it
+            self.job.start_incremental_mux(self.audio_encode)
+        if self.job.uses_lossless_chunks():
+            # The chunks encode as soon as their lossless file is written
+            live_queue = queue.Queue()
+            self.lossless_splitting(live_queue)
         # Create a QThread object
         self.thread = QThread()
         # Create a worker object
@@ -1151,61 +1113,112 @@ class neav1e(QtWidgets.QMainWindow):
         # Move worker to the thread
         self.worker.moveToThread(self.thread)
         # Connect signals and slots
-        self.thread.started.connect(partial(self.worker.run, pool_size, queue_one, queue_two))
+        self.thread.started.connect(partial(self.worker.run, pool_size, self.job.queue_names, queue_one, queue_two, self.job.queue_costs, "longest_first", adaptive_bounds, self.job.preset['worker_pinning'], live_queue, self.job.get_tail_split()))
         self.worker.finished.connect(self.thread.quit)
         self.worker.finished.connect(self.worker_finished)
+        self.worker.chunk_finished.connect(self.chunk_finished)
+        self.worker.log.connect(self.save_to_log)
         self.worker.finished.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
         # Start the thread
         self.thread.start()
         self.calc_progress()
 
+    def lossless_splitting(self, live_queue):
+        # Create a QThread object
+        self.thread_split = QThread()
+        # Create a worker object
+        self.worker_split = worker_splitting.WorkerSplitting()
+        # Move worker to the thread
+        self.worker_split.moveToThread(self.thread_split)
+        # Connect signals and slots
+        self.thread_split.started.connect(partial(self.worker_split.run, self.job, engine.get_worker_count(self.job.preset), live_queue))
+        self.worker_split.finished.connect(self.thread_split.quit)
+        self.worker_split.finished.connect(self.lossless_splitting_finished)
+        self.worker_split.finished.connect(self.worker_split.deleteLater)
+        self.thread_split.finished.connect(self.thread_split.deleteLater)
+        # Start the thread
+        self.thread_split.start()
+
+    def lossless_splitting_finished(self, failed):
+        for name in failed:
+            self.chunk_finished(name, False)
+
     def worker_finished(self):
         # Stops Progress Worker
         self.calc_worker.stop()
         self.calc_thread.quit()
         self.calc_thread.wait()
-        self.labelStatus.setText("Status: Muxing")
-        self.main_muxing()
-        self.labelStatus.setText("Status: Finished")
+        self.encode_fps = 0.0
+        self.video_finished = True
+        self.start_muxing()
 
     #  ════════════════════════════════════════ Muxing ════════════════════════════════════════
 
+    def start_muxing(self):
+        # Video and audio run at the same time, muxing starts as soon as both are finished
+        if not self.video_finished:
+            return
+        if not self.audio_finished:
+            self.labelStatus.setText("Status: Waiting for Audio")
+            return
+        if self.failed_chunks or self.splitting_error:
+            # Like engine.run_job(): an incomplete output isn't muxed, the manifest stays for resuming
+            if self.splitting_error:
+                reason = "Scene detection failed: " + self.splitting_error
+            else:
+                reason = str(len(self.failed_chunks)) + " Chunks failed"
+                self.save_to_log("Failed Chunks: " + str(self.failed_chunks))
+            self.labelStatus.setText("Status: Failed")
+            self.encode_started = False
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText(reason + ", the output was not muxed.\nThe temp files were kept, start the encode again to resume it.")
+            msg.setWindowTitle("Attention")
+            msg.exec()
+            return
+        self.labelStatus.setText("Status: Muxing")
+        if self.main_muxing():
+            self.labelStatus.setText("Status: Finished")
+        else:
+            self.labelStatus.setText("Status: Failed")
+
     def main_muxing(self):
-        # Creates the list file of all encoded chunks for ffmpeg concat
-        files = os.listdir(os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks"))
-        fname = open(os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "mux.txt"), "a")
-        sorted_files = sorted(files)
-        for file in sorted_files:
-            if file.endswith(".ivf"):
-                temp_input_file = '\u0027' + os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", file) + '\u0027'
-                fname.write("file " + temp_input_file + "\n")
-        fname.close()
+        # Concatenates the encoded chunks and muxes the audio, returns False if muxing failed
+        audio_files = None
         if self.audio_encoding:
-            temp_video = os.path.join(self.tempDir, self.temp_dir_file_name, "temp.mkv")
-            temp_audio = os.path.join(self.tempDir, self.temp_dir_file_name, "Audio", "audio.mkv")
-            subprocess.call([self.ffmpeg_path, '-y','-f', 'concat', '-safe', '0', '-i', os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "mux.txt"), '-c', 'copy', temp_video])
-            self.save_to_log("Mux: " + str([self.ffmpeg_path, '-y','-f', 'concat', '-safe', '0', '-i', os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "mux.txt"), '-c', 'copy', temp_video]))
-            subprocess.call([self.ffmpeg_path, '-y','-i', temp_video, '-i', temp_audio, '-c', 'copy', self.video_output])
-            self.save_to_log("Mux: " + str([self.ffmpeg_path, '-y','-i', temp_video, '-i', temp_audio, '-c', 'copy', self.video_output]))
-        else:
-            subprocess.call([self.ffmpeg_path, '-y','-f', 'concat', '-safe', '0', '-i', os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "mux.txt"), '-c', 'copy', self.video_output])
-            self.save_to_log("Mux: " + str([self.ffmpeg_path, '-y','-f', 'concat', '-safe', '0', '-i', os.path.join(self.tempDir, self.temp_dir_file_name, "Chunks", "mux.txt"), '-c', 'copy', self.video_output]))
-        self.delete_temp_files()
+            if self.audio_success:
+                audio_files = self.audio_encode.get_files()
+            else:
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Warning)
+                msg.setText("Audio encoding failed, the output contains no audio.")
+                msg.setWindowTitle("Attention")
+                msg.exec()
+        success = self.job.mux(audio_files)
         self.encode_started = False
+        if not success:
+            # The temp files are kept, the encoded chunks can be muxed again
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Muxing failed, see the log.\nThe temp files were kept, start the encode again to mux the encoded chunks.")
+            msg.setWindowTitle("Attention")
+            msg.exec()
+            return False
+        self.delete_temp_files()
+        return True
 
     def delete_temp_files(self):
         if self.checkBoxDeleteTempFiles.isChecked():
-            if os.path.isfile(self.video_output):
-                if os.stat(self.video_output).st_size >= 50000:
-                    #print(os.path.join(self.tempDir, self.temp_dir_file_name))
-                    shutil.rmtree(os.path.join(self.tempDir, self.temp_dir_file_name))
-                else:
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Warning)
-                    msg.setText("Output File found, but there could be a muxing issue.")
-                    msg.setWindowTitle("Attention")
-                    msg.exec()
+            result = self.job.check_output()
+            if result == 'ok':
+                self.job.delete_temp_files()
+            elif result == 'small':
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Warning)
+                msg.setText("Output File found, but there could be a muxing issue.")
+                msg.setWindowTitle("Attention")
+                msg.exec()
             else:
                 msg = QMessageBox()
                 msg.setIcon(QMessageBox.Critical)
@@ -0,0 +1,100 @@
+"""
+This script encodes the audio tracks next to the video.
+
+Every enabled track is encoded by its own ffmpeg process into its own file,
+the processes run in the background while the video gets split and encoded.
+Muxing has to wait() for them, the mux maps all track files.
+"""
+import os
+import subprocess
+
+import commands
+
+
+class AudioEncode:
+    """
+    Audio encode of one source
+
+    Attributes
+    ----------
+    video_input : string - path of the video input file
+    tracks : list - (track index, ffmpeg arguments) of commands.get_audio_tracks()
+    audio_path : string - folder of the encoded tracks and their progress logs
+    ffmpeg_path : path to ffmpeg
+    """
+    def __init__(self, video_input, tracks, audio_path, ffmpeg_path):
+        self.video_input = video_input
+        self.tracks = tracks
+        self.audio_path = audio_path
+        self.ffmpeg_path = ffmpeg_path
+        self.processes = []
+
+    def get_files(self):
+        return [os.path.join(self.audio_path, "track" + str(track) + ".mkv") for track, _ in self.tracks]
+
+    def get_progress_files(self):
+        return [os.path.join(self.audio_path, "track" + str(track) + ".log") for track, _ in self.tracks]
+
+    def get_commands(self):
+        return [commands.get_audio_encode_command(self.video_input, command, output, self.ffmpeg_path, progress_file)
+                for (_, command), output, progress_file in zip(self.tracks, self.get_files(), self.get_progress_files())]
+
+    def start(self):
+        os.makedirs(self.audio_path, exist_ok=True)
+        for command in self.get_commands():
+            self.processes.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=True))
+
+    def is_running(self):
+        return any(process.poll() is None for process in self.processes)
+
+    def wait(self, timeout=None):
+        """
+        Waits for all tracks, returns True if all of them were encoded,
+        False if one failed or the timeout expired
+        """
+        try:
+            for process in self.processes:
+                process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        return all(process.returncode == 0 for process in self.processes)
+
+    def get_progress(self, duration):
+        """
+        Returns the encoded part (0 - 1) of all tracks
+
+        Attributes
+        ----------
+        duration : float - duration of the source in seconds, None if unknown
+        """
+        if not self.processes:
+            return 0.0
+        parts = []
+        for process, progress_file in zip(self.processes, self.get_progress_files()):
+            if process.poll() is not None:
+                parts.append(1.0)
+            elif duration:
+                parts.append(min(read_out_time(progress_file) / duration, 1.0))
+            else:
+                parts.append(0.0)
+        return sum(parts) / len(parts)
+
+
+def read_out_time(progress_file):
+    """
+    Returns the last out_time (seconds) of a -progress log, only the end of the file is read
+    """
+    try:
+        with open(progress_file, 'rb') as file_log:
+            file_log.seek(0, os.SEEK_END)
+            file_log.seek(max(file_log.tell() - 4096, 0))
+            lines = file_log.read().split(b"\n")
+    except OSError:
+        return 0.0
+    for line in reversed(lines):
+        if line.startswith(b"out_time_us="):
+            try:
+                return max(int(line[12:]), 0) / 1000000
+            except ValueError:
+                continue
+    return 0.0
@@ -0,0 +1,413 @@
+"""
+This script generates the ffmpeg / encoder commands of an encode job.
+
+All settings are read from a preset dictionary in the format
+written by save_preset(), so the GUI and the headless engine
+create exactly the same commands.
+"""
+import os
+from decimal import Decimal
+import source_index
+import manifest
+
+# FFmpeg expects ISO 639-2 codes for languages https://en.wikipedia.org/wiki/List_of_ISO_639-2_codes
+# The language ComboBoxes are filled with this dictionary, presets store the index
+AUDIO_LANGUAGES = {
+    "English":      "eng", "Bosnian":       "bos", "Bulgarian":     "bul", "Chinese":       "chi",
+    "Czech":        "cze", "Greek":         "gre", "Estonian":      "est", "Persian":       "per",
+    "Filipino":     "fil", "Finnish":       "fin", "French":        "fre", "Georgian":      "geo",
+    "German":       "ger", "Croatian":      "hrv", "Hungarian":     "hun", "Indonesian":    "ind",
+    "Icelandic":    "ice", "Italian":       "ita", "Japanese":      "jpn", "Korean":        "kor",
+    "Latin":        "lat", "Latvian":       "lav", "Lithuanian":    "lit", "Dutch":         "nld",
+    "Norwegian":    "nob", "Polish":        "pol", "Portuguese":    "por", "Russian":       "rus",
+    "Slovak":       "slk", "Slovenian":     "slv", "Spanish":       "spa", "Serbian":       "srp",
+    "Swedish":      "swe", "Thai":          "tha", "Turkish":       "tur", "Ukrainian":     "ukr",
+    "Vietnamese":   "vie"
+    }
+
+# Items of the ComboBoxes, presets store the index
+BIT_DEPTHS = ["8", "10", "12"]
+AUDIO_CODECS = ["Opus", "AC3", "AAC", "MP3"]
+AUDIO_CODEC_LIBRARIES = {"Opus": "libopus", "AC3": "ac3", "AAC": "aac", "MP3": "libmp3lame"}
+AUDIO_CHANNELS = ["1", "2", "6", "8"]
+DEINTERLACE_MODES = ["0", "1"]
+AUDIO_TRACKS = ["one", "two", "three", "four"]
+# How aomenc, rav1e and svt-av1 read the yuv4mpegpipe from stdin
+ENCODER_INPUTS = [" -", " -", " -i stdin"]
+
+
+def flatten_preset(data):
+    """
+    Merges the groups of a preset file (settings, filters, audio, advanced_settings)
+    into one dictionary, the keys are unique over all groups
+    """
+    preset = {}
+    for group in ('settings', 'filters', 'audio', 'advanced_settings'):
+        for entry in data.get(group, []):
+            preset.update(entry)
+    return preset
+
+
+def get_video_filters(preset):
+    """
+    Returns the -vf argument of the enabled filters
+    """
+    filters = []
+    if preset['filters_crop']:
+        width_new = str(preset['filters_crop_right'] + preset['filters_crop_left'])
+        height_new = str(preset['filters_crop_top'] + preset['filters_crop_bottom'])
+        filters.append("crop=iw-" + width_new + ":ih-" + height_new + ":" + str(preset['filters_crop_left']) + ":" + str(preset['filters_crop_top']))
+    if preset['filters_deinterlace']:
+        filters.append("yadif=" + DEINTERLACE_MODES[preset['filters_deinterlace_type']])
+    if preset['filters_rotate']:
+        if preset['filters_rotate_amount'] == 0:
+            filters.append("transpose=1")
+        elif preset['filters_rotate_amount'] == 1:
+            filters.append("transpose=2")
+        elif preset['filters_rotate_amount'] == 2:
+            filters.append("transpose=2,transpose=2")
+    if preset['filters_resize']:
+        # !!! Has to be last, else ffmpeg logic fails
+        filters.append("scale=" + str(preset['filters_resize_width']) + ":" + str(preset['filters_resize_height']))
+    if not filters:
+        return ""
+    return " -vf " + ",".join(filters)
+
+
+def get_pipe_color_fmt(preset):
+    """
+    Returns the pixel format of the yuv4mpegpipe between ffmpeg and the encoder
+    """
+    fmt = ["yuv420p", "yuv422p", "yuv444p"][preset['video_color_fmt']]
+    depth = preset['video_bit_depth']
+    if depth == 0:
+        fmt += " -strict -1"
+    elif depth == 1:
+        fmt += "10le -strict -1"
+    elif depth == 2:
+        fmt += "12le -strict -1"
+    return fmt
+
+
+def get_encoder_settings(preset, tools, thread_settings=None, advanced=None):
+    """
+    Returns the encoder command and its pass / output arguments
+
+    Attributes
+    ----------
+    preset : dict - flattened preset
+    tools : dict - paths of the encoders
+    thread_settings : dict - threads and log2 tiles for the basic settings (thread_config)
+    advanced : string - arguments of the advanced settings tab, see get_advanced_settings()
+    """
+    encoder = preset['video_encoder']
+    if thread_settings is None:
+        thread_settings = {'threads': 4, 'tile_columns': 1, 'tile_rows': 2}
+    result = get_pass_arguments(encoder, preset['video_passes'])
+    settings = None
+    if encoder == 0: # aomenc
+        settings = '"' + tools['aomenc'] + '"' + ENCODER_INPUTS[0] + " --bit-depth=" + BIT_DEPTHS[preset['video_bit_depth']]
+        settings += [" --i420", " --i422", " --i444"][preset['video_color_fmt']]
+        settings += " --cpu-used=" + str(preset['video_speed'])
+        if preset['video_q']:
+            settings += " --end-usage=q --cq-level=" + str(preset['video_q_amount'])
+        elif preset['video_vbr']:
+            settings += " --end-usage=vbr --target-bitrate=" + str(preset['video_vbr_amount'])
+        if advanced is None:
+            # Basic Settings
+            settings += " --threads=" + str(thread_settings['threads'])
+            settings += " --tile-columns=" + str(thread_settings['tile_columns'])
+            settings += " --tile-rows=" + str(thread_settings['tile_rows']) + " "
+    elif encoder == 1: # rav1e
+        settings = '"' + tools['rav1e'] + '"' + ENCODER_INPUTS[1] + " --speed " + str(preset['video_speed'])
+        if preset['video_q']:
+            settings += " --quantizer " + str(preset['video_q_amount'])
+        elif preset['video_vbr']:
+            settings += " --bitrate " + str(preset['video_vbr_amount'])
+        if advanced is None:
+            # Basic Settings
+            settings += " --threads " + str(thread_settings['threads'])
+            settings += " --tile-cols " + str(2 ** thread_settings['tile_columns'])          # rav1e expects the amount of tiles
+            settings += " --tile-rows " + str(2 ** thread_settings['tile_rows'])
+    elif encoder == 2: # svt-av1
+        settings = '"' + tools['svtav1'] + '"' + ENCODER_INPUTS[2] + " --preset " + str(preset['video_speed'])
+        if preset['video_q']:
+            settings += " --rc 0 -q " + str(preset['video_q_amount'])
+        elif preset['video_vbr']:
+            settings += " --rc 1 --tbr " + str(preset['video_vbr_amount'])
+    if advanced is not None:
+        settings += advanced
+    result['settings'] = settings
+    return result
+
+
+def get_pass_arguments(encoder, passes):
+    """
+    Returns the pass and output arguments of the encoder (index of the encoder combo box),
+    passes : 0 = 1 pass, 1 = 2 pass
+    """
+    result = {'passes': None, 'pass_one': None, 'pass_two': None, 'output': None, 'output_stats': None}
+    if encoder == 0: # aomenc
+        if passes == 0:
+            result['passes'] = " --passes=1 "
+        elif passes == 1:
+            result['passes'] = " --passes=2 "
+            result['pass_one'] = " --pass=1 "
+            result['pass_two'] = " --pass=2 "
+        result['output'] = " --output="
+        result['output_stats'] = " --fpf="
+    elif encoder == 1: # rav1e
+        result['output'] = " --output "
+        result['passes'] = " " # rav1e still does not support 2pass encoding
+    elif encoder == 2: # svt-av1
+        if passes == 0:
+            result['passes'] = " --passes 1 "
+        elif passes == 1:
+            result['passes'] = " --irefresh-type 2 --passes 2 "
+            result['pass_one'] = " --pass 1 "
+            result['pass_two'] = " --pass 2 "
+        result['output'] = " -b "
+    return result
+
+
+def get_advanced_settings(preset):
+    """
+    Returns the arguments of the advanced settings tab, None in basic mode
+    or for presets saved before the advanced settings were stored
+    """
+    if not preset.get('video_advanced'):
+        return None
+    encoder = preset['video_encoder']
+    settings = ""
+    try:
+        if encoder == 0: # aomenc
+            settings += " --threads=" + str(preset['aomenc_threads'])                                 # Threads
+            settings += " --tile-rows=" + str(preset['aomenc_tile_rows'])                             # Tile Rows
+            settings += " --tile-columns=" + str(preset['aomenc_tile_cols'])                          # Tile Columns
+            settings += " --kf-max-dist=" + str(preset['aomenc_gop'])                                 # Max GOP
+            settings += " --lag-in-frames=" + str(preset['aomenc_lag_in_frames'])                     # Frame Buffer
+            settings += " --tune=" + preset['aomenc_tune']                                            # Tune
+            settings += " --aq-mode=" + str(preset['aomenc_aq_mode'])                                 # AQ Mode
+            settings += " --color-primaries=" + preset['aomenc_color_primaries']                      # Color Primaries
+            settings += " --transfer-characteristics=" + preset['aomenc_color_transfer']              # Color Transfer
+            settings += " --matrix-coefficients=" + preset['aomenc_color_matrix']                     # Color Matrix
+            if preset['aomenc_denoise']:
+                settings += " --denoise-noise-level=" + str(preset['aomenc_denoise_level'])          # Denoise Noise Level
+        elif encoder == 1: # rav1e
+            settings += " --threads " + str(preset['rav1e_threads'])                                  # Threads
+            settings += " --tile-rows " + str(preset['rav1e_tile_rows'])                              # Tile Rows
+            settings += " --tile-cols " + str(preset['rav1e_tile_cols'])                              # Tile Columns
+            settings += " --keyint " + str(preset['rav1e_gop'])                                       # Max GOP
+            settings += " --range " + preset['rav1e_range']                                           # Color Range
+            settings += " --primaries " + preset['rav1e_color_primaries']                             # Color Primaries
+            settings += " --transfer " + preset['rav1e_color_transfer']                               # Color Transfer
+            settings += " --matrix " + preset['rav1e_color_matrix']                                   # Color Matrix
+            settings += " --tune " + preset['rav1e_tune']                                             # Tune
+            if preset['rav1e_content_light']:
+                settings += " --content-light " + str(preset['rav1e_cll']) + "," + str(preset['rav1e_fall'])  # Content Light Cll, Fall
+            if preset['rav1e_mastering']:
+                # G(x,y)B(x,y)R(x,y)WP(x,y)L(max,min)
+                values = [str(value) for value in preset['rav1e_mastering_display']]
+                settings += " --mastering-display " + "".join(name + "(" + values[2 * i] + "," + values[2 * i + 1] + ")" for i, name in enumerate(("G", "B", "R", "WP", "L")))
+        elif encoder == 2: # svt-av1
+            settings += " --tile-columns " + str(preset['svt_tile_cols'])
+            settings += " --tile-rows " + str(preset['svt_tile_rows'])
+            settings += " --keyint " + str(preset['svt_gop'])
+            settings += " --adaptive-quantization " + str(preset['svt_aq'])
+    except KeyError:
+        return None
+    return settings
+
+
+def get_custom_settings(preset):
+    """
+    Returns the custom encoder command line stored with the preset, None if there is none.
+    Presets saved before 'video_custom' existed always stored the command line in advanced mode
+    """
+    if preset.get('video_custom', preset.get('video_advanced')) and preset.get('command_line'):
+        return preset['command_line']
+    return None
+
+
+def get_audio_tracks(preset):
+    """
+    Returns (track index, ffmpeg arguments) of every enabled audio track, every track is encoded into its own file
+    """
+    tracks = []
+    for i, track in enumerate(AUDIO_TRACKS):
+        if preset['track_' + track]:
+            command = get_audio_track_command(str(i), AUDIO_CODECS[preset['track_' + track + '_codec']], str(preset['track_' + track + '_bitrate']),
+                                              AUDIO_CHANNELS[preset['track_' + track + '_layout']], list(AUDIO_LANGUAGES.values())[preset['track_' + track + '_language']], '0')
+            tracks.append((i, command + " -af aformat=channel_layouts=" + '"' + "7.1|5.1|stereo|mono" + '"'))
+    return tracks
+
+
+def get_audio_track_command(activetrackindex, audiocodec, activetrackbitrate, channellayout, lang, outputindex=None):
+    # outputindex: stream index in the output file, the same as the track index if all tracks go into one file
+    if outputindex is None:
+        outputindex = activetrackindex
+    # Audio Mapping
+    audio = ' -map 0:a:' + activetrackindex + ' -c:a:' + outputindex
+    # Codec
+    audio += ' ' + AUDIO_CODEC_LIBRARIES[audiocodec]
+    # Channel Layout / Bitrate
+    audio += ' -b:a:' + outputindex + ' ' + activetrackbitrate + 'k'
+    audio += ' -ac:a:' + outputindex + ' ' + channellayout
+    # Metadata
+    audio += ' -metadata:s:a:' + outputindex + ' language=' + lang
+    audio += ' -metadata:s:a:' + outputindex + ' title=' + '"' + '[' + lang.upper() + '] ' + audiocodec + ' ' + activetrackbitrate + 'kbps' + '"'
+    return audio
+
+
+def get_audio_encode_command(video_input, audio_command, audio_output, ffmpeg_path, progress_file=None):
+    progress = ""
+    if progress_file is not None:
+        progress = " -nostats -progress \"" + progress_file + "\""
+    return "\"" + ffmpeg_path + "\"" + progress + " -i \"" + video_input + "\" -map_metadata -1 -vn -sn " + audio_command + " \"" + audio_output + "\""
+
+
+def get_splitting_codec(preset):
+    """
+    Returns the video codec of the lossless chunk files of the equal chunking
+    """
+    return ["libx264 -crf 0 -preset ultrafast",
+            "ffv1 -level 3 -threads 6 -coder 1 -context 1 -g 1 -slicecrc 0 -slices 4",
+            "utvideo"][preset.get('splitting_chunking_codec', 0)]
+
+
+def get_splitting_hash(preset, filter_command):
+    if preset['splitting_method'] == 0:
+        # Settings added later are only part of the hash if they are used, older manifests stay valid
+        values = [preset['splitting_method'], preset['splitting_scene_threshold']]
+        if preset.get('splitting_scene_analysis', 0):
+            values.append(preset['splitting_scene_analysis'])
+        if preset.get('splitting_scene_min', 0) or preset.get('splitting_scene_max', 0):
+            values += [preset.get('splitting_scene_min', 0), preset.get('splitting_scene_max', 0)]
+        return manifest.get_hash(*values)
+    # Equal Chunking cuts at the keyframes of the index
+    if preset.get('splitting_chunking_lossless', False):
+        # The filters are applied while writing the lossless chunks
+        return manifest.get_hash(preset['splitting_method'], preset['splitting_chunking_length'], "keyframes", get_splitting_codec(preset), filter_command)
+    return manifest.get_hash(preset['splitting_method'], preset['splitting_chunking_length'], "keyframes")
+
+
+def get_encoding_hash(preset, encoder, pipe_color_fmt, filter_command):
+    return manifest.get_hash(encoder['settings'], encoder['passes'], encoder['pass_one'], encoder['pass_two'], pipe_color_fmt, filter_command, preset['video_passes'])
+
+
+def get_seek_arguments(seek_point):
+    # Input-side seeking: ffmpeg jumps to the keyframe before the chunk start and decodes
+    # from there, instead of decoding the whole source up to the chunk start.
+    # Because the video gets reencoded, -ss / -t as input options are frame accurate,
+    # ffmpeg trims the decoded frames to exactly the requested range.
+    points = seek_point.split()
+    seek = " -ss " + points[0]
+    if len(points) > 1:
+        seek += " -t " + str(Decimal(points[1]) - Decimal(points[0]))
+    return seek
+
+
+def get_seek_range(seek_args):
+    """
+    Returns (start, duration) of the arguments of get_seek_arguments(), None for the ones which are not set
+    """
+    points = seek_args.split()
+    start = points[points.index("-ss") + 1] if "-ss" in points else None
+    duration = points[points.index("-t") + 1] if "-t" in points else None
+    return start, duration
+
+
+def get_chunk_cost(seek_point, index):
+    # Estimated encoding cost of a scene chunk: duration * resolution
+    points = seek_point.split()
+    resolution = 1
+    duration = None
+    if len(points) > 1:
+        duration = float(points[1]) - float(points[0])
+    if index is not None:
+        stream = source_index.get_video_stream(index)
+        if stream is not None and stream['width'] and stream['height']:
+            resolution = stream['width'] * stream['height']
+        if duration is None and index['duration']:
+            duration = index['duration'] - float(points[0])
+    if duration is None:
+        # Unknown length of the last chunk, schedule it first
+        return float('inf')
+    return duration * resolution
+
+
+def get_chunk_commands(ffmpeg_path, input_args, pipe_color_fmt, filter_command, encoder, svt, two_pass, output_file, stats_file, progress_targets, null_path):
+    """
+    Returns the first and second pass (None for 1 pass) of one chunk
+
+    Attributes
+    ----------
+    input_args : string - seeking arguments and -i of the chunk input
+    encoder : dict - result of get_encoder_settings(), with the custom settings applied
+    svt : bool - svt-av1 needs -nostdin
+    two_pass : bool - 2 pass encoding
+    output_file : string - path of the .ivf output
+    stats_file : string - path of the first pass statistics
+    progress_targets : list - -progress targets of the passes
+    """
+    decode = [get_decode_command(ffmpeg_path, input_args, pipe_color_fmt, filter_command, svt, target) + " | " for target in progress_targets]
+    encode = get_encode_commands(encoder, two_pass, output_file, stats_file, null_path)
+    if not two_pass:
+        return decode[0] + encode[0], None
+    return decode[0] + encode[0], decode[1] + encode[1]
+
+
+def get_decode_command(ffmpeg_path, input_args, pipe_color_fmt, filter_command, svt, progress_target=None):
+    """
+    Returns the ffmpeg call which writes the filtered frames as yuv4mpegpipe to stdout
+    """
+    command = '"' + ffmpeg_path + '"' + " -loglevel 0 "
+    if progress_target is not None:
+        command += " -progress " + '"' + progress_target + '"'
+    command += input_args + " -pix_fmt " + pipe_color_fmt + " " + filter_command + " -color_range 0 -vsync 0"
+    if svt: # svt-av1 specific
+        command += " -nostdin"
+    return command + " -f yuv4mpegpipe -"
+
+
+def get_encode_commands(encoder, two_pass, output_file, stats_file, null_path):
+    """
+    Returns the encoder calls of the passes of one chunk, they read the yuv4mpegpipe from stdin
+    """
+    output_file = '"' + output_file + '"'
+    if not two_pass:
+        return [encoder['settings'] + encoder['passes'] + encoder['output'] + output_file]
+    stats_file = '"' + stats_file + '"'
+    return [encoder['settings'] + encoder['passes'] + encoder['pass_one'] + encoder['output'] + null_path + encoder['output_stats'] + stats_file,
+            encoder['settings'] + encoder['passes'] + encoder['pass_two'] + encoder['output'] + output_file + encoder['output_stats'] + stats_file]
+
+
+def write_concat_list(chunks_path):
+    """
+    Creates the list file of all encoded chunks for ffmpeg concat, returns its path
+    """
+    mux_file = os.path.join(chunks_path, "mux.txt")
+    with open(mux_file, "w") as fname:
+        for file in sorted(os.listdir(chunks_path)):
+            if file.endswith(".ivf"):
+                fname.write("file " + "'" + os.path.join(chunks_path, file) + "'" + "\n")
+    return mux_file
+
+
+def get_mux_command(ffmpeg_path, video_input_args, audio_files, video_output):
+    """
+    Returns the ffmpeg call which muxes the video and all audio tracks in one pass,
+    audio_files is a list of the encoded audio tracks, None if there is no audio
+
+    Attributes
+    ----------
+    video_input_args : list - input arguments of the video (concat list or ivf stream)
+    """
+    command = [ffmpeg_path, '-y'] + video_input_args
+    for audio_file in audio_files or []:
+        command += ['-i', audio_file]
+    if audio_files:
+        command += ['-map', '0:v']
+        for i in range(len(audio_files)):
+            command += ['-map', str(i + 1) + ':a']
+    return command + ['-c', 'copy', video_output]
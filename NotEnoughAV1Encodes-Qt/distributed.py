@@ -0,0 +1,612 @@
+"""
+This script encodes the chunks of a job on other machines.
+
+A worker agent (neav1e.py agent) is a small http server which encodes
+chunks with its own ffmpeg / encoders. The coordinator sends the parameters
+of a chunk (seek range, filters, encoder name and arguments), the agent builds
+the command lines itself. Encoder arguments can't contain shell characters or
+paths and can't set the input / output files.
+The coordinator uploads the chunk input (the source is only uploaded once per agent
+and removed once the job is done), polls the progress and downloads the finished .ivf
+into the chunks folder. Inputs are stored under the sha256 of their content, an agent
+which already has the file is skipped. If an agent gets lost, its chunks go back into
+the queue of the other agents, a chunk the agent rejects fails.
+
+Without a token the agent only listens on the loopback address.
+"""
+import os
+import re
+import json
+import hmac
+import uuid
+import hashlib
+import time
+import shlex
+import shutil
+import ipaddress
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import commands
+import encode_pool
+import progress
+
+# Same order as the encoder combo box
+ENCODERS = ('aomenc', 'rav1e', 'svtav1')
+KEY_PATTERN = re.compile(r"^[0-9a-f]+$")
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+TIME_PATTERN = re.compile(r"^[0-9]+(\.[0-9]+)?$")
+# The agent quotes every argument, these characters mean nothing to sh / cmd inside quotes
+ARGUMENT_PATTERN = re.compile(r"^[A-Za-z0-9_.,=+()-]+$")
+# Options which read or write files, the agent sets the input / output files itself
+FILE_OPTIONS = ("-i", "--input", "-o", "--output", "-b", "--fpf", "--stats", "--first-pass", "--second-pass",
+                "-r", "--reconstruction", "--recon", "--stat-file", "--input-stat-file", "--output-stat-file",
+                "-c", "--config", "--film-grain-table", "--fgs-table")
+# Preset values of the filters / the pipe format, see commands.get_video_filters() and get_pipe_color_fmt()
+FILTER_KEYS = ('filters_crop', 'filters_crop_top', 'filters_crop_right', 'filters_crop_bottom', 'filters_crop_left',
+               'filters_resize', 'filters_resize_width', 'filters_resize_height', 'filters_rotate', 'filters_rotate_amount',
+               'filters_deinterlace', 'filters_deinterlace_type')
+COLOR_KEYS = ('video_color_fmt', 'video_bit_depth')
+POLL_INTERVAL = 1
+TIMEOUT = 60
+# Free space an upload has to leave on the agent
+RESERVED_SPACE = 1 << 30
+
+
+def get_file_hash(path):
+    """
+    Returns the sha256 of the file content, the key of an uploaded input
+    """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file_input:
+        for block in iter(lambda: file_input.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def check_encoder_arguments(arguments):
+    """
+    Raises ValueError if an encoder argument isn't allowed on the agents
+    """
+    for argument in arguments:
+        if not isinstance(argument, str) or not ARGUMENT_PATTERN.match(argument) or argument.split("=")[0] in FILE_OPTIONS:
+            raise ValueError("Encoder argument not allowed on the agents: " + str(argument))
+
+
+def get_preset_values(values, keys):
+    # Only the given keys, every value is a number or a bool
+    preset = {key: values[key] for key in keys}
+    if not all(isinstance(value, int) and value >= 0 for value in preset.values()):
+        raise ValueError("Invalid chunk settings")
+    return preset
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+#  ═══════════════════════════════════════════ Agent ══════════════════════════════════════════
+
+class Agent:
+    """
+    Runs the chunks it gets from the coordinators
+
+    Attributes
+    ----------
+    work_dir : string - folder of the uploaded inputs and the chunk outputs
+    tools : dict - paths of ffmpeg and the encoders of this machine
+    worker_count : int - amount of chunks which encode at the same time
+    token : string - the coordinators have to send this token, None accepts every request
+    log : function - receives log messages
+    """
+    def __init__(self, work_dir, tools, worker_count, token, log):
+        self.work_dir = work_dir
+        self.tools = tools
+        self.worker_count = worker_count
+        self.token = token
+        self.log = log
+        self.limit = threading.Semaphore(worker_count)
+        self.lock = threading.Lock()
+        self.chunks = {}
+        # Input key: amount of chunks which use it, inputs in removed are deleted once they are unused
+        self.inputs = {}
+        self.removed = set()
+        for folder in ("Inputs", "Chunks"):
+            # Files of a previous run are not known to any coordinator anymore
+            shutil.rmtree(os.path.join(work_dir, folder), ignore_errors=True)
+            os.makedirs(os.path.join(work_dir, folder), exist_ok=True)
+
+    def get_input_file(self, key):
+        return os.path.join(self.work_dir, "Inputs", key)
+
+    def get_chunk_dir(self, chunk_id):
+        return os.path.join(self.work_dir, "Chunks", chunk_id)
+
+    def get_chunk_commands(self, chunk_id, data):
+        """
+        Returns the commands of the passes of a chunk, built from its parameters with the tools of this machine.
+        Raises ValueError / KeyError / IndexError / TypeError if the parameters are invalid
+
+        Attributes
+        ----------
+        data : dict - name, input (key of the uploaded file), start / duration (seconds as string or None),
+               filters (values of FILTER_KEYS, empty if the input is filtered already), color (values of COLOR_KEYS),
+               encoder (one of ENCODERS), passes (1 or 2), arguments (list of encoder arguments)
+        """
+        if not NAME_PATTERN.match(data['name']) or not KEY_PATTERN.match(data['input']):
+            raise ValueError("Invalid chunk name or input")
+        seek_args = ""
+        for option, value in (("-ss", data['start']), ("-t", data['duration'])):
+            if value is not None:
+                if not isinstance(value, str) or not TIME_PATTERN.match(value):
+                    raise ValueError("Invalid seek range")
+                seek_args += " " + option + " " + value
+        filter_command = commands.get_video_filters(get_preset_values(data['filters'], FILTER_KEYS)) if data['filters'] else ""
+        pipe_color_fmt = commands.get_pipe_color_fmt(get_preset_values(data['color'], COLOR_KEYS))
+        encoder_index = ENCODERS.index(data['encoder'])
+        check_encoder_arguments(data['arguments'])
+        if data['passes'] not in (1, 2):
+            raise ValueError("Invalid amount of passes")
+        two_pass = data['passes'] == 2
+        encoder = commands.get_pass_arguments(encoder_index, 1 if two_pass else 0)
+        if two_pass and encoder['pass_one'] is None:
+            raise ValueError(data['encoder'] + " has no 2 pass encoding")
+        encoder['settings'] = '"' + self.tools[data['encoder']] + '"' + commands.ENCODER_INPUTS[encoder_index] + "".join(' "' + argument + '"' for argument in data['arguments'])
+        chunk_dir = self.get_chunk_dir(chunk_id)
+        targets = [os.path.join(chunk_dir, "chunk.log")] if not two_pass else [os.path.join(chunk_dir, "1st.log"), os.path.join(chunk_dir, "2nd.log")]
+        first, second = commands.get_chunk_commands(self.tools['ffmpeg'], seek_args + ' -i "' + self.get_input_file(data['input']) + '"', pipe_color_fmt, filter_command,
+                                                    encoder, encoder_index == 2, two_pass, os.path.join(chunk_dir, "chunk.ivf"), os.path.join(chunk_dir, "chunk.stats"), targets, os.devnull)
+        return [first] if second is None else [first, second]
+
+    def start_chunk(self, chunk_id, data, chunk_commands):
+        chunk_dir = self.get_chunk_dir(chunk_id)
+        os.makedirs(chunk_dir, exist_ok=True)
+        with self.lock:
+            self.chunks[chunk_id] = {'state': 'queued', 'reader': progress.ProgressReader(chunk_dir)}
+            self.inputs[data['input']] = self.inputs.get(data['input'], 0) + 1
+        threading.Thread(target=self.run_chunk, args=(chunk_id, data, chunk_commands), daemon=True).start()
+
+    def run_chunk(self, chunk_id, data, chunk_commands):
+        state = 'done'
+        with self.limit:
+            self.set_state(chunk_id, 'running')
+            self.log("Chunk started: " + data['name'])
+            for command in chunk_commands:
+                if encode_pool.run_command(command) != 0:
+                    state = 'failed'
+                    break
+        with self.lock:
+            self.inputs[data['input']] -= 1
+            if data.get('delete_input'):
+                self.removed.add(data['input'])
+            self.remove_unused(data['input'])
+        self.log("Chunk " + state + ": " + data['name'])
+        self.set_state(chunk_id, state)
+
+    def remove_input(self, key):
+        """
+        Deletes an uploaded input, inputs which are still in use are deleted once their chunks are done
+        """
+        with self.lock:
+            self.removed.add(key)
+            self.remove_unused(key)
+
+    def remove_unused(self, key):
+        # Call with the lock held
+        if key in self.removed and not self.inputs.get(key):
+            self.removed.discard(key)
+            self.inputs.pop(key, None)
+            try:
+                os.remove(self.get_input_file(key))
+            except OSError:
+                pass
+
+    def set_state(self, chunk_id, state):
+        with self.lock:
+            if chunk_id in self.chunks:
+                self.chunks[chunk_id]['state'] = state
+
+    def get_status(self, chunk_id):
+        """
+        Returns the state and the encoded frames (of all passes) of a chunk, None if it is unknown
+        """
+        with self.lock:
+            chunk = self.chunks.get(chunk_id)
+            if chunk is None:
+                return None
+            try:
+                chunk['reader'].update()
+            except OSError:
+                pass
+            return {'state': chunk['state'], 'frames': chunk['reader'].total_frames()}
+
+    def remove_chunk(self, chunk_id):
+        with self.lock:
+            self.chunks.pop(chunk_id, None)
+        shutil.rmtree(self.get_chunk_dir(chunk_id), ignore_errors=True)
+
+
+class AgentHandler(BaseHTTPRequestHandler):
+    """
+    GET /status, HEAD / PUT / DELETE /inputs/<key>, POST / GET / DELETE /chunks/<id>, GET /chunks/<id>/ivf
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, code):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def get_route(self):
+        """
+        Returns (resource, key, rest) of the request path, None if it is not allowed
+        """
+        agent = self.server.agent
+        if agent.token is not None and not hmac.compare_digest(self.headers.get("X-Token", ""), agent.token):
+            self.send_empty(403)
+            return None
+        parts = self.path.strip("/").split("/")
+        if parts == ["status"]:
+            return "status", None, None
+        if len(parts) in (2, 3) and parts[0] in ("inputs", "chunks") and KEY_PATTERN.match(parts[1]):
+            return parts[0], parts[1], parts[2] if len(parts) == 3 else None
+        self.send_empty(404)
+        return None
+
+    def do_HEAD(self):
+        route = self.get_route()
+        if route is None:
+            return
+        if route[0] == "inputs" and os.path.isfile(self.server.agent.get_input_file(route[1])):
+            self.send_empty(200)
+        else:
+            self.send_empty(404)
+
+    def do_PUT(self):
+        route = self.get_route()
+        if route is None:
+            return
+        if route[0] != "inputs":
+            self.send_empty(405)
+            return
+        agent = self.server.agent
+        try:
+            remaining = int(self.headers["Content-Length"])
+        except (KeyError, TypeError, ValueError):
+            self.send_empty(411)
+            return
+        # Nothing beyond Content-Length is read, the upload has to fit on the disk
+        if remaining < 0 or remaining > shutil.disk_usage(agent.work_dir).free - RESERVED_SPACE:
+            self.close_connection = True
+            self.send_empty(413)
+            return
+        input_file = agent.get_input_file(route[1])
+        temp_file = input_file + "." + uuid.uuid4().hex + ".tmp"
+        file_hash = hashlib.sha256()
+        with open(temp_file, 'wb') as outfile:
+            while remaining > 0:
+                data = self.rfile.read(min(remaining, 1 << 20))
+                if not data:
+                    break
+                file_hash.update(data)
+                outfile.write(data)
+                remaining -= len(data)
+        # The key is the hash of the content, a truncated or different file is rejected
+        if remaining > 0 or file_hash.hexdigest() != route[1]:
+            os.remove(temp_file)
+            self.send_empty(400)
+            return
+        os.replace(temp_file, input_file)
+        self.send_empty(201)
+
+    def do_POST(self):
+        route = self.get_route()
+        if route is None:
+            return
+        if route[0] != "chunks" or route[2] is not None:
+            self.send_empty(405)
+            return
+        agent = self.server.agent
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            chunk_commands = agent.get_chunk_commands(route[1], data)
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            self.send_empty(400)
+            return
+        if not os.path.isfile(agent.get_input_file(data['input'])):
+            self.send_empty(409)
+            return
+        agent.start_chunk(route[1], data, chunk_commands)
+        self.send_empty(202)
+
+    def do_GET(self):
+        route = self.get_route()
+        if route is None:
+            return
+        agent = self.server.agent
+        if route[0] == "status":
+            self.send_json(200, {'workers': agent.worker_count})
+            return
+        status = agent.get_status(route[1]) if route[0] == "chunks" else None
+        if status is None:
+            self.send_empty(404)
+        elif route[2] is None:
+            self.send_json(200, status)
+        elif route[2] == "ivf" and status['state'] == 'done':
+            ivf_file = os.path.join(agent.get_chunk_dir(route[1]), "chunk.ivf")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(os.path.getsize(ivf_file)))
+            self.end_headers()
+            with open(ivf_file, 'rb') as file_ivf:
+                shutil.copyfileobj(file_ivf, self.wfile)
+        else:
+            self.send_empty(404)
+
+    def do_DELETE(self):
+        route = self.get_route()
+        if route is None:
+            return
+        if route[2] is None:
+            if route[0] == "chunks":
+                self.server.agent.remove_chunk(route[1])
+            elif route[0] == "inputs":
+                self.server.agent.remove_input(route[1])
+        self.send_empty(204)
+
+
+def start_server(host, port, agent):
+    """
+    Returns the http server of the agent, raises ValueError if the agent has no token and the address isn't a loopback address
+    """
+    if agent.token is None and not is_loopback(host):
+        raise ValueError("The agent needs a token to listen on " + host + ", without one it only listens on 127.0.0.1")
+    server = ThreadingHTTPServer((host, port), AgentHandler)
+    server.daemon_threads = True
+    server.agent = agent
+    agent.log("Agent listening on " + host + ":" + str(server.server_address[1]) + ", Workers: " + str(agent.worker_count))
+    return server
+
+
+def run_agent(host, port, agent):
+    """
+    Serves the agent until the program gets stopped, see start_server()
+    """
+    start_server(host, port, agent).serve_forever()
+
+
+#  ════════════════════════════════════════ Coordinator ═══════════════════════════════════════
+
+def get_encoder_arguments(settings, encoder_index):
+    """
+    Returns the arguments of the encoder command (job.encoder['settings']) without the encoder
+    and its stdin input, raises ValueError if one of them isn't allowed on the agents
+    """
+    arguments = shlex.split(settings)[1:]
+    stdin = commands.ENCODER_INPUTS[encoder_index].split()
+    if arguments[:len(stdin)] == stdin:
+        arguments = arguments[len(stdin):]
+    check_encoder_arguments(arguments)
+    return arguments
+
+
+def get_remote_chunks(job):
+    """
+    Returns the chunks of job.set_queue() with the parameters the agents build their commands from
+    """
+    queued = dict(zip(job.queue_names, job.queue_costs))
+    encoder_index = job.preset['video_encoder']
+    arguments = get_encoder_arguments(job.encoder['settings'], encoder_index)
+    chunks = []
+    for name, input_file, seek_args, filter_command, _ in job.get_chunk_inputs():
+        if name not in queued:
+            continue
+        start, duration = commands.get_seek_range(seek_args)
+        # Lossless chunk files are filtered already
+        filters = {key: job.preset[key] for key in FILTER_KEYS} if filter_command else {}
+        data = {'name': name, 'start': start, 'duration': duration, 'filters': filters, 'color': {key: job.preset[key] for key in COLOR_KEYS},
+                'encoder': ENCODERS[encoder_index], 'passes': job.preset['video_passes'] + 1, 'arguments': arguments}
+        chunks.append({'name': name, 'input_file': input_file, 'cost': queued[name], 'data': data})
+    chunks.sort(key=lambda chunk: chunk['cost'], reverse=True)
+    return chunks
+
+
+class Coordinator:
+    """
+    Hands the chunks of a job to the worker agents
+
+    Attributes
+    ----------
+    job : engine.Job - job with generated queue
+    agents : list - host:port of the agents
+    token : string - token of the agents
+    chunk_finished : function - receives the name of a chunk and if all of its passes succeeded
+    progress : function - receives the encoded frames of all chunks
+    """
+    def __init__(self, job, agents, token, chunk_finished, progress):
+        self.job = job
+        self.agents = agents
+        self.token = token
+        self.chunk_finished = chunk_finished
+        self.progress = progress
+        self.condition = threading.Condition()
+        self.pending = deque(get_remote_chunks(job))
+        self.running = 0
+        self.frames = {}
+        self.lost = set()
+        self.upload_locks = {agent: threading.Lock() for agent in agents}
+        # Path: sha256 of the inputs, the source is hashed once for all agents
+        self.hashes = {}
+        self.hash_lock = threading.Lock()
+        # (agent, key) of the sources the chunks used, they are removed once the job is done
+        self.sources = set()
+
+    def request(self, agent, method, path, data=None, headers=None):
+        headers = dict(headers or {})
+        if self.token is not None:
+            headers["X-Token"] = self.token
+        return urllib.request.urlopen(urllib.request.Request("http://" + agent + path, data=data, headers=headers, method=method), timeout=TIMEOUT)
+
+    def run(self):
+        """
+        Returns when all chunks are finished, chunks which no agent could encode count as failed
+        """
+        threads = []
+        for agent in self.agents:
+            try:
+                with self.request(agent, "GET", "/status") as response:
+                    workers = json.load(response)['workers']
+            except (OSError, ValueError, KeyError, http.client.HTTPException) as error:
+                self.job.log("Agent " + agent + " not reachable: " + str(error))
+                continue
+            self.job.log("Agent " + agent + ": " + str(workers) + " Workers")
+            for _ in range(workers):
+                threads.append(threading.Thread(target=self.work, args=(agent,), daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for chunk in self.pending:
+            self.chunk_finished(chunk['name'], False)
+        for agent, key in self.sources:
+            try:
+                self.request(agent, "DELETE", "/inputs/" + key).close()
+            except (OSError, http.client.HTTPException):
+                pass
+
+    def work(self, agent):
+        while True:
+            with self.condition:
+                # A chunk of a lost agent can come back as long as chunks are running
+                self.condition.wait_for(lambda: self.pending or self.running == 0 or agent in self.lost)
+                if not self.pending or agent in self.lost:
+                    return
+                chunk = self.pending.popleft()
+                self.running += 1
+            try:
+                success = self.encode(agent, chunk)
+            except urllib.error.HTTPError as error:
+                # The agent is fine but rejected the chunk (e.g. an argument it doesn't allow), the chunk fails.
+                # Server errors and a rejected token mean the agent can't encode anything
+                if error.code == 403 or error.code >= 500:
+                    self.agent_lost(agent, chunk, error)
+                    return
+                self.job.log("Agent " + agent + " rejected " + chunk['name'] + ": " + str(error))
+                success = False
+            except (OSError, ValueError, KeyError, http.client.HTTPException) as error:
+                self.agent_lost(agent, chunk, error)
+                return
+            with self.condition:
+                self.chunk_finished(chunk['name'], success)
+                self.running -= 1
+                self.condition.notify_all()
+
+    def agent_lost(self, agent, chunk, error):
+        # The chunk goes back into the queue of the other agents
+        with self.condition:
+            if agent not in self.lost:
+                self.job.log("Agent " + agent + " lost: " + str(error))
+                self.lost.add(agent)
+            self.pending.appendleft(chunk)
+            self.frames.pop(chunk['name'], None)
+            self.running -= 1
+            self.condition.notify_all()
+
+    def get_key(self, input_file):
+        with self.hash_lock:
+            if input_file not in self.hashes:
+                self.hashes[input_file] = get_file_hash(input_file)
+            return self.hashes[input_file]
+
+    def upload(self, agent, input_file):
+        """
+        Uploads the input if the agent doesn't have a file with the same content yet, returns its key
+        """
+        key = self.get_key(input_file)
+        with self.upload_locks[agent]:
+            try:
+                self.request(agent, "HEAD", "/inputs/" + key).close()
+                return key
+            except urllib.error.HTTPError as error:
+                if error.code != 404:
+                    raise
+            with open(input_file, 'rb') as file_input:
+                self.request(agent, "PUT", "/inputs/" + key, file_input, {"Content-Length": str(os.path.getsize(input_file))}).close()
+        return key
+
+    def encode(self, agent, chunk):
+        """
+        Encodes the chunk on the agent, returns False if the encode failed,
+        raises HTTPError if the agent rejected it, OSError if the agent is not reachable anymore
+        """
+        # The source is kept by the agent for the other chunks until the job is done, chunk files are deleted
+        per_chunk_input = chunk['input_file'] != self.job.video_input
+        key = self.upload(agent, chunk['input_file'])
+        if not per_chunk_input:
+            with self.condition:
+                self.sources.add((agent, key))
+        chunk_id = uuid.uuid4().hex
+        data = json.dumps(dict(chunk['data'], input=key, delete_input=per_chunk_input)).encode()
+        try:
+            self.request(agent, "POST", "/chunks/" + chunk_id, data, {"Content-Type": "application/json"}).close()
+        except urllib.error.HTTPError:
+            # The agent rejected the chunk, its input file isn't used by anything else
+            if per_chunk_input:
+                self.request(agent, "DELETE", "/inputs/" + key).close()
+            raise
+        while True:
+            time.sleep(POLL_INTERVAL)
+            with self.request(agent, "GET", "/chunks/" + chunk_id) as response:
+                status = json.load(response)
+            self.set_frames(chunk['name'], status['frames'])
+            if status['state'] in ('done', 'failed'):
+                break
+        success = status['state'] == 'done'
+        if success:
+            ivf_file = os.path.join(self.job.get_chunks_path(), chunk['name'] + ".ivf")
+            with self.request(agent, "GET", "/chunks/" + chunk_id + "/ivf") as response, open(ivf_file + ".tmp", 'wb') as outfile:
+                shutil.copyfileobj(response, outfile)
+            os.replace(ivf_file + ".tmp", ivf_file)
+        self.request(agent, "DELETE", "/chunks/" + chunk_id).close()
+        return success
+
+    def set_frames(self, name, frames):
+        with self.condition:
+            if self.frames.get(name) == frames:
+                return
+            self.frames[name] = frames
+            total = sum(self.frames.values())
+        self.progress(total)
+
+
+def encode_chunks(job, agents, token, chunk_finished, progress):
+    """
+    Encodes the queue of the job on the agents (list of host:port)
+    """
+    try:
+        coordinator = Coordinator(job, agents, token, chunk_finished, progress)
+    except ValueError as error:
+        # e.g. a custom encoder argument with a path
+        job.log(str(error))
+        for name in job.queue_names:
+            chunk_finished(name, False)
+        return
+    coordinator.run()
@@ -0,0 +1,127 @@
+"""
+This script runs the chunk encodes in a pool of n-workers.
+
+It is used by the GUI worker and the headless engine,
+results are reported through callbacks.
+"""
+import os
+from multiprocessing.dummy import Pool
+from functools import partial
+from subprocess import Popen, DEVNULL
+import scheduler
+import placement
+
+
+def encode_chunks(pool_size, queue_names, queue_first, queue_second, queue_costs, policy, adaptive_bounds, pin_cores, chunk_finished, log, tail=None):
+    """
+    Attributes
+    ----------
+    pool_size : sets the amount of workers
+    queue_names : chunk names
+    queue_first : first pass queue list
+    queue_second : second pass queue list
+    queue_costs : estimated cost of every chunk
+    policy : name of the scheduling policy
+    adaptive_bounds : None, or (min, max) workers if the worker count follows the system load
+    pin_cores : pins every chunk to its own slot of cpu cores
+    chunk_finished : function - receives the name of a chunk and if all of its passes succeeded
+    log : function - receives decisions of the adaptive worker count / core placement
+    tail : tail_split.TailSplit - splits the last chunks for the idle workers, None = off
+    """
+    run_pool(pool_size, get_chunks(queue_names, queue_first, queue_second, queue_costs, policy), adaptive_bounds, pin_cores, chunk_finished, log, tail)
+
+
+def encode_live(pool_size, live_queue, adaptive_bounds, pin_cores, chunk_finished, log, tail=None):
+    """
+    Encodes the chunks while they are still added to the queue, e.g. as soon as their split is written
+
+    Attributes
+    ----------
+    live_queue : queue.Queue - (name, [passes]) of every chunk, None after the last chunk
+    """
+    run_pool(pool_size, iter(live_queue.get, None), adaptive_bounds, pin_cores, chunk_finished, log, tail)
+
+
+def run_pool(pool_size, chunks, adaptive_bounds, pin_cores, chunk_finished, log, tail=None):
+    """
+    Encodes (name, [passes]) of every chunk of the iterable, see encode_chunks()
+    """
+    limit = None
+    monitor = None
+    if adaptive_bounds is not None:
+        # The pool has threads for the upper bound, the limit decides how many of them encode
+        limit = scheduler.ConcurrencyLimit(min(max(pool_size, adaptive_bounds[0]), adaptive_bounds[1]))
+        monitor = scheduler.LoadMonitor(limit, adaptive_bounds[0], adaptive_bounds[1], log)
+        monitor.start()
+        pool_size = adaptive_bounds[1]
+    slots = None
+    if pin_cores:
+        # One slot per pool thread, a chunk keeps its slot until all of its passes are done
+        slots = placement.SlotPool(placement.get_slots(pool_size))
+        log("Core Slots: " + str(slots.free))
+    if tail is not None:
+        tail.run_pool(pool_size, chunks, limit, slots, chunk_finished, log)
+    else:
+        pool = Pool(pool_size)
+        for name, success in pool.imap_unordered(partial(encode_chunk, limit=limit, slots=slots), chunks):  # Multi Threaded Encoding
+            chunk_finished(name, success)
+        pool.close()
+    if monitor is not None:
+        monitor.stop()
+
+
+def get_chunks(queue_names, queue_first, queue_second, queue_costs, policy):
+    """
+    Returns (name, [passes]) of every chunk in the order of the scheduling policy
+    """
+    order = scheduler.get_order(policy, queue_costs)
+    # Every chunk runs its passes back to back in the same worker:
+    # the second pass starts as soon as its own first pass wrote the stats file,
+    # there is no barrier between the passes of different chunks
+    chunks = []
+    for i in order:
+        commands = [queue_first[i]]
+        if i < len(queue_second):
+            commands.append(queue_second[i])
+        chunks.append((queue_names[i], commands))
+    return chunks
+
+
+def encode_chunk(chunk, limit=None, slots=None, pass_started=None):
+    """
+    Runs the passes of one chunk, stops if a pass fails,
+    pass_started receives the name, the number and the process of every pass
+    """
+    name, commands = chunk
+    if limit is not None:
+        limit.acquire()
+    slot = slots.acquire() if slots is not None else None
+    try:
+        for number, command in enumerate(commands):
+            process = start_command(command, slot)
+            if pass_started is not None:
+                pass_started(name, number, process)
+            if process.wait() != 0:
+                return name, False
+        return name, True
+    finally:
+        if slot is not None:
+            slots.release(slot)
+        if limit is not None:
+            limit.release()
+
+
+def run_command(command, cpus=None):
+    """
+    Runs the ffmpeg | encoder pipe, optionally pinned to the given cpus
+    """
+    return start_command(command, cpus).wait()
+
+
+def start_command(command, cpus=None):
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        return Popen(command, shell=True, stderr=DEVNULL, preexec_fn=placement.get_pinning(cpus))
+    if cpus is not None and os.name == "nt":
+        return placement.start_pinned(command, cpus, shell=True, stderr=DEVNULL)
+    # macOS has no cpu affinity
+    return Popen(command, shell=True, stderr=DEVNULL)
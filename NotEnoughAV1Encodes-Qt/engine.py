@@ -0,0 +1,787 @@
+"""
+This script is the encoding pipeline without any Qt dependency.
+
+A Job holds the state of one source (temp folder, manifest, commands, queue),
+it is used by the GUI and by the headless command line interface.
+run_job() runs all stages of a job: audio (in the background), index, splitting,
+chunk encoding (local workers or worker agents) and muxing. With scene detection
+the chunks encode while the detection is still running, the last chunks
+can be split for the idle workers.
+"""
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from shutil import which
+
+import psutil
+
+import audio
+import commands
+import distributed
+import encode_pool
+import fanout
+import manifest
+import muxing
+import ivf
+import progress
+import source_index
+import splitting
+import tail_split
+import thread_config
+
+TOOLS = {'ffmpeg': "ffmpeg", 'ffprobe': "ffprobe", 'aomenc': "aomenc", 'rav1e': "rav1e", 'svtav1': "SvtAv1EncApp"}
+
+
+def get_tools(current_dir):
+    """
+    Returns the paths of ffmpeg and the encoders, binaries in the encoders folder are preferred over PATH
+    """
+    tools = {}
+    for key, name in TOOLS.items():
+        tools[key] = name
+        if os.path.isfile(os.path.join(current_dir, "encoders", name)) or os.path.isfile(os.path.join(current_dir, "encoders", name + ".exe")):
+            tools[key] = os.path.join(current_dir, "encoders", name)
+    return tools
+
+
+def find_missing_tools(tools, preset):
+    """
+    Returns the tools the preset needs which can't be found
+    """
+    needed = ['ffmpeg', 'ffprobe', ['aomenc', 'rav1e', 'svtav1'][preset['video_encoder']]]
+    return [tools[key] for key in needed if which(tools[key]) is None and not os.path.isfile(tools[key]) and not os.path.isfile(tools[key] + ".exe")]
+
+
+def load_preset_file(preset, current_dir):
+    """
+    Returns the flattened preset, preset is a path to a .json file or the name of a saved preset
+    """
+    preset_file = preset
+    if not os.path.isfile(preset_file):
+        preset_file = os.path.join(current_dir, 'Presets', preset + '.json')
+    with open(preset_file) as json_file:
+        return commands.flatten_preset(json.load(json_file))
+
+
+def get_worker_count(preset):
+    """
+    Returns the amount of chunks which encode at the same time (at the start in adaptive mode),
+    one per physical core if the preset has no worker count
+    """
+    worker_count = preset.get('worker_count', psutil.cpu_count(logical = False) - 1) + 1
+    bounds = get_adaptive_bounds(preset)
+    if bounds is not None:
+        worker_count = min(max(worker_count, bounds[0]), bounds[1])
+    return worker_count
+
+
+def get_adaptive_bounds(preset):
+    if not preset.get('worker_adaptive', False):
+        return None
+    maximum = preset.get('worker_max', psutil.cpu_count(logical = False))
+    return (min(preset.get('worker_min', 1), maximum), maximum)
+
+
+def get_thread_settings(preset, index=None):
+    """
+    Basic mode: threads and tiles per chunk from the worker count, cpu topology and resolution
+    """
+    width = height = None
+    stream = source_index.get_video_stream(index) if index is not None else None
+    if stream is not None:
+        width = stream['width']
+        height = stream['height']
+    return thread_config.get_thread_config(get_worker_count(preset), psutil.cpu_count(logical = False), psutil.cpu_count(), width, height)
+
+
+class Job:
+    """
+    State of the encode of one source
+
+    Attributes
+    ----------
+    video_input : string - path of the video input file
+    video_output : string - path of the muxed output
+    preset : dict - flattened preset
+    temp_dir : string - folder which holds the temp folders of all jobs and the scene cache
+    tools : dict - paths of ffmpeg, ffprobe and the encoders
+    log : function - receives log messages
+    """
+    def __init__(self, video_input, video_output, preset, temp_dir, tools, log):
+        self.video_input = video_input
+        self.video_output = video_output
+        self.preset = preset
+        self.tools = tools
+        self.log = log
+        self.temp_path = os.path.join(temp_dir, os.path.splitext(os.path.basename(video_input))[0])
+        self.cache_dir = os.path.join(temp_dir, "SceneCache")
+        self.job_manifest = None
+        self.filter_command = commands.get_video_filters(preset)
+        self.pipe_color_fmt = commands.get_pipe_color_fmt(preset)
+        self.encoder = None
+        self.progress_port = None
+        self.resumed_frames = 0
+        self.queue_names = []
+        self.queue_first_pass = []
+        self.queue_second_pass = []
+        self.queue_costs = []
+        self.incremental_mux = None
+        # One decoder feeds all chunk encoders
+        self.fanout = False
+        # Chunks finish while the scene detection still adds chunks and saves the manifest
+        self.lock = threading.RLock()
+        # Sub-chunks of the tail splitting: chunk name -> {'names': sub-chunks in order, 'done': set}
+        self.tail_splits = {}
+
+    def prepare(self):
+        # Create Temp Folders if not existant
+        for folder in ("Chunks", "Progress"):
+            Path(os.path.join(self.temp_path, folder)).mkdir(parents=True, exist_ok=True)
+        self.job_manifest = manifest.load_manifest(self.get_manifest_file(), source_index.get_source_key(self.video_input))
+
+    def get_index_file(self):
+        return os.path.join(self.temp_path, "index.json")
+
+    def get_manifest_file(self):
+        return os.path.join(self.temp_path, "manifest.json")
+
+    def get_splits_file(self):
+        return os.path.join(self.temp_path, "splits.txt")
+
+    def get_chunks_path(self):
+        return os.path.join(self.temp_path, "Chunks")
+
+    def get_progress_path(self):
+        return os.path.join(self.temp_path, "Progress")
+
+    def get_audio_path(self):
+        return os.path.join(self.temp_path, "Audio")
+
+    def start_audio(self):
+        """
+        Starts the encode of the enabled audio tracks in the background, returns None if no track is enabled
+        """
+        tracks = commands.get_audio_tracks(self.preset)
+        if not tracks:
+            return None
+        audio_encode = audio.AudioEncode(self.video_input, tracks, self.get_audio_path(), self.tools['ffmpeg'])
+        for command in audio_encode.get_commands():
+            self.log("Audio: " + command)
+        audio_encode.start()
+        return audio_encode
+
+    def get_index(self):
+        return source_index.load_index(self.video_input, self.get_index_file())
+
+    def get_duration(self):
+        # Duration of the source in seconds, None if it is not indexed yet
+        index = self.get_index()
+        return index['duration'] if index is not None else None
+
+    def save_manifest(self):
+        with self.lock:
+            manifest.save_manifest(self.job_manifest, self.get_manifest_file())
+
+    #  ═══════════════════════════════════════ Splitting ══════════════════════════════════════
+
+    def get_splitting_hash(self):
+        return commands.get_splitting_hash(self.preset, self.filter_command)
+
+    def uses_lossless_chunks(self):
+        # Equal chunking can write the chunks to lossless files, for sources which can't be seeked reliably,
+        # the fan-out doesn't seek, it reads the source from start to end
+        return self.preset['splitting_method'] == 1 and self.preset.get('splitting_chunking_lossless', False) and not self.fanout
+
+    def get_splitting_codec(self):
+        return commands.get_splitting_codec(self.preset) + " " + self.filter_command
+
+    def get_lossless_file(self, name):
+        return os.path.join(self.get_chunks_path(), name + ".mkv")
+
+    def get_lossless_ranges(self):
+        """
+        Returns (name, seek arguments, lossless file) of the queued chunks which have no lossless file yet
+        """
+        with open(self.get_splits_file()) as file_splits:
+            seek_points = list(file_splits)
+        ranges = []
+        for name in self.queue_names:
+            if not os.path.isfile(self.get_lossless_file(name)):
+                ranges.append((name, commands.get_seek_arguments(seek_points[int(name[5:])]) + " -i " + '"' + self.video_input + '"', self.get_lossless_file(name)))
+        return ranges
+
+    def streams_scenes(self):
+        # The chunks of the scene detection can encode before all scenes are known,
+        # the fan-out needs the frame ranges of all chunks when it starts
+        return self.preset['splitting_method'] == 0 and not self.fanout
+
+    def get_split_points(self):
+        if os.path.isfile(self.get_splits_file()):
+            with open(self.get_splits_file()) as file_splits:
+                return [line.rstrip() for line in file_splits]
+        return None
+
+    def resume_splitting(self):
+        """
+        Returns True if the splits of the previous run can be reused (same source and splitting settings),
+        else removes the chunks of the previous run
+        """
+        splitting_hash = self.get_splitting_hash()
+        if manifest.is_stage_done(self.job_manifest, 'splitting', splitting_hash) and manifest.get_stage_data(self.job_manifest, 'splitting') == self.get_split_points():
+            self.log("Resume: reusing splits")
+            return True
+        self.clear_chunks()
+        manifest.set_stage(self.job_manifest, 'splitting', splitting_hash, False)
+        self.save_manifest()
+        return False
+
+    def splitting_finished(self):
+        manifest.set_stage(self.job_manifest, 'splitting', self.get_splitting_hash(), True, self.get_split_points())
+        self.save_manifest()
+
+    def clear_chunks(self):
+        # Removes chunks and progress logs of a previous run, they don't match the new splits
+        for folder in (self.get_chunks_path(), self.get_progress_path()):
+            for file in os.listdir(folder):
+                os.remove(os.path.join(folder, file))
+
+    #  ════════════════════════════════════════ Queue ═════════════════════════════════════════
+
+    def set_encoder(self, custom_settings=None, advanced=None):
+        """
+        Attributes
+        ----------
+        custom_settings : string - replaces the generated encoder command
+        advanced : string - arguments of the advanced settings tab, see commands.get_advanced_settings()
+        """
+        thread_settings = None
+        if advanced is None:
+            thread_settings = get_thread_settings(self.preset, self.get_index())
+            self.log("Thread Config: " + str(thread_settings) + " Workers: " + str(get_worker_count(self.preset)))
+        self.encoder = commands.get_encoder_settings(self.preset, self.tools, thread_settings, advanced)
+        if custom_settings is not None:
+            self.encoder['settings'] = custom_settings
+
+    def get_progress_target(self, log_name):
+        # Where ffmpeg writes its -progress output: the local listener or a log file
+        if self.progress_port is not None:
+            return "http://127.0.0.1:" + str(self.progress_port) + "/" + log_name
+        return os.path.join(self.get_progress_path(), log_name)
+
+    def chunk_is_done(self, name):
+        return manifest.is_chunk_done(self.job_manifest, name, os.path.join(self.get_chunks_path(), name + ".ivf"))
+
+    def set_queue(self):
+        """
+        Generates the commands of all chunks which are not done yet
+        """
+        self.start_queue()
+        for chunk in self.get_chunk_inputs():
+            self.queue_chunk(*chunk)
+
+    def start_queue(self):
+        """
+        Empties the queue, the chunks are added with queue_chunk()
+        """
+        self.queue_names = []
+        self.queue_first_pass = []
+        self.queue_second_pass = []
+        self.queue_costs = []
+        self.resumed_frames = 0
+
+        # Changed encoder settings invalidate the chunks of a previous run
+        manifest.set_stage(self.job_manifest, 'encoding', commands.get_encoding_hash(self.preset, self.encoder, self.pipe_color_fmt, self.filter_command), False)
+        self.save_manifest()
+
+    def queue_chunk(self, name, input_file, seek_args, filter_command, cost):
+        """
+        Generates the commands of one chunk, returns (name, [passes]) like encode_pool.get_chunks(), None if the chunk is done
+        """
+        passes = self.preset['video_passes']
+        if self.chunk_is_done(name):
+            self.resumed_frames += manifest.get_chunk_frames(self.job_manifest, name) * (passes + 1)
+            return None
+        # Sub-chunks of a previous run which got interrupted, the chunk encodes as a whole
+        for file in os.listdir(self.get_chunks_path()):
+            if file.startswith(name + "_"):
+                os.remove(os.path.join(self.get_chunks_path(), file))
+        if passes == 0:
+            targets = [self.get_progress_target(name + ".log")]
+        else:
+            targets = [self.get_progress_target("1st_" + name + ".log"), self.get_progress_target("2nd_" + name + ".log")]
+        first, second = commands.get_chunk_commands(self.tools['ffmpeg'], seek_args + " -i " + '"' + input_file + '"', self.pipe_color_fmt, filter_command, self.encoder, self.preset['video_encoder'] == 2, passes == 1,
+                                                    os.path.join(self.get_chunks_path(), name + ".ivf"), os.path.join(self.get_chunks_path(), name + ".stats"), targets, os.devnull)
+        self.queue_names.append(name)
+        self.queue_costs.append(cost)
+        self.queue_first_pass.append(first)
+        if second is not None:
+            self.queue_second_pass.append(second)
+            return (name, [first, second])
+        return (name, [first])
+
+    def get_chunk_inputs(self):
+        """
+        Returns (name, input file, seek arguments, filter command, estimated cost) of every chunk
+        """
+        # Scene detection and equal chunking write splits.txt, the chunks are seeked in the source
+        index = self.get_index()
+        with open(self.get_splits_file()) as file_splits:
+            return [self.get_chunk_input(counter, seek_point, index) for counter, seek_point in enumerate(file_splits)]
+
+    def get_chunk_input(self, counter, seek_point, index):
+        """
+        Returns the chunk of one line of splits.txt, see get_chunk_inputs()
+        """
+        name = "split" + str(counter).zfill(6)
+        if self.uses_lossless_chunks():
+            # The lossless file holds the filtered range, it is written before the chunk encodes
+            return (name, self.get_lossless_file(name), "", "", commands.get_chunk_cost(seek_point, index))
+        return (name, self.video_input, commands.get_seek_arguments(seek_point), self.filter_command, commands.get_chunk_cost(seek_point, index))
+
+    def chunk_finished(self, name, success):
+        """
+        Only chunks with a complete .ivf file count as done, returns False if the chunk failed
+        """
+        with self.lock:
+            parent = name.split("_")[0]
+            if parent != name:
+                return self.sub_chunk_finished(parent, name, success)
+            if success:
+                frames = ivf.count_frames(os.path.join(self.get_chunks_path(), name + ".ivf"))
+                if frames is not None:
+                    manifest.set_chunk_done(self.job_manifest, name, frames)
+                    self.save_manifest()
+                    if self.incremental_mux is not None:
+                        self.incremental_mux.chunk_finished(name)
+                    return True
+            self.log("Chunk failed: " + name)
+            if self.incremental_mux is not None:
+                # The stream can't be complete anymore
+                self.incremental_mux.abort()
+            return False
+
+    #  ═════════════════════════════════════ Tail Splitting ═════════════════════════════════════
+
+    def get_tail_split(self):
+        """
+        Returns the tail splitting of the encoder pool, None if it is off
+        """
+        # Lossless files and the fan-out don't seek in the source
+        if not self.preset.get('worker_tail_split', False) or self.uses_lossless_chunks() or self.fanout:
+            return None
+        return tail_split.TailSplit(self.split_chunk, self.get_chunk_cost, self.preset.get('worker_tail_idle', 2), self.preset.get('worker_tail_window', 30))
+
+    def get_chunk_cost(self, name):
+        return self.queue_costs[self.queue_names.index(name)]
+
+    def split_chunk(self, name, parts):
+        """
+        Splits a chunk at the keyframes of the source into up to parts sub-chunks of similar length,
+        returns (name, [passes]) of the sub-chunks in order, None if there is no keyframe to split at
+        """
+        index = self.get_index()
+        points = self.get_split_points()[int(name[5:])].split()
+        start = float(points[0])
+        end = float(points[1]) if len(points) > 1 else index['duration']
+        if not end or not index['keyframes']:
+            return None
+        cuts = []
+        for part in range(1, parts):
+            # The keyframe closest to the equal split, the scene changes are keyframes too
+            keyframe = source_index.find_keyframe(index, start + (end - start) * part / parts, (end - start) / parts / 2)
+            if keyframe is not None and start < keyframe[1] < end and str(keyframe[1]) not in cuts:
+                cuts.append(str(keyframe[1]))
+        if not cuts:
+            return None
+        bounds = [points[0]] + cuts + points[1:]
+        seek_points = [bounds[i] + " " + bounds[i + 1] for i in range(len(bounds) - 1)]
+        if len(points) == 1:
+            seek_points.append(cuts[-1])
+        sub_chunks = []
+        for counter, seek_point in enumerate(seek_points):
+            sub_chunks.append(self.queue_chunk(name + "_" + str(counter).zfill(3), self.video_input, commands.get_seek_arguments(seek_point), self.filter_command, commands.get_chunk_cost(seek_point, index)))
+        with self.lock:
+            self.tail_splits[name] = {'names': [sub_chunk[0] for sub_chunk in sub_chunks], 'done': set()}
+        # The frames of the stopped chunk are encoded again by the sub-chunks
+        for log_name in (name + ".log", "1st_" + name + ".log", "2nd_" + name + ".log"):
+            if os.path.isfile(os.path.join(self.get_progress_path(), log_name)):
+                open(os.path.join(self.get_progress_path(), log_name), 'w').close()
+        return sub_chunks
+
+    def sub_chunk_finished(self, parent, name, success):
+        """
+        Joins the sub-chunks into the .ivf of their chunk once all of them are done
+        """
+        chunk_file = os.path.join(self.get_chunks_path(), name + ".ivf")
+        if not success or ivf.count_frames(chunk_file) is None:
+            self.log("Chunk failed: " + name)
+            if self.incremental_mux is not None:
+                self.incremental_mux.abort()
+            return False
+        split = self.tail_splits[parent]
+        split['done'].add(name)
+        if len(split['done']) < len(split['names']):
+            return True
+        files = [os.path.join(self.get_chunks_path(), sub_name + ".ivf") for sub_name in split['names']]
+        ivf.join_files(files, os.path.join(self.get_chunks_path(), parent + ".ivf"))
+        for sub_name in split['names']:
+            for extension in (".ivf", ".stats"):
+                if os.path.isfile(os.path.join(self.get_chunks_path(), sub_name + extension)):
+                    os.remove(os.path.join(self.get_chunks_path(), sub_name + extension))
+        return self.chunk_finished(parent, True)
+
+    def get_total_frames(self, count):
+        # Progress counts the frames of every pass
+        return count * (self.preset['video_passes'] + 1) * self.get_frame_factor()
+
+    def get_frame_factor(self):
+        # yadif=1 doubles the framerate
+        if self.preset['filters_deinterlace'] and self.preset['filters_deinterlace_type'] == 1:
+            return 2
+        return 1
+
+    #  ════════════════════════════════════════ Fan-out ═══════════════════════════════════════
+
+    def get_fanout_chunks(self):
+        """
+        Returns the chunks of the queue with their frame range for fanout.encode_chunks(), call after set_queue()
+        """
+        index = self.get_index()
+        factor = self.get_frame_factor()
+        two_pass = self.preset['video_passes'] == 1
+        with open(self.get_splits_file()) as file_splits:
+            split_points = {"split" + str(counter).zfill(6): seek_point.split() for counter, seek_point in enumerate(file_splits)}
+        chunks = []
+        for i, name in enumerate(self.queue_names):
+            points = split_points[name]
+            start = source_index.get_frame_number(index, float(points[0])) * factor
+            count = None
+            if len(points) > 1:
+                count = source_index.get_frame_number(index, float(points[1])) * factor - start
+            encode = commands.get_encode_commands(self.encoder, two_pass, os.path.join(self.get_chunks_path(), name + ".ivf"), os.path.join(self.get_chunks_path(), name + ".stats"), os.devnull)
+            progress_file = os.path.join(self.get_progress_path(), ("1st_" if two_pass else "") + name + ".log")
+            chunks.append((name, start, count, encode[0], self.queue_second_pass[i] if two_pass else None, progress_file))
+        return chunks
+
+    def get_fanout_decode_command(self):
+        """
+        Returns the decoder of the fan-out, it starts at the first chunk of the queue
+        """
+        with open(self.get_splits_file()) as file_splits:
+            seek_points = [seek_point.split() for seek_point in file_splits]
+        start = seek_points[int(self.queue_names[0][5:])][0]
+        return commands.get_decode_command(self.tools['ffmpeg'], " -ss " + start + " -i " + '"' + self.video_input + '"', self.pipe_color_fmt, self.filter_command, self.preset['video_encoder'] == 2)
+
+    #  ════════════════════════════════════════ Muxing ════════════════════════════════════════
+
+    def start_incremental_mux(self, audio_encode=None):
+        """
+        Starts muxing the chunks in order while they are encoding, call after set_queue()
+        or after the scene detection of stream_scenes() finished
+        """
+        names = [chunk[0] for chunk in self.get_chunk_inputs()]
+        # A chunk which finishes now is either done here or notified by chunk_finished()
+        with self.lock:
+            done = [name for name in names if self.chunk_is_done(name)]
+            self.incremental_mux = muxing.IncrementalMux(names, done, self.get_chunks_path(), self.tools['ffmpeg'], self.video_output, self.log)
+        self.incremental_mux.start(audio_encode)
+
+    def mux(self, audio_files):
+        """
+        Concatenates the encoded chunks and muxes the audio in one pass,
+        finishes the incremental mux instead if it is running. Returns False if ffmpeg failed
+
+        Attributes
+        ----------
+        audio_files : list - the encoded audio tracks, None if there is no audio
+        """
+        if self.incremental_mux is not None:
+            success = self.incremental_mux.finish()
+            self.incremental_mux = None
+            if success:
+                return True
+            self.log("Incremental muxing failed, muxing again")
+        mux_file = commands.write_concat_list(self.get_chunks_path())
+        command = commands.get_mux_command(self.tools['ffmpeg'], ['-f', 'concat', '-safe', '0', '-i', mux_file], audio_files, self.video_output)
+        self.log("Mux: " + str(command))
+        return_code = subprocess.call(command)
+        if return_code != 0:
+            self.log("Muxing failed, ffmpeg exit code: " + str(return_code))
+            return False
+        return True
+
+    def check_output(self):
+        """
+        Returns 'ok', 'small' if there could be a muxing issue or 'missing'
+        """
+        if not os.path.isfile(self.video_output):
+            return 'missing'
+        if os.stat(self.video_output).st_size < 50000:
+            return 'small'
+        return 'ok'
+
+    def delete_temp_files(self):
+        shutil.rmtree(self.temp_path)
+
+
+def report_progress(job, total_frames, stop, log, audio_encode=None, duration=None):
+    """
+    Prints the encoded frames (and the audio progress) of the headless encode until stop is set
+    """
+    reader = progress.ProgressReader(job.get_progress_path())
+    watcher = progress.LogWatcher(job.get_progress_path())
+    last = None
+    changed = None
+    while True:
+        finished = stop.is_set()
+        try:
+            reader.update(None if finished else changed)
+        except OSError:
+            pass
+        # The logs of the chunks done in a previous run are still in the folder
+        frames = reader.total_frames()
+        status = "Progress: " + str(frames) + " / " + str(total_frames) + " Frames"
+        if audio_encode is not None:
+            status += ", Audio: " + str(int(audio_encode.get_progress(duration) * 100)) + "%"
+        if status != last:
+            log(status)
+            last = status
+        if finished:
+            break
+        changed = watcher.wait(2)
+    watcher.close()
+
+
+def prepare_job(job):
+    """
+    Starts the audio encode (runs in the background until muxing), indexes and splits the source
+    and generates the chunk queue. Returns the audio encode, None if there is no audio
+    """
+    audio_encode = start_job(job)
+    if not job.resume_splitting():
+        split_job(job)
+    job.set_queue()
+    return audio_encode
+
+
+def start_job(job):
+    """
+    Starts the audio encode and indexes the source, returns the audio encode
+    """
+    job.prepare()
+
+    audio_encode = job.start_audio()
+
+    job.log("Status: Indexing")
+    source_index.get_index(job.video_input, job.get_index_file(), job.tools['ffprobe'])
+
+    job.set_encoder(commands.get_custom_settings(job.preset), commands.get_advanced_settings(job.preset))
+    return audio_encode
+
+
+def split_job(job):
+    if job.preset['splitting_method'] == 0:
+        job.log("Status: Detecting Scenes")
+        detect_scenes(job)
+    else:
+        job.log("Status: Splitting")
+        splitting.split_keyframes(job.video_input, str(job.preset['splitting_chunking_length']), job.get_splits_file(), job.get_index_file())
+    job.splitting_finished()
+
+
+def detect_scenes(job, scene_found=None):
+    splitting.detect_scenes(job.video_input, str(job.preset['splitting_scene_threshold']), job.get_splits_file(), job.tools['ffmpeg'], job.get_index_file(), get_worker_count(job.preset), job.preset.get('splitting_scene_analysis', 0),
+                            job.preset.get('splitting_scene_min', 0), job.preset.get('splitting_scene_max', 0), job.cache_dir, scene_found)
+
+
+def stream_scenes(job, live_queue):
+    """
+    Detects the scenes, every chunk goes into the live queue of encode_pool.encode_live() as soon as
+    the scene change at its end is found. Call after job.start_queue(), returns False if the detection failed
+    """
+    index = job.get_index()
+
+    def scene_found(counter, seek_point):
+        chunk = job.queue_chunk(*job.get_chunk_input(counter, seek_point, index))
+        if chunk is not None:
+            live_queue.put(chunk)
+
+    try:
+        detect_scenes(job, scene_found)
+        job.splitting_finished()
+        return True
+    except (OSError, ValueError, RuntimeError) as error:
+        job.log("Scene detection failed: " + str(error))
+        return False
+    finally:
+        live_queue.put(None)
+
+
+def finish_job(job, audio_encode, delete_temp_files=False):
+    """
+    Waits for the audio and muxes, returns True if the output got muxed
+    """
+    audio_files = None
+    if audio_encode is not None:
+        if audio_encode.is_running():
+            job.log("Status: Waiting for Audio")
+        if not audio_encode.wait():
+            job.log("Audio encoding failed")
+            return False
+        audio_files = audio_encode.get_files()
+    job.log("Status: Muxing")
+    if not job.mux(audio_files):
+        # The temp files (and the manifest) are kept, the chunks don't have to be encoded again
+        return False
+    result = job.check_output()
+    if result != 'ok':
+        job.log("Output File " + ("not found!" if result == 'missing' else "found, but there could be a muxing issue."))
+        return False
+    if delete_temp_files:
+        job.delete_temp_files()
+    job.log("Status: Finished")
+    return True
+
+
+def split_lossless(job, process_count, chunk_split):
+    """
+    Writes the lossless files of the queued chunks, chunk_split receives the name of every chunk
+    as soon as its file exists. Returns the chunks which could not be split
+    """
+    ranges = job.get_lossless_ranges()
+    pending = [name for name, _, _ in ranges]
+    # Files of a previous run are complete, they are written to a temp file first
+    for name in job.queue_names:
+        if name not in pending:
+            chunk_split(name)
+    failed = []
+
+    def range_finished(name, success):
+        if success:
+            chunk_split(name)
+        else:
+            job.log("Splitting failed: " + name)
+            failed.append(name)
+
+    splitting.split_ranges(ranges, job.get_splitting_codec(), job.tools['ffmpeg'], process_count, range_finished)
+    return failed
+
+
+def split_into_queue(job, process_count, live_queue):
+    """
+    Splits the queued chunks into lossless files, every chunk goes into the live queue of encode_pool.encode_live()
+    as soon as its file exists. Returns the chunks which could not be split
+    """
+    chunks = dict(encode_pool.get_chunks(job.queue_names, job.queue_first_pass, job.queue_second_pass, job.queue_costs, "longest_first"))
+    failed = split_lossless(job, process_count, lambda name: live_queue.put((name, chunks[name])))
+    live_queue.put(None)
+    return failed
+
+
+def report_remote_progress(total_frames, log):
+    """
+    Returns the progress function for the chunks encoded by agents, logs at most every 2 seconds
+    """
+    last = [0]
+
+    def report(frames):
+        if time.monotonic() - last[0] >= 2:
+            last[0] = time.monotonic()
+            log("Progress: " + str(frames) + " / " + str(total_frames) + " Frames")
+    return report
+
+
+def run_job(job, delete_temp_files=False, agents=None, token=None, incremental_mux=False, fanout_memory=None):
+    """
+    Runs all stages of the job, returns True if the output got muxed
+
+    Attributes
+    ----------
+    agents : list - host:port of worker agents which encode the chunks instead of the local workers
+    token : string - token of the agents
+    incremental_mux : muxes the finished chunks while the others are still encoding
+    fanout_memory : int - memory limit (bytes) of the fan-out if job.fanout is set, None = a quarter of the available memory
+    """
+    audio_encode = start_job(job)
+    stream = False
+    if not job.resume_splitting():
+        # The agents get the whole queue at once
+        stream = job.streams_scenes() and not agents
+        if not stream:
+            try:
+                split_job(job)
+            except (OSError, ValueError, RuntimeError) as error:
+                job.log("Splitting failed: " + str(error))
+                return False
+    if stream:
+        job.start_queue()
+    else:
+        job.set_queue()
+        if incremental_mux:
+            job.start_incremental_mux(audio_encode)
+    total_frames = job.get_total_frames(source_index.get_frame_count(job.video_input, job.get_index_file(), job.tools['ffmpeg'], job.tools['ffprobe']))
+    if stream:
+        job.log("Status: Detecting Scenes, Encoding the Chunks as soon as they are found, Framecount: " + str(total_frames))
+    else:
+        job.log("Status: Encoding " + str(len(job.queue_names)) + " Chunks, Framecount: " + str(total_frames))
+    failed = []
+    detected = []
+
+    def chunk_finished(name, success):
+        if not job.chunk_finished(name, success):
+            failed.append(name)
+
+    if agents:
+        if job.uses_lossless_chunks():
+            # The agents upload the chunk files, all of them are written first
+            job.log("Status: Splitting")
+            for name in split_lossless(job, get_worker_count(job.preset), lambda name: None):
+                chunk_finished(name, False)
+        if not failed:
+            distributed.encode_chunks(job, agents, token, chunk_finished, report_remote_progress(total_frames, job.log))
+    else:
+        stop = threading.Event()
+        progress_thread = threading.Thread(target=report_progress, args=(job, total_frames, stop, job.log, audio_encode, job.get_duration()), daemon=True)
+        progress_thread.start()
+        if stream:
+            # Every chunk encodes as soon as the scene change at its end is found
+            live_queue = queue.Queue()
+
+            def detect():
+                if stream_scenes(job, live_queue):
+                    detected.append(True)
+                    if incremental_mux:
+                        job.start_incremental_mux(audio_encode)
+
+            detect_thread = threading.Thread(target=detect)
+            detect_thread.start()
+            encode_pool.encode_live(job.preset['worker_count'] + 1, live_queue, get_adaptive_bounds(job.preset), job.preset.get('worker_pinning', False), chunk_finished, job.log, job.get_tail_split())
+            detect_thread.join()
+        elif job.fanout:
+            fanout.encode_chunks(job.preset['worker_count'] + 1, fanout_memory, job.get_fanout_decode_command() if job.queue_names else None, job.get_fanout_chunks(), chunk_finished, job.log)
+        elif job.uses_lossless_chunks():
+            # Every chunk encodes as soon as its lossless file is written
+            live_queue = queue.Queue()
+            split_failed = []
+            split_thread = threading.Thread(target=lambda: split_failed.extend(split_into_queue(job, get_worker_count(job.preset), live_queue)))
+            split_thread.start()
+            encode_pool.encode_live(job.preset['worker_count'] + 1, live_queue, get_adaptive_bounds(job.preset), job.preset.get('worker_pinning', False), chunk_finished, job.log, job.get_tail_split())
+            split_thread.join()
+            for name in split_failed:
+                chunk_finished(name, False)
+        else:
+            encode_pool.encode_chunks(job.preset['worker_count'] + 1, job.queue_names, job.queue_first_pass, job.queue_second_pass, job.queue_costs, "longest_first",
+                                      get_adaptive_bounds(job.preset), job.preset.get('worker_pinning', False), chunk_finished, job.log, job.get_tail_split())
+        stop.set()
+        progress_thread.join()
+    if stream and not detected:
+        return False
+    if failed:
+        job.log("Failed Chunks: " + str(failed))
+        return False
+    return finish_job(job, audio_encode, delete_temp_files)
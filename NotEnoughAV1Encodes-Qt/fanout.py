@@ -0,0 +1,225 @@
+"""
+This script encodes the chunks with a single decoder.
+
+One ffmpeg process decodes and filters the source once, its yuv4mpegpipe
+is cut at the chunk boundaries and every segment is piped into the encoder
+of its chunk. The encoders run in a pool, frames which are decoded but not yet
+consumed by an encoder count against a memory limit, the decoder waits while
+the limit is reached.
+
+The decoder fills the chunks one after another, so to keep k encoders busy
+about k - 1 whole chunks wait in memory. With large frames (e.g. 4K 10 bit,
+about 24 MiB per frame) the limit only holds a few chunks and fewer encoders
+than workers run, get_parallel_encoders() estimates how many.
+"""
+import queue
+import threading
+from subprocess import Popen, PIPE, DEVNULL
+
+import psutil
+
+import encode_pool
+
+# Frames between two progress updates of a chunk
+PROGRESS_INTERVAL = 24
+
+
+def get_frame_size(header):
+    """
+    Returns the size in bytes of the picture of one frame of the yuv4mpegpipe
+    """
+    params = {}
+    for param in header.decode().split()[1:]:
+        params[param[:1]] = param[1:]
+    width = int(params['W'])
+    height = int(params['H'])
+    colorspace = params.get('C', "420jpeg")
+    chroma = 0
+    if colorspace.startswith("420"):
+        chroma = 2 * ((width + 1) // 2) * ((height + 1) // 2)
+    elif colorspace.startswith("422"):
+        chroma = 2 * ((width + 1) // 2) * height
+    elif colorspace.startswith("444"):
+        chroma = 2 * width * height
+    # 420p10, 444p12 ... store every sample in 2 bytes
+    depth = colorspace[4:] if colorspace[3:4] == "p" else ""
+    sample = 2 if depth.isdigit() and int(depth) > 8 else 1
+    return (width * height + chroma) * sample
+
+
+def get_parallel_encoders(memory_limit, frame_size, chunks):
+    """
+    Returns the estimated amount of encoders which can run at the same time:
+    one encoder plus the chunks of average length which fit into the memory limit
+    """
+    counts = [chunk[2] for chunk in chunks if chunk[2]]
+    if not counts:
+        return 1
+    # Every frame of the pipe also has its FRAME line
+    chunk_size = sum(counts) / len(counts) * (frame_size + len(b"FRAME\n"))
+    return 1 + int(memory_limit // chunk_size)
+
+
+def read_frame(stream, frame_size):
+    """
+    Returns the next frame (FRAME line + picture), None at the end of the stream
+    """
+    line = stream.readline()
+    if not line.startswith(b"FRAME"):
+        return None
+    picture = stream.read(frame_size)
+    if len(picture) < frame_size:
+        return None
+    return line + picture
+
+
+class MemoryLimit:
+    """
+    Bytes of the decoded frames which wait for their encoder
+
+    Attributes
+    ----------
+    limit : int - bytes the decoder may buffer, a single frame is always allowed
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            self.condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class FanOut:
+    """
+    Attributes
+    ----------
+    pool_size : int - amount of chunks which encode at the same time
+    memory_limit : int - bytes of decoded frames which may wait for the encoders
+    chunk_finished : function - receives the name of a chunk and if all of its passes succeeded
+    log : function - receives log messages
+    """
+    def __init__(self, pool_size, memory_limit, chunk_finished, log):
+        self.pool_size = pool_size
+        self.slots = threading.Semaphore(pool_size)
+        self.memory = MemoryLimit(memory_limit)
+        self.chunk_finished = chunk_finished
+        self.log = log
+        self.lock = threading.Lock()
+
+    def run(self, decode_command, chunks):
+        """
+        Attributes
+        ----------
+        decode_command : string - ffmpeg call which writes the yuv4mpegpipe to stdout, starts at the first chunk
+        chunks : list - (name, first frame, frame count (None = until the end), encoder command of the first pass,
+                 second pass (None for 1 pass), progress log of the first pass) in source order
+        """
+        if not chunks:
+            return
+        process = Popen(decode_command, shell=True, stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL)
+        header = process.stdout.readline()
+        frame_size = get_frame_size(header) if header.startswith(b"YUV4MPEG2") else None
+        if frame_size is not None:
+            encoders = get_parallel_encoders(self.memory.limit, frame_size, chunks)
+            if encoders < self.pool_size:
+                self.log("Fan-out: the memory limit holds the frames of about " + str(encoders - 1) + " chunks, only about " + str(encoders) + " of "
+                         + str(self.pool_size) + " Encoders can run at the same time. Raise the memory limit or use shorter chunks")
+        position = chunks[0][1]
+        threads = []
+        for chunk in chunks:
+            name, start, count = chunk[:3]
+            # Chunks which are done are decoded and dropped
+            while frame_size is not None and position < start:
+                if read_frame(process.stdout, frame_size) is None:
+                    frame_size = None
+                position += 1
+            # Waits for a free encoder, the encoders before it have all of their frames queued
+            self.slots.acquire()
+            frames = queue.Queue()
+            thread = threading.Thread(target=self.encode_chunk, args=(chunk, header, frames))
+            thread.start()
+            threads.append(thread)
+            read = 0
+            while frame_size is not None and (count is None or read < count):
+                frame = read_frame(process.stdout, frame_size)
+                if frame is None:
+                    frame_size = None
+                    break
+                self.memory.acquire(len(frame))
+                frames.put(frame)
+                read += 1
+            position += read
+            # The end marker tells the encoder if the segment is complete
+            complete = frame_size is not None or (count is None and read > 0)
+            if not complete:
+                self.log("Fan-out: the decoder stopped in chunk " + name)
+            frames.put(complete)
+        process.stdout.close()
+        if process.poll() is None:
+            # The chunks after the last pending one are not needed
+            process.kill()
+        process.wait()
+        for thread in threads:
+            thread.join()
+
+    def encode_chunk(self, chunk, header, frames):
+        name, _, _, encode_command, second_command, progress_file = chunk
+        success = True
+        process = Popen(encode_command, shell=True, stdin=PIPE, stderr=DEVNULL)
+        try:
+            process.stdin.write(header)
+        except OSError:
+            success = False
+        count = 0
+        with open(progress_file, 'w') as progress_log:
+            while True:
+                frame = frames.get()
+                if isinstance(frame, bool):
+                    complete = frame
+                    break
+                if success:
+                    try:
+                        process.stdin.write(frame)
+                    except OSError:
+                        # The encoder died, the frames are still consumed to free the memory
+                        success = False
+                self.memory.release(len(frame))
+                count += 1
+                if count % PROGRESS_INTERVAL == 0:
+                    progress_log.write("frame=" + str(count) + "\nprogress=continue\n")
+                    progress_log.flush()
+            progress_log.write("frame=" + str(count) + "\nprogress=end\n")
+        try:
+            process.stdin.close()
+        except OSError:
+            success = False
+        success = process.wait() == 0 and success and complete
+        if success and second_command is not None:
+            # The second pass needs all frames again, it decodes its chunk itself
+            success = encode_pool.run_command(second_command) == 0
+        self.slots.release()
+        with self.lock:
+            self.chunk_finished(name, success)
+
+
+def get_default_memory_limit():
+    # A quarter of the available memory
+    return psutil.virtual_memory().available // 4
+
+
+def encode_chunks(pool_size, memory_limit, decode_command, chunks, chunk_finished, log):
+    """
+    Encodes the chunks with one decoder, see FanOut.run()
+    """
+    if memory_limit is None:
+        memory_limit = get_default_memory_limit()
+    log("Fan-out: " + str(pool_size) + " Encoders, Memory Limit: " + str(memory_limit // 1024 ** 2) + " MiB")
+    FanOut(pool_size, memory_limit, chunk_finished, log).run(decode_command, chunks)
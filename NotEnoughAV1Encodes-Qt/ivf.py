@@ -0,0 +1,92 @@
+"""
+This script reads the structure of the .ivf files
+written by the encoders and joins them into one stream
+for the incremental muxing and the sub-chunks of the tail splitting.
+"""
+import os
+import struct
+
+IVF_SIGNATURE = b"DKIF"
+IVF_HEADER_SIZE = 32
+IVF_FRAME_HEADER_SIZE = 12
+
+
+def count_frames(ivf_path):
+    """
+    Walks over all frame headers of the file.
+    Returns the amount of frames, or None if the file is missing,
+    has no frames or is truncated (e.g. the encoder got killed)
+    """
+    try:
+        file_size = os.path.getsize(ivf_path)
+        with open(ivf_path, 'rb') as ivf_file:
+            header = ivf_file.read(IVF_HEADER_SIZE)
+            if len(header) < IVF_HEADER_SIZE or header[:4] != IVF_SIGNATURE:
+                return None
+            header_size = struct.unpack('<H', header[6:8])[0]
+            position = header_size
+            frames = 0
+            while position < file_size:
+                ivf_file.seek(position)
+                frame_header = ivf_file.read(IVF_FRAME_HEADER_SIZE)
+                if len(frame_header) < IVF_FRAME_HEADER_SIZE:
+                    return None
+                frame_size = struct.unpack('<I', frame_header[:4])[0]
+                position += IVF_FRAME_HEADER_SIZE + frame_size
+                frames += 1
+            if position != file_size or frames == 0:
+                return None
+            return frames
+    except OSError:
+        return None
+
+
+def get_stream_header(ivf_path):
+    """
+    Returns the file header of the .ivf for a stream of several chunks (frame count 0 = unknown)
+    """
+    with open(ivf_path, 'rb') as ivf_file:
+        header = ivf_file.read(IVF_HEADER_SIZE)
+    return header[:24] + struct.pack('<I', 0) + header[28:]
+
+
+def copy_frames(ivf_path, output, pts_offset):
+    """
+    Writes the frames of the .ivf to output with the timestamps shifted by pts_offset,
+    returns the pts offset of the next chunk
+    """
+    first = None
+    last = None
+    step = 1
+    with open(ivf_path, 'rb') as ivf_file:
+        header = ivf_file.read(IVF_HEADER_SIZE)
+        ivf_file.seek(struct.unpack('<H', header[6:8])[0])
+        while True:
+            frame_header = ivf_file.read(IVF_FRAME_HEADER_SIZE)
+            if len(frame_header) < IVF_FRAME_HEADER_SIZE:
+                break
+            frame_size, pts = struct.unpack('<IQ', frame_header)
+            if first is None:
+                first = pts
+            # Duration of a frame in timebase units, the last frame is assumed to be as long
+            if last is not None and pts > last:
+                step = pts - last
+            last = pts
+            output.write(struct.pack('<IQ', frame_size, pts - first + pts_offset))
+            output.write(ivf_file.read(frame_size))
+    if last is None:
+        return pts_offset
+    return pts_offset + last - first + step
+
+
+def join_files(ivf_paths, output_path):
+    """
+    Joins the .ivf files into one, the timestamps continue over the files (frame count in the header 0 = unknown)
+    """
+    temp_path = output_path + ".tmp"
+    with open(temp_path, 'wb') as output:
+        output.write(get_stream_header(ivf_paths[0]))
+        pts_offset = 0
+        for ivf_path in ivf_paths:
+            pts_offset = copy_frames(ivf_path, output, pts_offset)
+    os.replace(temp_path, output_path)
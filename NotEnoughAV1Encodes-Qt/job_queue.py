@@ -0,0 +1,260 @@
+"""
+This script holds the persistent job queue and runs it
+with one worker pool for all jobs.
+
+Every job has its own source, output and preset. The chunks of all
+prepared jobs share the workers, the job policy of the scheduler decides
+which job starts the next chunk. The next job is prepared (index, splitting)
+while the chunks of the current job are still encoding and muxing runs
+in its own thread, so the long tail of a job doesn't leave cores idle.
+"""
+import os
+import json
+import threading
+
+import encode_pool
+import engine
+import placement
+import scheduler
+
+
+class JobQueue:
+    """
+    Job queue stored as .json, every change is written immediately,
+    so jobs can be added by another process while the queue is running
+
+    Attributes
+    ----------
+    queue_file : string - path of the queue .json
+    """
+    def __init__(self, queue_file):
+        self.queue_file = queue_file
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.queue_file) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            return {'next_id': 1, 'jobs': []}
+
+    def save(self, data):
+        # The temp file + rename keeps the queue intact if the program dies while saving
+        temp_file = self.queue_file + ".tmp"
+        with open(temp_file, 'w') as outfile:
+            json.dump(data, outfile, indent=4)
+        os.replace(temp_file, self.queue_file)
+
+    def add(self, video_input, video_output, preset_name, preset):
+        """
+        Adds a job with a copy of the flattened preset, returns the id of the job
+        """
+        with self.lock:
+            data = self.load()
+            job_id = data['next_id']
+            data['next_id'] += 1
+            data['jobs'].append({'id': job_id, 'input': video_input, 'output': video_output, 'preset_name': preset_name, 'preset': preset, 'state': 'queued'})
+            self.save(data)
+            return job_id
+
+    def remove(self, job_id):
+        """
+        Returns False if there is no job with this id
+        """
+        with self.lock:
+            data = self.load()
+            jobs = [job for job in data['jobs'] if job['id'] != job_id]
+            if len(jobs) == len(data['jobs']):
+                return False
+            data['jobs'] = jobs
+            self.save(data)
+            return True
+
+    def get_jobs(self):
+        with self.lock:
+            return self.load()['jobs']
+
+    def set_state(self, job_id, state):
+        with self.lock:
+            data = self.load()
+            for job in data['jobs']:
+                if job['id'] == job_id:
+                    job['state'] = state
+            self.save(data)
+
+    def next_queued(self):
+        """
+        Marks the oldest queued job as running and returns it, None if there is none
+        """
+        with self.lock:
+            data = self.load()
+            for job in data['jobs']:
+                if job['state'] == 'queued':
+                    job['state'] = 'running'
+                    self.save(data)
+                    return job
+            return None
+
+    def reset_running(self):
+        """
+        Jobs which were running when the program died are queued again,
+        they resume with the manifest in their temp folder
+        """
+        with self.lock:
+            data = self.load()
+            for job in data['jobs']:
+                if job['state'] == 'running':
+                    job['state'] = 'queued'
+            self.save(data)
+
+
+class QueueRunner:
+    """
+    Runs all queued jobs with one pool of workers
+
+    Attributes
+    ----------
+    job_queue : JobQueue
+    worker_count : int - amount of chunks which encode at the same time (over all jobs)
+    temp_dir : string - folder of the temp files, every job gets its own subfolder
+    tools : dict - paths of ffmpeg, ffprobe and the encoders
+    log : function - receives log messages
+    policy : string - job policy of the scheduler
+    pin_cores : pins every chunk to its own slot of cpu cores
+    delete_temp_files : deletes the temp files of a job after muxing
+    incremental_mux : muxes the finished chunks of a job while the others are still encoding
+    """
+    def __init__(self, job_queue, worker_count, temp_dir, tools, log, policy='fair', pin_cores=False, delete_temp_files=False, incremental_mux=False):
+        self.job_queue = job_queue
+        self.worker_count = worker_count
+        self.temp_dir = temp_dir
+        self.tools = tools
+        self.log = log
+        self.policy = policy
+        self.delete_temp_files = delete_temp_files
+        self.incremental_mux = incremental_mux
+        self.slots = placement.SlotPool(placement.get_slots(worker_count)) if pin_cores else None
+        self.condition = threading.Condition()
+        self.active = []
+        self.finishing = []
+        self.prepared_all = False
+        self.order = 0
+        self.failed_jobs = 0
+
+    def run(self):
+        """
+        Returns the amount of failed jobs
+        """
+        self.job_queue.reset_running()
+        if self.slots is not None:
+            self.log("Core Slots: " + str(self.slots.free))
+        workers = [threading.Thread(target=self.work, daemon=True) for _ in range(self.worker_count)]
+        for worker in workers:
+            worker.start()
+        while True:
+            with self.condition:
+                # Prepares the next job as soon as the workers could run out of chunks
+                self.condition.wait_for(lambda: self.get_pending() < self.worker_count * 2)
+            entry = self.job_queue.next_queued()
+            if entry is None:
+                break
+            self.start_job(entry)
+        with self.condition:
+            self.prepared_all = True
+            self.condition.notify_all()
+        for worker in workers:
+            worker.join()
+        for thread in self.finishing:
+            thread.join()
+        return self.failed_jobs
+
+    def get_pending(self):
+        return sum(len(state['pending']) for state in self.active)
+
+    def get_log(self, job_id):
+        def log(text):
+            self.log("[Job " + str(job_id) + "] " + str(text))
+        return log
+
+    def start_job(self, entry):
+        preset = dict(entry['preset'])
+        # The pool size is global, the thread config of the chunks follows it
+        preset['worker_count'] = self.worker_count - 1
+        preset['worker_adaptive'] = False
+        job = engine.Job(entry['input'], entry['output'], preset, os.path.join(self.temp_dir, "queue" + str(entry['id'])), self.tools, self.get_log(entry['id']))
+        # All jobs share the scene cache
+        job.cache_dir = os.path.join(self.temp_dir, "SceneCache")
+        if not os.path.isfile(entry['input']):
+            job.log("Input not found: " + entry['input'])
+            self.job_finished(entry['id'], False)
+            return
+        try:
+            audio_encode = engine.prepare_job(job)
+        except (OSError, ValueError, RuntimeError) as error:
+            job.log("Preparing failed: " + str(error))
+            self.job_finished(entry['id'], False)
+            return
+        failed = []
+        if job.uses_lossless_chunks():
+            # The encodes of the other jobs keep running while the chunk files are written
+            job.log("Status: Splitting")
+            failed = engine.split_lossless(job, self.worker_count, lambda name: None)
+        if self.incremental_mux and not failed:
+            job.start_incremental_mux(audio_encode)
+        chunks = [chunk for chunk in encode_pool.get_chunks(job.queue_names, job.queue_first_pass, job.queue_second_pass, job.queue_costs, "longest_first") if chunk[0] not in failed]
+        job.log("Status: Encoding " + str(len(chunks)) + " Chunks")
+        state = {'id': entry['id'], 'job': job, 'audio': audio_encode, 'pending': chunks, 'running': 0, 'failed': failed, 'order': self.order}
+        self.order += 1
+        with self.condition:
+            if chunks:
+                self.active.append(state)
+                self.condition.notify_all()
+                return
+        self.finish(state)
+
+    def work(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.prepared_all or any(state['pending'] for state in self.active))
+                waiting = [state for state in self.active if state['pending']]
+                if not waiting:
+                    return
+                state = waiting[scheduler.get_job(self.policy, waiting)]
+                chunk = state['pending'].pop(0)
+                state['running'] += 1
+            name, success = encode_pool.encode_chunk(chunk, slots=self.slots)
+            # Counting the frames and saving the manifest doesn't block the workers of the other jobs,
+            # the job has its own lock
+            finished = state['job'].chunk_finished(name, success)
+            with self.condition:
+                if not finished:
+                    state['failed'].append(name)
+                state['running'] -= 1
+                done = not state['pending'] and state['running'] == 0
+                if done:
+                    self.active.remove(state)
+                self.condition.notify_all()
+            if done:
+                self.finish(state)
+
+    def finish(self, state):
+        # Muxing runs next to the encodes of the other jobs
+        thread = threading.Thread(target=self.finish_job, args=(state,))
+        self.finishing.append(thread)
+        thread.start()
+
+    def finish_job(self, state):
+        job = state['job']
+        if state['failed']:
+            job.log("Failed Chunks: " + str(state['failed']))
+            if state['audio'] is not None:
+                state['audio'].wait()
+            self.job_finished(state['id'], False)
+            return
+        self.job_finished(state['id'], engine.finish_job(job, state['audio'], self.delete_temp_files))
+
+    def job_finished(self, job_id, success):
+        self.job_queue.set_state(job_id, 'done' if success else 'failed')
+        if not success:
+            with self.condition:
+                self.failed_jobs += 1
@@ -0,0 +1,105 @@
+"""
+This script keeps track of the state of an encode job,
+so an interrupted encode can be resumed.
+
+The manifest is stored in the temp folder of the source and records
+the hashes of the settings of every stage, the split points and the
+state of every chunk. A chunk only counts as done if its .ivf file
+is still complete.
+"""
+import os
+import json
+import hashlib
+import ivf
+
+MANIFEST_VERSION = 1
+
+
+def get_hash(*values):
+    """
+    Returns a hash of the given settings
+    """
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+def new_manifest(source_key):
+    """
+    Returns an empty manifest for the given source
+    """
+    return {'version': MANIFEST_VERSION, 'source': source_key, 'stages': {}, 'chunks': {}}
+
+
+def load_manifest(manifest_file, source_key):
+    """
+    Returns the manifest of the previous run, or an empty one
+    if there is none or it belongs to a different / modified source
+    """
+    try:
+        with open(manifest_file) as json_file:
+            manifest = json.load(json_file)
+        if manifest['version'] == MANIFEST_VERSION and manifest['source'] == source_key:
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    return new_manifest(source_key)
+
+
+def save_manifest(manifest, manifest_file):
+    """
+    Writes the manifest, the temp file + rename keeps it intact if the program dies while saving
+    """
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, 'w') as outfile:
+        json.dump(manifest, outfile)
+    os.replace(temp_file, manifest_file)
+
+
+def is_stage_done(manifest, stage, stage_hash):
+    """
+    Returns True if the stage finished in a previous run with the same settings
+    """
+    state = manifest['stages'].get(stage)
+    return state is not None and state['hash'] == stage_hash and state['done']
+
+
+def get_stage_data(manifest, stage):
+    """
+    Returns the data stored with the stage (e.g. the split points)
+    """
+    return manifest['stages'][stage].get('data')
+
+
+def set_stage(manifest, stage, stage_hash, done, data=None):
+    """
+    Updates the state of a stage. The chunks depend on the splitting and
+    the encoder settings, changing either of them resets all chunks.
+    """
+    state = manifest['stages'].get(stage)
+    if stage in ('splitting', 'encoding') and (state is None or state['hash'] != stage_hash):
+        manifest['chunks'] = {}
+    manifest['stages'][stage] = {'hash': stage_hash, 'done': done, 'data': data}
+
+
+def set_chunk_done(manifest, name, frames):
+    """
+    Marks a chunk as finished with the amount of frames of its .ivf file
+    """
+    manifest['chunks'][name] = {'state': 'done', 'frames': frames}
+
+
+def is_chunk_done(manifest, name, ivf_path):
+    """
+    Returns True if the chunk finished in a previous run
+    and its .ivf file is still complete
+    """
+    chunk = manifest['chunks'].get(name)
+    if chunk is None or chunk['state'] != 'done':
+        return False
+    return ivf.count_frames(ivf_path) == chunk['frames']
+
+
+def get_chunk_frames(manifest, name):
+    """
+    Returns the amount of frames of a finished chunk
+    """
+    return manifest['chunks'][name]['frames']
@@ -0,0 +1,117 @@
+"""
+This script muxes the output while the chunks are still encoding.
+
+The chunks are fed in order as one .ivf stream into the stdin of ffmpeg,
+which muxes it with the audio tracks into the output. Every chunk is written
+as soon as it and all chunks before it are finished, so only the chunks of
+the long tail are left when the encode ends.
+"""
+import os
+import threading
+import subprocess
+
+import commands
+import ivf
+
+
+class IncrementalMux:
+    """
+    Attributes
+    ----------
+    names : list - names of all chunks in playback order
+    done : set - names of the chunks which are already finished
+    chunks_path : string - folder of the encoded chunks
+    ffmpeg_path : path to ffmpeg
+    video_output : string - path of the muxed output
+    log : function - receives log messages
+    """
+    def __init__(self, names, done, chunks_path, ffmpeg_path, video_output, log):
+        self.names = names
+        self.done = set(done)
+        self.chunks_path = chunks_path
+        self.ffmpeg_path = ffmpeg_path
+        self.video_output = video_output
+        self.log = log
+        self.condition = threading.Condition()
+        self.aborted = False
+        self.closing = False
+        self.success = False
+        self.process = None
+        self.thread = None
+
+    def start(self, audio_encode=None):
+        """
+        Starts muxing in the background, ffmpeg starts once all audio tracks are encoded
+        """
+        self.thread = threading.Thread(target=self.run, args=(audio_encode,), daemon=True)
+        self.thread.start()
+
+    def chunk_finished(self, name):
+        with self.condition:
+            self.done.add(name)
+            self.condition.notify_all()
+
+    def abort(self):
+        with self.condition:
+            self.aborted = True
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+            self.condition.notify_all()
+
+    def finish(self):
+        """
+        Waits until all chunks are muxed, returns False if muxing failed or a chunk is missing
+        """
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join()
+        return self.success
+
+    def wait_for_chunk(self, name):
+        """
+        Returns False if the chunk won't finish anymore
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: name in self.done or self.aborted or self.closing)
+            return name in self.done and not self.aborted
+
+    def run(self, audio_encode):
+        audio_files = None
+        if audio_encode is not None:
+            if not audio_encode.wait():
+                self.log("Incremental Mux: Audio encoding failed")
+                return
+            audio_files = audio_encode.get_files()
+        if not self.names or not self.wait_for_chunk(self.names[0]):
+            return
+        command = commands.get_mux_command(self.ffmpeg_path, ['-f', 'ivf', '-i', 'pipe:0'], audio_files, self.video_output)
+        with self.condition:
+            if self.aborted:
+                return
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.log("Incremental Mux: " + str(command))
+        complete = self.feed()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        if not complete:
+            self.abort()
+        self.success = self.process.wait() == 0 and complete
+
+    def feed(self):
+        """
+        Writes all chunks into the stdin of ffmpeg, returns False if the stream is incomplete
+        """
+        pts_offset = 0
+        try:
+            self.process.stdin.write(ivf.get_stream_header(os.path.join(self.chunks_path, self.names[0] + ".ivf")))
+            for name in self.names:
+                if not self.wait_for_chunk(name):
+                    return False
+                pts_offset = ivf.copy_frames(os.path.join(self.chunks_path, name + ".ivf"), self.process.stdin, pts_offset)
+        except OSError:
+            # ffmpeg died (BrokenPipeError) or a chunk can't be read
+            return False
+        return True
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Headless command line interface of NotEnoughAV1Encodes-Qt.
+
+Encodes with the presets of the GUI (Presets/<name>.json or a path to a preset file):
+
+    neav1e.py encode --preset X in.mkv out.webm
+
+Several sources can be queued, the queue encodes them with one pool of workers:
+
+    neav1e.py queue add --preset X in.mkv out.webm
+    neav1e.py queue run --workers 8
+
+Chunks can be encoded by worker agents on other machines:
+
+    neav1e.py agent --host 0.0.0.0 --token T
+    neav1e.py encode --preset X --agents host1:8765,host2:8765 --token T in.mkv out.webm
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def log(text):
+    print(str(datetime.now().replace(microsecond=0)) + " " + str(text), flush=True)
+
+
+def encode(args):
+    import engine
+    try:
+        preset = engine.load_preset_file(args.preset, current_dir)
+    except (OSError, ValueError) as error:
+        log("Could not load preset " + args.preset + ": " + str(error))
+        return 1
+    if args.workers is not None:
+        preset['worker_count'] = args.workers - 1
+    tools = get_tools(preset)
+    if tools is None:
+        return 1
+    if not os.path.isfile(args.input):
+        log("Input not found: " + args.input)
+        return 1
+    if args.fanout and args.agents:
+        log("--fanout can't be combined with --agents")
+        return 1
+    job = engine.Job(args.input, args.output, preset, args.temp, tools, log)
+    job.fanout = args.fanout
+    agents = args.agents.split(",") if args.agents else None
+    fanout_memory = args.fanout_memory * 1024 ** 2 if args.fanout_memory is not None else None
+    return 0 if engine.run_job(job, args.delete_temp, agents, args.token, args.incremental_mux, fanout_memory) else 1
+
+
+def agent(args):
+    import engine
+    import distributed
+    import psutil
+    worker_count = args.workers if args.workers is not None else psutil.cpu_count(logical = False)
+    worker_agent = distributed.Agent(args.work_dir, engine.get_tools(current_dir), worker_count, args.token, log)
+    try:
+        distributed.run_agent(args.host, args.port, worker_agent)
+    except ValueError as error:
+        log(str(error))
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def get_tools(preset):
+    import engine
+    tools = engine.get_tools(current_dir)
+    missing = engine.find_missing_tools(tools, preset)
+    if missing:
+        log("Not found: " + ", ".join(missing))
+        return None
+    return tools
+
+
+def queue(args):
+    import engine
+    import job_queue
+    jobs = job_queue.JobQueue(args.queue)
+    if args.queue_command == "add":
+        try:
+            preset = engine.load_preset_file(args.preset, current_dir)
+        except (OSError, ValueError) as error:
+            log("Could not load preset " + args.preset + ": " + str(error))
+            return 1
+        if not os.path.isfile(args.input):
+            log("Input not found: " + args.input)
+            return 1
+        job_id = jobs.add(os.path.abspath(args.input), os.path.abspath(args.output), args.preset, preset)
+        log("Added Job " + str(job_id))
+        return 0
+    if args.queue_command == "remove":
+        if not jobs.remove(args.id):
+            log("Job not found: " + str(args.id))
+            return 1
+        return 0
+    if args.queue_command == "run":
+        tools = engine.get_tools(current_dir)
+        for entry in jobs.get_jobs():
+            if entry['state'] in ('queued', 'running') and get_tools(entry['preset']) is None:
+                return 1
+        # Physical cores like the GUI and the encode command
+        worker_count = args.workers if args.workers is not None else engine.get_worker_count({})
+        runner = job_queue.QueueRunner(jobs, worker_count, args.temp, tools, log, args.policy, args.pin, args.delete_temp, args.incremental_mux)
+        return 1 if runner.run() else 0
+    for entry in jobs.get_jobs():
+        print(str(entry['id']).rjust(4) + "  " + entry['state'].ljust(8) + "  " + entry['preset_name'] + "  " + entry['input'] + " -> " + entry['output'])
+    return 0
+
+
+def scene_benchmark(args):
+    import tempfile
+    import engine
+    import source_index
+    import splitting
+    tools = engine.get_tools(current_dir)
+    if not os.path.isfile(args.input):
+        log("Input not found: " + args.input)
+        return 1
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index = source_index.get_index(args.input, os.path.join(temp_dir, "index.json"), tools['ffprobe'])
+    try:
+        results = splitting.benchmark_analysis(args.input, str(args.threshold), tools['ffmpeg'], index, args.ranges, args.tolerance)
+    except RuntimeError as error:
+        log("Scene detection failed: " + str(error))
+        return 1
+    for result in results:
+        log(result['mode'] + ": " + "%.2fs" % result['time'] + " (x" + "%.2f" % result['speedup'] + "), Scenes: " + str(result['scenes'])
+            + ", Matched: " + str(result['matched']) + ", Missed: " + str(result['missed']) + ", Extra: " + str(result['extra'])
+            + ", Drift: " + "%.3fs" % result['mean_drift'] + " mean / " + "%.3fs" % result['max_drift'] + " max")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="neav1e", description="Chunked AV1 encoding without GUI")
+    subparsers = parser.add_subparsers(dest="command")
+    parser_encode = subparsers.add_parser("encode", help="encode a single file with a preset")
+    parser_encode.add_argument("--preset", required=True, help="name of a saved preset or path to a preset .json")
+    parser_encode.add_argument("--workers", type=int, help="overrides the worker count of the preset")
+    parser_encode.add_argument("--temp", default=os.path.join(current_dir, "Temp"), help="folder of the temp files")
+    parser_encode.add_argument("--delete-temp", action="store_true", help="delete the temp files after muxing")
+    parser_encode.add_argument("--agents", help="host:port,host:port of worker agents which encode the chunks")
+    parser_encode.add_argument("--token", help="token of the worker agents")
+    parser_encode.add_argument("--incremental-mux", action="store_true", help="mux the finished chunks while the others are still encoding")
+    parser_encode.add_argument("--fanout", action="store_true", help="decode the source once and pipe the frames of every chunk into its encoder")
+    parser_encode.add_argument("--fanout-memory", type=int, help="MiB of decoded frames which may wait for the encoders, every encoder after the first needs about one whole chunk, default: a quarter of the available memory")
+    parser_encode.add_argument("input")
+    parser_encode.add_argument("output")
+    parser_queue = subparsers.add_parser("queue", help="encode several files with one pool of workers")
+    parser_queue.add_argument("--queue", default=os.path.join(current_dir, "queue.json"), help="path of the queue file")
+    queue_commands = parser_queue.add_subparsers(dest="queue_command")
+    parser_add = queue_commands.add_parser("add", help="add a file with its preset to the queue")
+    parser_add.add_argument("--preset", required=True, help="name of a saved preset or path to a preset .json")
+    parser_add.add_argument("input")
+    parser_add.add_argument("output")
+    queue_commands.add_parser("list", help="show the jobs of the queue")
+    parser_remove = queue_commands.add_parser("remove", help="remove a job from the queue")
+    parser_remove.add_argument("id", type=int)
+    parser_run = queue_commands.add_parser("run", help="encode all queued jobs")
+    parser_run.add_argument("--workers", type=int, help="chunks which encode at the same time over all jobs, default: physical cores")
+    parser_run.add_argument("--policy", choices=["fair", "fifo"], default="fair", help="fair: every job gets the same share of the workers, fifo: later jobs only fill idle workers")
+    parser_run.add_argument("--pin", action="store_true", help="pin every chunk to its own slot of cpu cores")
+    parser_run.add_argument("--temp", default=os.path.join(current_dir, "Temp"), help="folder of the temp files")
+    parser_run.add_argument("--delete-temp", action="store_true", help="delete the temp files of a job after muxing")
+    parser_run.add_argument("--incremental-mux", action="store_true", help="mux the finished chunks of a job while the others are still encoding")
+    parser_agent = subparsers.add_parser("agent", help="encode chunks for other machines")
+    parser_agent.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser_agent.add_argument("--port", type=int, default=8765)
+    parser_agent.add_argument("--workers", type=int, help="chunks which encode at the same time, default: physical cores")
+    parser_agent.add_argument("--work-dir", default=os.path.join(current_dir, "Agent"), help="folder of the uploaded inputs and encoded chunks")
+    parser_agent.add_argument("--token", help="only accept requests with this token, required for addresses other than 127.0.0.1")
+    parser_benchmark = subparsers.add_parser("scene-benchmark", help="compare the speed and the cuts of the scene detection analysis modes")
+    parser_benchmark.add_argument("--threshold", type=float, default=0.3, help="scene detection threshold")
+    parser_benchmark.add_argument("--ranges", type=int, default=1, help="time ranges which are analysed at the same time")
+    parser_benchmark.add_argument("--tolerance", type=float, default=0.5, help="seconds a cut may drift and still count as matched")
+    parser_benchmark.add_argument("input")
+    args = parser.parse_args(argv)
+    if args.command == "encode":
+        return encode(args)
+    if args.command == "queue":
+        return queue(args)
+    if args.command == "agent":
+        return agent(args)
+    if args.command == "scene-benchmark":
+        return scene_benchmark(args)
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+This script splits the cpu cores into one slot per worker,
+so the decoder and encoder of a chunk stay on the same cores.
+
+Slots never span two NUMA nodes if it can be avoided (layout read from sysfs),
+smt siblings of a core always end up in the same slot.
+"""
+import os
+import glob
+import threading
+import subprocess
+import psutil
+
+NODE_PATH = "/sys/devices/system/node"
+CPU_PATH = "/sys/devices/system/cpu"
+# Windows process creation flag, not in the subprocess module
+CREATE_SUSPENDED = 0x00000004
+
+
+def parse_cpu_list(text):
+    """
+    Converts a sysfs cpu list (e.g. 0-3,8-11) to a list of cpu numbers
+    """
+    cpus = []
+    for part in text.strip().split(","):
+        if part == "":
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def read_cpu_list(path):
+    try:
+        with open(path) as file_list:
+            return parse_cpu_list(file_list.read())
+    except (OSError, ValueError):
+        return None
+
+
+def get_numa_nodes(allowed):
+    """
+    Returns the allowed cpus grouped by NUMA node, one group if sysfs has no NUMA information
+    """
+    nodes = []
+    for node_path in sorted(glob.glob(os.path.join(NODE_PATH, "node[0-9]*")), key=lambda path: int(path.rsplit("node", 1)[1])):
+        cpus = read_cpu_list(os.path.join(node_path, "cpulist"))
+        if cpus:
+            cpus = [cpu for cpu in cpus if cpu in allowed]
+            if cpus:
+                nodes.append(cpus)
+    assigned = set(cpu for node in nodes for cpu in node)
+    missing = [cpu for cpu in allowed if cpu not in assigned]
+    if missing:
+        nodes.append(missing)
+    return nodes
+
+
+def get_cores(cpus):
+    """
+    Groups the cpus of a node into physical cores (smt siblings together)
+    """
+    cores = []
+    seen = set()
+    for cpu in cpus:
+        if cpu in seen:
+            continue
+        siblings = read_cpu_list(os.path.join(CPU_PATH, "cpu" + str(cpu), "topology", "thread_siblings_list")) or [cpu]
+        core = [sibling for sibling in siblings if sibling in cpus and sibling not in seen] or [cpu]
+        seen.update(core)
+        cores.append(core)
+    return cores
+
+
+def split_evenly(items, count):
+    """
+    Splits the list into count contiguous parts, the sizes differ by at most one
+    """
+    parts = []
+    start = 0
+    for i in range(count):
+        end = start + (len(items) - start) // (count - i)
+        parts.append(items[start:end])
+        start = end
+    return parts
+
+
+def get_slots(slot_count, allowed=None):
+    """
+    Returns slot_count lists of cpus
+
+    Attributes
+    ----------
+    slot_count : int - amount of workers
+    allowed : list - cpus the program may use, default is the current affinity
+    """
+    if allowed is None:
+        allowed = psutil.Process().cpu_affinity()
+    nodes = [get_cores(node) for node in get_numa_nodes(sorted(allowed))]
+    total_cores = sum(len(node) for node in nodes)
+    if slot_count >= total_cores:
+        # More workers than cores: one core per slot, the cores get shared round robin
+        cores = [core for node in nodes for core in node]
+        return [cores[i % len(cores)] for i in range(slot_count)]
+    if slot_count < len(nodes):
+        # Fewer workers than nodes: a slot has to span whole nodes
+        slots = [[] for _ in range(slot_count)]
+        for i, node in enumerate(nodes):
+            slots[i % slot_count].extend(cpu for core in node for cpu in core)
+        return slots
+    # Every node gets one slot, the others go one by one to the node with the most cores per slot,
+    # so no node is left without a slot and the slots are of similar size
+    counts = [1] * len(nodes)
+    for _ in range(slot_count - len(nodes)):
+        counts[max(range(len(nodes)), key=lambda i: len(nodes[i]) / counts[i])] += 1
+    slots = []
+    for node, count in zip(nodes, counts):
+        for part in split_evenly(node, count):
+            slots.append([cpu for core in part for cpu in core])
+    return slots
+
+
+class SlotPool:
+    """
+    Hands out the cpu slots to the running chunks
+    """
+    def __init__(self, slots):
+        self.free = list(slots)
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            return self.free.pop(0)
+
+    def release(self, slot):
+        with self.lock:
+            self.free.append(slot)
+
+
+def get_pinning(cpus):
+    """
+    Returns a preexec_fn which pins the started shell to the cpus,
+    the decoder and encoder of the pipe inherit the affinity.
+    It runs in the forked child of a program with threads: only the plain
+    system call, psutil could wait for a lock held by another thread
+    """
+    def pin():
+        os.sched_setaffinity(0, cpus)
+    return pin
+
+
+def start_pinned(command, cpus, **options):
+    """
+    Returns the Popen of the command pinned to the cpus (Windows has no preexec_fn).
+    The process is created suspended and only resumed once it is pinned, so the decoder
+    and encoder the shell starts inherit the affinity. The program itself is never pinned,
+    other processes it starts meanwhile keep the full affinity
+    """
+    process = subprocess.Popen(command, creationflags=CREATE_SUSPENDED, **options)
+    try:
+        suspended = psutil.Process(process.pid)
+        try:
+            suspended.cpu_affinity(cpus)
+        finally:
+            suspended.resume()
+    except psutil.Error:
+        pass
+    return process
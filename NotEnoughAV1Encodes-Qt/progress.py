@@ -0,0 +1,126 @@
+"""
+This script reads the -progress logs of the ffmpeg instances.
+
+Only newly appended data of the logs is read,
+finished logs are no longer watched. On Linux inotify reports
+which logs changed, else the folder is polled.
+"""
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_EVENT_HEADER = struct.Struct('iIII')
+
+
+class ProgressReader:
+    """
+    Keeps the byte offset and the last frame count of every log file
+    """
+    def __init__(self, progress_path):
+        self.progress_path = progress_path
+        self.offsets = {}
+        self.remainders = {}
+        self.frames = {}
+        self.done = set()
+
+    def update(self, changed=None):
+        """
+        Reads the appended data of the changed logs, all logs if changed is None
+        """
+        if changed is None:
+            changed = os.listdir(self.progress_path)
+        for filename in changed:
+            if filename.endswith(".log") and filename not in self.done:
+                self.read_log(filename)
+
+    def read_log(self, filename):
+        path = os.path.join(self.progress_path, filename)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        offset = self.offsets.get(filename, 0)
+        if size < offset:
+            # Log got recreated by a restarted chunk (or emptied by the tail splitting)
+            offset = 0
+            self.remainders[filename] = b""
+            self.frames.pop(filename, None)
+        if size == offset:
+            return
+        with open(path, 'rb') as file_log:
+            file_log.seek(offset)
+            data = self.remainders.get(filename, b"") + file_log.read(size - offset)
+        self.offsets[filename] = size
+        lines = data.split(b"\n")
+        # Keep the incomplete last line until the rest is written
+        self.remainders[filename] = lines.pop()
+        for line in lines:
+            if line.startswith(b"frame="):
+                self.frames[filename] = int(line[6:])
+            elif line.startswith(b"progress=end"):
+                self.done.add(filename)
+
+    def total_frames(self):
+        return sum(self.frames.values())
+
+
+class LogWatcher:
+    """
+    Waits for changes in the progress folder with inotify (Linux),
+    falls back to sleeping if inotify is not available
+    """
+    def __init__(self, progress_path):
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK)
+            if fd >= 0:
+                if libc.inotify_add_watch(fd, os.fsencode(progress_path), IN_MODIFY | IN_CREATE) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        except (OSError, AttributeError, TypeError):
+            self.fd = None
+
+    def wait(self, timeout):
+        """
+        Returns the names of the changed files, None if unknown (poll all files)
+        """
+        if self.fd is None:
+            time.sleep(timeout)
+            return None
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        # Batch the events of all ffmpeg instances
+        time.sleep(0.5)
+        changed = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            position = 0
+            while position + IN_EVENT_HEADER.size <= len(data):
+                _, mask, _, length = IN_EVENT_HEADER.unpack_from(data, position)
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                position += IN_EVENT_HEADER.size
+                changed.add(os.fsdecode(data[position:position + length].rstrip(b"\0")))
+                position += length
+        # Events got lost, read all files
+        if overflow:
+            return None
+        return changed
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
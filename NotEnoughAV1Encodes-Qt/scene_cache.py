@@ -0,0 +1,88 @@
+"""
+This script caches the results of the scene detection.
+
+The scene scores of all keyframes are stored per source fingerprint
+(hash of sampled blocks of the file + its size) and analysis mode,
+so tuning the threshold, the chunk lengths or the encoder settings
+on the same source doesn't run the scene detection again.
+The cache has a size limit, the least recently used entries are removed.
+"""
+import os
+import json
+import hashlib
+
+CACHE_VERSION = 3
+SAMPLE_COUNT = 32
+SAMPLE_SIZE = 65536
+
+
+def get_fingerprint(video_input):
+    """
+    Returns a hash of the size and of evenly spaced blocks of the source,
+    stays the same if the file gets copied or touched
+    """
+    size = os.path.getsize(video_input)
+    sha = hashlib.sha1(str(size).encode())
+    with open(video_input, 'rb') as file_input:
+        if size <= SAMPLE_COUNT * SAMPLE_SIZE:
+            sha.update(file_input.read())
+        else:
+            for i in range(SAMPLE_COUNT):
+                file_input.seek((size - SAMPLE_SIZE) * i // (SAMPLE_COUNT - 1))
+                sha.update(file_input.read(SAMPLE_SIZE))
+    return sha.hexdigest()
+
+
+class SceneCache:
+    """
+    Attributes
+    ----------
+    cache_dir : string - folder of the cache entries
+    max_size : int - size limit of the cache in bytes
+    """
+    def __init__(self, cache_dir, max_size=32 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def get_key(self, video_input, analysis):
+        return hashlib.sha1(json.dumps([CACHE_VERSION, get_fingerprint(video_input), analysis]).encode()).hexdigest()
+
+    def get_file(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def load(self, key):
+        """
+        Returns the cached (timestamp, scene score) list, None if there is no entry
+        """
+        try:
+            with open(self.get_file(key)) as json_file:
+                candidates = [tuple(candidate) for candidate in json.load(json_file)]
+            # The modification time is the last use of the entry
+            os.utime(self.get_file(key))
+            return candidates
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, candidates):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_file = self.get_file(key) + ".tmp"
+        with open(temp_file, 'w') as outfile:
+            json.dump(candidates, outfile, separators=(',', ':'))
+        os.replace(temp_file, self.get_file(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into max_size
+        """
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith(".json"):
+                stat = os.stat(os.path.join(self.cache_dir, file))
+                entries.append((stat.st_mtime, stat.st_size, file))
+        total = sum(entry[1] for entry in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, file))
+            total -= size
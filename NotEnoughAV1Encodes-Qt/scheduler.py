@@ -0,0 +1,203 @@
+"""
+This script contains the scheduling policies of the encoding queue.
+
+A policy takes the estimated cost of every chunk
+(e.g. frame count * resolution) and returns the order
+in which the chunks are handed to the workers.
+
+In adaptive mode the amount of concurrently running chunks
+follows the system load and memory.
+
+With several jobs in the queue a job policy decides
+which job starts the next chunk.
+"""
+import heapq
+import threading
+import psutil
+
+
+def order_file_name(costs):
+    """
+    Keeps the queue in file name order
+    """
+    return list(range(len(costs)))
+
+
+def order_longest_first(costs):
+    """
+    Longest processing time first: the most expensive chunks start first,
+    so a long chunk can't end up alone at the end of the encode
+    """
+    return sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+
+
+POLICIES = {
+    'file_name': order_file_name,
+    'longest_first': order_longest_first
+}
+
+
+def get_order(policy, costs):
+    """
+    Attributes
+    ----------
+    policy : string - name of the scheduling policy
+    costs : list - estimated cost of every chunk
+    """
+    return POLICIES[policy](costs)
+
+
+def pick_oldest_job(jobs):
+    """
+    First come first served: later jobs only get the workers
+    which the older jobs can't use anymore (their long tail)
+    """
+    return min(range(len(jobs)), key=lambda i: jobs[i]['order'])
+
+
+def pick_fair_job(jobs):
+    """
+    Fair share: the job with the fewest running chunks gets the next worker,
+    ties go to the older job, so no job can take all workers
+    """
+    return min(range(len(jobs)), key=lambda i: (jobs[i]['running'], jobs[i]['order']))
+
+
+JOB_POLICIES = {
+    'fifo': pick_oldest_job,
+    'fair': pick_fair_job
+}
+
+
+def get_job(policy, jobs):
+    """
+    Returns the position of the job which starts the next chunk
+
+    Attributes
+    ----------
+    policy : string - name of the job policy
+    jobs : list - {'order': position in the job queue, 'running': running chunks} of every job with waiting chunks
+    """
+    return JOB_POLICIES[policy](jobs)
+
+
+def simulate_makespan(costs, pool_size, order):
+    """
+    Simulates the pool: every chunk goes to the first idle worker.
+    Returns the time until the last worker finishes, in cost units.
+    """
+    workers = [0.0] * pool_size
+    for i in order:
+        heapq.heapreplace(workers, workers[0] + costs[i])
+    return max(workers)
+
+
+class ConcurrencyLimit:
+    """
+    Limits how many chunks run at the same time, the limit can change while encoding.
+    Waiting chunks start in the order they were taken from the queue.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.next_ticket = 0
+        self.serving = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            while ticket != self.serving or self.running >= self.limit:
+                self.condition.wait()
+            self.serving += 1
+            self.running += 1
+            self.condition.notify_all()
+
+    def release(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+    def set_limit(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+
+class LoadMonitor(threading.Thread):
+    """
+    Samples cpu saturation, available memory and swapping with psutil
+    and raises / lowers the concurrency limit within the given bounds
+
+    Attributes
+    ----------
+    limit : ConcurrencyLimit - the limit to adjust
+    minimum : int - lowest amount of concurrent chunks
+    maximum : int - highest amount of concurrent chunks
+    log : function - receives every decision as text
+    interval : int - seconds between two samples
+    """
+    def __init__(self, limit, minimum, maximum, log, interval=10):
+        super().__init__(daemon=True)
+        self.limit = limit
+        self.minimum = minimum
+        self.maximum = maximum
+        self.log = log
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.processes = {}
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        psutil.cpu_percent(interval=None)
+        self.get_own_cpu()
+        last_swap_out = psutil.swap_memory().sout
+        while not self.stopped.wait(self.interval):
+            cpu = psutil.cpu_percent(interval=None)
+            # Load caused by other programs, our own encoders are supposed to saturate the cpu
+            foreign_cpu = max(cpu - self.get_own_cpu(), 0)
+            memory = psutil.virtual_memory()
+            swap_out = psutil.swap_memory().sout
+            swapped = (swap_out - last_swap_out) / 1024 / 1024
+            last_swap_out = swap_out
+            available = memory.available * 100 / memory.total
+            current = self.limit.limit
+            state = "cpu " + str(round(cpu)) + "% (other programs " + str(round(foreign_cpu)) + "%), available memory " + str(round(available)) + "%, swapped out " + str(round(swapped)) + " MB"
+
+            if available < 10 or swapped > 64:
+                # Memory pressure (e.g. aomenc with a large lag-in-frames), start fewer chunks
+                new_limit = max(current - 1, self.minimum)
+            elif cpu > 95 and foreign_cpu > 25:
+                # Saturated and the machine is shared with other jobs
+                new_limit = max(current - 1, self.minimum)
+            elif cpu < 75 and available > 25 and self.limit.running >= current:
+                # Idle cores and enough memory
+                new_limit = min(current + 1, self.maximum)
+            else:
+                new_limit = current
+
+            if new_limit != current:
+                self.limit.set_limit(new_limit)
+                self.log("Adaptive Workers: " + str(current) + " -> " + str(new_limit) + " (" + state + ")")
+            elif new_limit == self.minimum and (available < 10 or swapped > 64 or (cpu > 95 and foreign_cpu > 25)):
+                self.log("Adaptive Workers: staying at the bound " + str(current) + " (" + state + ")")
+
+    def get_own_cpu(self):
+        """
+        Returns the cpu usage of all child processes (ffmpeg, encoders) in percent of the whole machine
+        """
+        usage = 0.0
+        alive = {}
+        for child in psutil.Process().children(recursive=True):
+            # Keep the process objects, cpu_percent() measures since the previous call
+            process = self.processes.get(child.pid, child)
+            try:
+                usage += process.cpu_percent(interval=None)
+                alive[child.pid] = process
+            except psutil.Error:
+                pass
+        self.processes = alive
+        return usage / (psutil.cpu_count() or 1)
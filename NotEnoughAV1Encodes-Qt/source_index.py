@@ -0,0 +1,262 @@
+"""
+This script builds and caches an index of the video source:
+keyframe timestamps, frame count, duration and stream layout.
+
+The index is created with a single demux-only ffprobe pass (no decoding)
+and stored as a json sidecar in the temp folder of the source.
+It is keyed by the path, size and modification time of the source,
+so repeated runs on the same file skip the probing work.
+"""
+import os
+import re
+import json
+import bisect
+import subprocess
+
+INDEX_VERSION = 1
+
+
+def get_source_key(video_input):
+    """
+    Returns the identity of the source file (path, size, mtime)
+    """
+    stat = os.stat(video_input)
+    return {'path': os.path.abspath(video_input), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def load_index(video_input, index_file):
+    """
+    Returns the cached index of the source or None if there is
+    no index yet, or if it belongs to a different / modified file
+    """
+    if not os.path.isfile(index_file):
+        return None
+    try:
+        with open(index_file) as json_file:
+            index = json.load(json_file)
+        if index['version'] != INDEX_VERSION or index['source'] != get_source_key(video_input):
+            return None
+        return index
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_index(video_input, index_file, ffprobe_path):
+    """
+    Returns the cached index, builds it if it is missing or stale
+    """
+    index = load_index(video_input, index_file)
+    if index is None:
+        index = build_index(video_input, index_file, ffprobe_path)
+    return index
+
+
+def build_index(video_input, index_file, ffprobe_path):
+    """
+    Attributes
+    ----------
+    video_input : path to video input
+    index_file : path of the json sidecar
+    ffprobe_path : path to ffprobe
+    """
+    fmt, streams = probe_streams(video_input, ffprobe_path)
+    start_time = parse_float(fmt.get('start_time')) or 0.0
+
+    # Packet listing of the first video stream, demuxing only
+    cmd = "\"" + ffprobe_path + "\"" + " -v error -select_streams v:0 -show_entries packet=pts_time,dts_time,flags -of csv=p=0 " + "\"" + video_input + "\""
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, shell=True)
+    timestamps = []
+    keyframe_timestamps = []
+    for line in process.stdout:
+        values = line.strip().split(",")
+        if len(values) < 3:
+            continue
+        # Some containers only provide the decoding timestamp
+        time_stamp = parse_float(values[0])
+        if time_stamp is None:
+            time_stamp = parse_float(values[1])
+        if time_stamp is None:
+            continue
+        # Same timeline as the ffmpeg cli, which shifts the input to start at zero
+        time_stamp -= start_time
+        timestamps.append(time_stamp)
+        if "K" in values[2]:
+            keyframe_timestamps.append(time_stamp)
+    process.wait()
+
+    # Packets are in decoding order, the frame number of a keyframe
+    # is its position in presentation order
+    timestamps.sort()
+    keyframes = []
+    for time_stamp in sorted(keyframe_timestamps):
+        keyframes.append([bisect.bisect_left(timestamps, time_stamp), round(time_stamp, 6)])
+
+    index = {
+        'version': INDEX_VERSION,
+        'source': get_source_key(video_input),
+        'duration': parse_float(fmt.get('duration')),
+        'start_time': start_time,
+        'frame_count': len(timestamps),
+        'streams': streams,
+        'keyframes': keyframes
+    }
+
+    with open(index_file, 'w') as outfile:
+        json.dump(index, outfile, separators=(',', ':'))
+    return index
+
+
+def probe_streams(video_input, ffprobe_path):
+    """
+    Reads the container header: format and stream layout (no packet reading)
+    """
+    cmd = "\"" + ffprobe_path + "\"" + " -v error -show_entries format=duration,start_time:stream=index,codec_type,codec_name,width,height,pix_fmt,r_frame_rate,nb_frames:stream_tags -of json " + "\"" + video_input + "\""
+    probe = json.loads(subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, shell=True).stdout or "{}")
+    streams = []
+    for stream in probe.get('streams', []):
+        streams.append({
+            'index': stream.get('index'),
+            'codec_type': stream.get('codec_type'),
+            'codec_name': stream.get('codec_name'),
+            'width': stream.get('width'),
+            'height': stream.get('height'),
+            'pix_fmt': stream.get('pix_fmt'),
+            'frame_rate': stream.get('r_frame_rate'),
+            'nb_frames': stream.get('nb_frames'),
+            'tags': stream.get('tags', {})
+        })
+    return probe.get('format', {}), streams
+
+
+def get_frame_count(video_input, index_file, ffmpeg_path, ffprobe_path):
+    """
+    Returns the framecount of the first video stream, from cheap to expensive:
+    container metadata, packet count (demuxing only), full decode
+    """
+    index = load_index(video_input, index_file)
+    if index is not None:
+        streams = index['streams']
+    else:
+        _, streams = probe_streams(video_input, ffprobe_path)
+
+    # 1. Container metadata (mp4 nb_frames, mkv statistics tags)
+    count = get_metadata_frame_count(streams)
+    if count:
+        return count
+
+    # 2. Packet count, the index already counted them
+    if index is not None and index['frame_count'] > 0:
+        return index['frame_count']
+    cmd = "\"" + ffprobe_path + "\"" + " -v error -select_streams v:0 -count_packets -show_entries stream=nb_read_packets -of csv=p=0 " + "\"" + video_input + "\""
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, shell=True)
+    count = parse_float(result.stdout.strip().split(",")[0])
+    if count:
+        return int(count)
+
+    # 3. Decode the video stream, only the last progress line is kept
+    cmd = "\"" + ffmpeg_path + "\"" + " -i " + "\"" + video_input + "\"" + " -hide_banner -loglevel 32 -map 0:v:0 -f null -"
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, shell=True)
+    last_line = ""
+    for line in process.stdout:
+        if line.strip().startswith('frame'):
+            last_line = line.strip()
+    process.wait()
+    result = re.search('frame=(.+?)fps=', last_line)
+    if result is None:
+        return 0
+    return int(result.group(1))
+
+
+def get_metadata_frame_count(streams):
+    """
+    Returns the framecount stored in the container of the first video stream, 0 if unknown
+    """
+    for stream in streams:
+        if stream['codec_type'] != "video":
+            continue
+        count = parse_float(stream.get('nb_frames'))
+        if count:
+            return int(count)
+        # mkvmerge writes NUMBER_OF_FRAMES, optionally with a language suffix
+        for key, value in stream.get('tags', {}).items():
+            if key.upper().startswith("NUMBER_OF_FRAMES"):
+                count = parse_float(value)
+                if count:
+                    return int(count)
+        return 0
+    return 0
+
+
+def parse_float(value):
+    """
+    Converts ffprobe values to float, returns None for N/A
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_video_stream(index):
+    """
+    Returns the first video stream of the index or None
+    """
+    for stream in index['streams']:
+        if stream['codec_type'] == "video":
+            return stream
+    return None
+
+
+def get_keyframe_times(index):
+    """
+    Returns the pts_time of every keyframe, the list is built once and kept in the index
+    (not in the json sidecar, build_index() writes it before)
+    """
+    times = index.get('_keyframe_times')
+    if times is None:
+        times = index['_keyframe_times'] = [keyframe[1] for keyframe in index['keyframes']]
+    return times
+
+
+def find_keyframe(index, time_stamp, tolerance=0.5):
+    """
+    Returns [frame, pts_time] of the keyframe closest to time_stamp,
+    None if there is no keyframe within the tolerance
+    """
+    keyframes = index['keyframes']
+    if not keyframes:
+        return None
+    position = bisect.bisect_left(get_keyframe_times(index), time_stamp)
+    candidates = keyframes[max(position - 1, 0):position + 1]
+    closest = min(candidates, key=lambda keyframe: abs(keyframe[1] - time_stamp))
+    if abs(closest[1] - time_stamp) > tolerance:
+        return None
+    return closest
+
+
+def get_frame_rate(index):
+    """
+    Returns the frame rate of the first video stream as float, None if unknown
+    """
+    stream = get_video_stream(index)
+    if stream is None or not stream.get('frame_rate'):
+        return None
+    numerator, _, denominator = stream['frame_rate'].partition("/")
+    try:
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate or None
+
+
+def get_frame_number(index, time_stamp):
+    """
+    Returns the frame number of a timestamp, exact for keyframes, else estimated with the frame rate
+    """
+    keyframe = find_keyframe(index, time_stamp, 0.0005)
+    if keyframe is not None:
+        return keyframe[0]
+    rate = get_frame_rate(index)
+    if rate is None:
+        raise ValueError("Unknown frame rate, can't find the frame at " + str(time_stamp))
+    return round(time_stamp * rate)
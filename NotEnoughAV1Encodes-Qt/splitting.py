@@ -0,0 +1,475 @@
+"""
+This script splits the source into chunks:
+scene detection writes the timecodes of the scenes to splits.txt,
+equal chunking writes n-seconds long chunks cut at the keyframes of the index.
+The chunks seek the source directly, for sources with broken timestamps
+they can be written to lossless files first (several ranges at the same time).
+
+Scene detection analyses keyframe aligned time ranges of the source
+with one ffmpeg process per range, optionally on downscaled frames.
+The chunks can be streamed while the detection is still running,
+every chunk is passed on as soon as the scene change at its end is found.
+"""
+import os
+import time
+import bisect
+import threading
+import subprocess
+from collections import deque
+from functools import partial
+from multiprocessing.dummy import Pool
+import scene_cache
+import source_index
+
+ANALYSIS_MODES = ("Full", "Fast (480p)", "Fast (Keyframes only)")
+ANALYSIS_HEIGHT = 480
+
+
+def detect_scenes(video_input, threshold, splitting_output, ffmpeg_path, index_file, range_count=1, analysis=0, min_length=0, max_length=0, cache_dir=None, scene_found=None):
+    """
+    Attributes
+    ----------
+    video_input : string - path of the video input file
+    threshold : float as string - scene detection threshold
+    splitting_output : string - path of the split.txt output
+    ffmpeg_path : path to ffmpeg
+    index_file : string - path of the source index
+    range_count : int - amount of time ranges which are analysed at the same time
+    analysis : int - index of ANALYSIS_MODES
+    min_length : float - scenes shorter than this (seconds) are merged, 0 = off
+    max_length : float - scenes longer than this (seconds) are split, 0 = off
+    cache_dir : string - folder of the scene cache, None disables the cache
+    scene_found : function - receives the number and the line of splits.txt of every chunk as soon as it is final
+
+    Raises RuntimeError if ffmpeg failed on a range, nothing is cached and splits.txt isn't written then
+    """
+    index = source_index.load_index(video_input, index_file)
+    duration = index['duration'] if index is not None else None
+    candidates = None
+    if cache_dir is not None:
+        # Threshold and chunk lengths are applied to the cached scores,
+        # the filters don't matter, the detection runs on the unfiltered source
+        cache = scene_cache.SceneCache(cache_dir)
+        cache_key = cache.get_key(video_input, analysis)
+        candidates = cache.load(cache_key)
+    if candidates is None:
+        stream = None
+        if scene_found is not None and not min_length:
+            # Merging short scenes needs all scenes, without a minimum length a chunk is final at the next scene change
+            stream = SceneStream(float(threshold), duration, max_length, scene_found)
+        # Raises before anything is stored if a range failed, a truncated result would be cached for good
+        candidates = find_candidates(video_input, ffmpeg_path, index, range_count, analysis, stream.add if stream is not None else None)
+        if cache_dir is not None:
+            cache.store(cache_key, candidates)
+        if stream is not None:
+            stream.finish()
+            write_splits(stream.lines, splitting_output)
+            return
+    lines = get_split_lines(constrain_scenes(candidates, float(threshold), duration, min_length, max_length))
+    write_splits(lines, splitting_output)
+    if scene_found is not None:
+        for counter, line in enumerate(lines):
+            scene_found(counter, line)
+
+
+def get_split_lines(scenes):
+    """
+    Returns one line per chunk: "start end" in seconds, the last chunk runs until the end of the source
+    """
+    lines = []
+    previous_scene = "0.000"
+    for time_stamp in scenes:
+        lines.append(previous_scene + " " + time_stamp)
+        previous_scene = time_stamp
+    lines.append(previous_scene)
+    return lines
+
+
+def write_splits(lines, splitting_output):
+    # The seeking arguments are generated from it in set_queue(), an existing file is always complete
+    with open(splitting_output + ".tmp", "w") as out_file:
+        out_file.write("\n".join(lines))
+    os.replace(splitting_output + ".tmp", splitting_output)
+
+
+class SceneStream:
+    """
+    Receives the scene scores of the keyframes in the order of the source,
+    a chunk is final as soon as the scene change at its end is found.
+    Long scenes are split like constrain_scenes() does without a minimum length
+
+    Attributes
+    ----------
+    threshold : float - scene detection threshold
+    duration : float - duration of the source, None if unknown
+    max_length : float - maximum chunk length in seconds, 0 = off
+    scene_found : function - receives the number and the line of splits.txt of every chunk
+    """
+    def __init__(self, threshold, duration, max_length, scene_found):
+        self.threshold = threshold
+        self.duration = duration
+        self.max_length = max_length
+        self.scene_found = scene_found
+        self.start = (0.0, "0.000")
+        # Keyframes of the current scene, they can split it
+        self.times = []
+        self.scores = {}
+        self.lines = []
+
+    def add(self, time_stamp, score):
+        value = float(time_stamp)
+        if score > self.threshold and value > self.start[0]:
+            self.close((value, time_stamp))
+        self.times.append((value, time_stamp))
+        self.scores[time_stamp] = score
+
+    def close(self, stop):
+        cuts = []
+        if self.max_length > 0:
+            cuts = split_scene(self.times, self.scores, self.start[0], stop[0], 0, self.max_length)
+        for cut in cuts + [stop]:
+            self.emit(self.start[1] + " " + cut[1])
+            self.start = cut
+        self.times = []
+        self.scores = {}
+
+    def finish(self):
+        # The length of the last scene is unknown without the duration, it is not split
+        if self.max_length > 0 and self.duration:
+            for cut in split_scene(self.times, self.scores, self.start[0], self.duration, 0, self.max_length):
+                self.emit(self.start[1] + " " + cut[1])
+                self.start = cut
+        self.emit(self.start[1])
+
+    def emit(self, line):
+        self.lines.append(line)
+        self.scene_found(len(self.lines) - 1, line)
+
+
+class RangeMerger:
+    """
+    Passes the candidates of the parallel ranges on in the order of the source:
+    the first unfinished range streams, the candidates of later ranges wait until it is done
+    """
+    def __init__(self, range_count, candidate_found):
+        self.candidate_found = candidate_found
+        self.lock = threading.Lock()
+        self.current = 0
+        self.buffers = [[] for _ in range(range_count)]
+        self.finished = [False] * range_count
+
+    def add(self, range_index, time_stamp, score):
+        with self.lock:
+            if range_index == self.current:
+                self.candidate_found(time_stamp, score)
+            else:
+                self.buffers[range_index].append((time_stamp, score))
+
+    def finish(self, range_index):
+        with self.lock:
+            self.finished[range_index] = True
+            while self.current < len(self.finished) and self.finished[self.current]:
+                self.current += 1
+                if self.current < len(self.finished):
+                    for candidate in self.buffers[self.current]:
+                        self.candidate_found(*candidate)
+                    self.buffers[self.current] = []
+
+
+def find_scenes(video_input, threshold, ffmpeg_path, index, range_count=1, analysis=0):
+    """
+    Returns the timestamps of the scene changes
+    """
+    return [time_stamp for time_stamp, score in find_candidates(video_input, ffmpeg_path, index, range_count, analysis) if score > float(threshold)]
+
+
+def find_candidates(video_input, ffmpeg_path, index, range_count=1, analysis=0, candidate_found=None):
+    """
+    Returns (timestamp, scene score) of every keyframe, the keyframes above
+    the threshold are the scene changes, the others can split long scenes
+
+    Attributes
+    ----------
+    candidate_found : function - receives (timestamp, scene score) of every keyframe in the order of the source, while the detection runs
+    """
+    decode_args, analysis_filter = get_analysis_arguments(analysis, index)
+    ranges = get_detection_ranges(index, range_count, analysis) if index is not None else [(0, None, None, None)]
+    merger = RangeMerger(len(ranges), candidate_found) if candidate_found is not None else None
+
+    def run_range(range_index):
+        result = detect_range(video_input, ffmpeg_path, index, decode_args, analysis_filter, ranges[range_index], partial(merger.add, range_index) if merger is not None else None)
+        if merger is not None:
+            merger.finish(range_index)
+        return result
+
+    pool = Pool(len(ranges))
+    results = pool.map(run_range, range(len(ranges)))
+    pool.close()
+    candidates = {}
+    for result in results:
+        candidates.update(result)
+    return sorted(candidates.items(), key=lambda candidate: float(candidate[0]))
+
+
+def get_analysis_arguments(analysis, index):
+    """
+    Returns the decoding arguments and the filters in front of the scene detection.
+    The fast modes analyse 8 bit luma at 480p, the scene scores are almost the same
+    as at full resolution; keyframes only skips decoding of all other frames,
+    their scene score is then measured against the previous keyframe
+    """
+    if analysis == 0:
+        return "", ""
+    analysis_filter = "format=gray,"
+    stream = source_index.get_video_stream(index) if index is not None else None
+    if stream is None or not stream['height'] or stream['height'] > ANALYSIS_HEIGHT:
+        analysis_filter = "scale=-2:" + str(ANALYSIS_HEIGHT) + ":flags=fast_bilinear," + analysis_filter
+    decode_args = " -skip_frame nokey" if analysis == 2 else ""
+    return decode_args, analysis_filter
+
+
+def get_scene_command(video_input, ffmpeg_path, decode_args="", analysis_filter="", seek=None, duration=None):
+    # -copyts -start_at_zero: the pts_time of a seeked range is on the timeline of the whole source
+    seek_args = ""
+    if seek is not None:
+        seek_args = " -copyts -start_at_zero -ss " + "%.6f" % seek
+    if duration is not None:
+        seek_args += " -t " + "%.6f" % duration
+    # select sets lavfi.scene_score on every frame, only the keyframes are printed
+    return "\"" + ffmpeg_path + "\"" + seek_args + decode_args + " -i " + "\"" + video_input + "\"" + " -hide_banner -loglevel 32 -filter_complex " + "\"" + analysis_filter + "select=gte(scene\\,0),select=eq(key\\,1),metadata=print:key=lavfi.scene_score" + "\"" + " -an -f null -"
+
+
+def read_candidates(cmd, candidate_found=None):
+    """
+    Returns (pts_time, scene score) of the keyframes ffmpeg printed,
+    candidate_found receives every keyframe as soon as it is printed.
+    Raises RuntimeError if ffmpeg failed, its output would look like a source without scene changes
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,universal_newlines=True, shell=True)
+
+    candidates = []
+    time_stamp = None
+    # The last lines are the error message if ffmpeg fails
+    output = deque(maxlen=5)
+    for line in process.stdout:
+        output.append(line.strip())
+        if "pts_time:" in line:
+            time_stamp = line.split("pts_time:")[1].split()[0]
+        elif "lavfi.scene_score=" in line and time_stamp is not None:
+            candidates.append((time_stamp, float(line.split("lavfi.scene_score=")[1])))
+            if candidate_found is not None:
+                candidate_found(*candidates[-1])
+            time_stamp = None
+    return_code = process.wait()
+    if return_code != 0:
+        raise RuntimeError("ffmpeg exit code " + str(return_code) + ": " + " ".join(line for line in output if line))
+    return candidates
+
+
+def snap_scene(index, time_stamp):
+    # ffmpeg prints pts_time with 6 significant digits,
+    # replace them with the exact keyframe timestamps of the index
+    if index is not None:
+        keyframe = source_index.find_keyframe(index, float(time_stamp))
+        if keyframe is not None:
+            return "%.6f" % keyframe[1]
+    return time_stamp
+
+
+def get_detection_ranges(index, range_count, analysis=0):
+    """
+    Returns (start, end, seek, duration) of every range, start and end are keyframe timestamps.
+    A range only keeps the scene changes in [start, end), its decoding starts (seek) at an earlier
+    keyframe: the scene score of a frame depends on the two frames decoded before it, so the frames
+    around start are scored the same as in a single pass over the whole file. With the keyframes
+    only analysis these are the two keyframes before start
+    """
+    keyframes = index['keyframes']
+    duration = index['duration']
+    if range_count < 2 or not duration or len(keyframes) < 2:
+        return [(0, None, None, None)]
+    times = source_index.get_keyframe_times(index)
+    frames = [keyframe[0] for keyframe in keyframes]
+    starts = [0]
+    for i in range(1, range_count):
+        position = bisect.bisect_left(times, duration * i / range_count)
+        if position < len(keyframes) and position > starts[-1]:
+            starts.append(position)
+    ranges = []
+    for i, position in enumerate(starts):
+        start = keyframes[position][1]
+        end = keyframes[starts[i + 1]][1] if i + 1 < len(starts) else None
+        seek = None
+        # Keyframe with at least 3 frames before the range start (scene score uses the two previous frame differences)
+        decode_start = bisect.bisect_right(frames, keyframes[position][0] - 3) - 1
+        if analysis == 2:
+            decode_start = min(decode_start, position - 2)
+        if decode_start > 0:
+            seek = keyframes[decode_start][1]
+        ranges.append((start, end, seek, end - (seek or 0) if end is not None else None))
+    return ranges
+
+
+def detect_range(video_input, ffmpeg_path, index, decode_args, analysis_filter, detection_range, candidate_found=None):
+    """
+    Returns the scene score of every keyframe of one range
+    """
+    start, end, seek, duration = detection_range
+    candidates = []
+
+    def keyframe_found(time_stamp, score):
+        time_stamp = snap_scene(index, time_stamp)
+        # Keyframes before the range start belong to the previous range
+        if float(time_stamp) >= start and (end is None or float(time_stamp) < end):
+            candidates.append((time_stamp, score))
+            if candidate_found is not None:
+                candidate_found(time_stamp, score)
+
+    read_candidates(get_scene_command(video_input, ffmpeg_path, decode_args, analysis_filter, seek, duration), keyframe_found)
+    return candidates
+
+
+def constrain_scenes(candidates, threshold, duration, min_length=0, max_length=0):
+    """
+    Returns the scene changes with the chunk length limits applied:
+    scenes shorter than min_length are merged into a neighbour (the weaker cut is removed,
+    on equal scores the one which gives the shorter merged scene),
+    scenes longer than max_length are split at their strongest keyframes
+
+    Attributes
+    ----------
+    candidates : list - (timestamp, scene score) of every keyframe
+    threshold : float - scene detection threshold
+    duration : float - duration of the source, None if unknown
+    min_length : float - minimum chunk length in seconds, 0 = off
+    max_length : float - maximum chunk length in seconds, 0 = off
+    """
+    scores = {time_stamp: score for time_stamp, score in candidates}
+    times = sorted((float(time_stamp), time_stamp) for time_stamp in scores)
+    cuts = [(value, time_stamp) for value, time_stamp in times if scores[time_stamp] > threshold]
+    end = duration if duration else None
+
+    if min_length > 0:
+        # Merges the shortest scene first, until every scene is long enough
+        while cuts:
+            bounds = [0.0] + [value for value, _ in cuts] + [end if end is not None else float('inf')]
+            lengths = [bounds[i + 1] - bounds[i] for i in range(len(bounds) - 1)]
+            shortest = min(range(len(lengths)), key=lambda i: lengths[i])
+            if lengths[shortest] >= min_length:
+                break
+            # Inner cuts of the scene: cut shortest - 1 starts it, cut shortest ends it,
+            # removing cut i merges scene i and i + 1. Merging into the shorter neighbour
+            # keeps equal scores from growing one scene over and over
+            inner = [i for i in (shortest - 1, shortest) if 0 <= i < len(cuts)]
+            del cuts[min(inner, key=lambda i: (scores[cuts[i][1]], lengths[i] + lengths[i + 1]))]
+
+    if max_length > 0:
+        # The length of the last scene is unknown without the duration, it is not split
+        bounds = [(0.0, None)] + cuts + ([(end, None)] if end is not None else [])
+        cuts = []
+        for (start, start_stamp), (stop, stop_stamp) in zip(bounds, bounds[1:]):
+            cuts += split_scene(times, scores, start, stop, min_length, max_length)
+            if stop_stamp is not None:
+                cuts.append((stop, stop_stamp))
+    return [time_stamp for _, time_stamp in cuts]
+
+
+def split_scene(times, scores, start, stop, min_length, max_length):
+    """
+    Returns the cuts which split the scene [start, stop) into parts of at most max_length,
+    prefers strong keyframes near the middle, so both parts are of similar length
+    """
+    length = stop - start
+    if length <= max_length:
+        return []
+    inside = [(value, time_stamp) for value, time_stamp in times if start + min_length <= value <= stop - min_length and start < value < stop]
+    if not inside:
+        return []
+    balanced = [candidate for candidate in inside if start + length / 4 <= candidate[0] <= stop - length / 4]
+    best = max(balanced or inside, key=lambda candidate: scores[candidate[1]])
+    return split_scene(times, scores, start, best[0], min_length, max_length) + [best] + split_scene(times, scores, best[0], stop, min_length, max_length)
+
+
+def compare_scenes(reference, scenes, tolerance=0.5):
+    """
+    Returns how far the scenes drift from the reference (e.g. full resolution analysis):
+    scene changes within the tolerance (seconds) count as matched
+    """
+    reference = [float(time_stamp) for time_stamp in reference]
+    scenes = [float(time_stamp) for time_stamp in scenes]
+    drifts = []
+    for time_stamp in reference:
+        closest = min(scenes, key=lambda scene: abs(scene - time_stamp), default=None)
+        if closest is not None and abs(closest - time_stamp) <= tolerance:
+            drifts.append(abs(closest - time_stamp))
+    extra = sum(1 for scene in scenes if not any(abs(scene - time_stamp) <= tolerance for time_stamp in reference))
+    return {'matched': len(drifts), 'missed': len(reference) - len(drifts), 'extra': extra,
+            'mean_drift': sum(drifts) / len(drifts) if drifts else 0.0, 'max_drift': max(drifts, default=0.0)}
+
+
+def benchmark_analysis(video_input, threshold, ffmpeg_path, index, range_count=1, tolerance=0.5):
+    """
+    Runs the scene detection with every analysis mode, returns the time,
+    the speedup and the drift of the scenes compared with the full resolution analysis
+    """
+    results = []
+    for analysis, name in enumerate(ANALYSIS_MODES):
+        start = time.monotonic()
+        scenes = find_scenes(video_input, threshold, ffmpeg_path, index, range_count, analysis)
+        result = {'mode': name, 'time': time.monotonic() - start, 'scenes': len(scenes)}
+        if analysis == 0:
+            reference = scenes
+            reference_time = result['time']
+        result['speedup'] = reference_time / result['time'] if result['time'] > 0 else 0.0
+        result.update(compare_scenes(reference, scenes, tolerance))
+        results.append(result)
+    return results
+
+
+def split_keyframes(video_input, seg_time, splitting_output, index_file):
+    """
+    Writes n-seconds long chunks to splits.txt, like the segment muxer every chunk
+    ends at the first keyframe after its time, the source is not decoded
+
+    Attributes
+    ----------
+    seg_time : int as string - chunk length in seconds
+    """
+    index = source_index.load_index(video_input, index_file)
+    write_splits(get_split_lines(get_keyframe_splits(index['keyframes'], float(seg_time))), splitting_output)
+
+
+def get_keyframe_splits(keyframes, seg_time):
+    cuts = []
+    for _, time_stamp in keyframes:
+        if time_stamp > 0 and time_stamp >= seg_time * (len(cuts) + 1):
+            cuts.append(str(time_stamp))
+    return cuts
+
+
+def split_ranges(ranges, video_codec, ffmpeg_path, process_count, range_finished):
+    """
+    Reencodes keyframe aligned ranges of the source into lossless files,
+    process_count ffmpeg processes run at the same time
+
+    Attributes
+    ----------
+    ranges : list - (name, input arguments with seeking, output file) of every range
+    video_codec : string - lossless codec and filters
+    range_finished : function - receives the name of a range and if its file got written, as soon as it is done
+    """
+    pool = Pool(process_count)
+    for name, success in pool.imap_unordered(partial(split_range, video_codec=video_codec, ffmpeg_path=ffmpeg_path), ranges):
+        range_finished(name, success)
+    pool.close()
+
+
+def split_range(split, video_codec, ffmpeg_path):
+    name, input_args, output = split
+    # Written to a temp file first, an existing chunk file is always complete
+    temp_file = os.path.splitext(output)[0] + ".tmp.mkv"
+    cmd = "\"" + ffmpeg_path + "\"" + " -y -hide_banner -loglevel 0" + input_args + " -map 0:v:0 -map_metadata -1 -c:v " + video_codec + " \"" + temp_file + "\""
+    if subprocess.call(cmd, shell=True) != 0 or not os.path.isfile(temp_file):
+        return name, False
+    os.replace(temp_file, output)
+    return name, True
@@ -0,0 +1,178 @@
+"""
+This script splits the last chunks of an encode for the idle workers.
+
+Near the end of an encode only a few long chunks are left and the other
+workers idle. Once all chunks are started and enough workers are idle,
+the chunk with the highest cost which started only recently is stopped
+and split at keyframes into sub-chunks, one for every idle worker.
+The job joins the sub-chunks into the .ivf of their chunk again.
+"""
+import time
+import threading
+from collections import deque
+
+import psutil
+
+import encode_pool
+
+
+def kill_process_tree(process):
+    # The chunk runs as shell pipe (ffmpeg | encoder), the shell itself doesn't stop its children
+    try:
+        children = psutil.Process(process.pid).children(recursive=True)
+    except psutil.Error:
+        children = []
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+class TailSplit:
+    """
+    Settings of the tail splitting
+
+    Attributes
+    ----------
+    split_chunk : function - receives the name of a chunk and the amount of parts,
+                  returns (name, [passes]) of its sub-chunks in order, None if it can't be split
+    get_cost : function - receives the name of a chunk, returns its estimated cost
+    idle_workers : int - idle workers which start a split
+    window : int - seconds a chunk may have encoded and still be split, the encoded part is lost
+    """
+    def __init__(self, split_chunk, get_cost, idle_workers=2, window=30):
+        self.split_chunk = split_chunk
+        self.get_cost = get_cost
+        self.idle_workers = max(idle_workers, 1)
+        self.window = window
+
+    def run_pool(self, pool_size, chunks, limit, slots, chunk_finished, log):
+        """
+        Encodes (name, [passes]) of every chunk of the iterable, see encode_pool.run_pool()
+        """
+        TailPool(self, pool_size, limit, slots, chunk_finished, log).run(chunks)
+
+
+class TailPool:
+    """
+    Pool of workers which take the sub-chunks before the next chunk of the queue
+    """
+    def __init__(self, tail, pool_size, limit, slots, chunk_finished, log):
+        self.tail = tail
+        self.pool_size = pool_size
+        self.limit = limit
+        self.slots = slots
+        self.chunk_finished = chunk_finished
+        self.log = log
+        self.condition = threading.Condition()
+        # Results are reported one at a time, but not under the pool lock (joining the sub-chunks takes a while)
+        self.report_lock = threading.Lock()
+        self.source = None
+        self.reading = False
+        self.exhausted = False
+        self.idle = 0
+        self.sub_chunks = deque()
+        # name: {'start': start of the first pass, 'pass': running pass, 'process': Popen, 'splittable', 'stolen'}
+        self.running = {}
+
+    def run(self, chunks):
+        self.source = iter(chunks)
+        workers = [threading.Thread(target=self.work) for _ in range(self.pool_size)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    def work(self):
+        while True:
+            chunk = self.next_chunk()
+            if chunk is None:
+                return
+            name, success = encode_pool.encode_chunk(chunk, self.limit, self.slots, self.pass_started)
+            with self.condition:
+                stolen = self.running.pop(name)['stolen']
+                self.condition.notify_all()
+            # A split chunk is finished by its sub-chunks
+            if not stolen:
+                with self.report_lock:
+                    self.chunk_finished(name, success)
+
+    def next_chunk(self):
+        """
+        Returns the next chunk, None once all chunks are finished and nothing is left to split
+        """
+        with self.condition:
+            self.idle += 1
+            self.condition.notify_all()
+            try:
+                while True:
+                    if self.sub_chunks:
+                        return self.add_running(self.sub_chunks.popleft(), False)
+                    if not self.exhausted and not self.reading:
+                        chunk = self.read()
+                        if chunk is not None:
+                            return self.add_running(chunk, True)
+                        continue
+                    if self.exhausted and not self.running:
+                        return None
+                    # Splitting only starts once the queue is empty, before that the idle workers get whole chunks
+                    if not (self.exhausted and self.idle >= self.tail.idle_workers and self.steal()):
+                        self.condition.wait()
+            finally:
+                self.idle -= 1
+
+    def read(self):
+        # The live queue blocks until the next chunk is split / detected, the other workers go on meanwhile
+        self.reading = True
+        self.condition.release()
+        try:
+            chunk = next(self.source, None)
+        finally:
+            self.condition.acquire()
+            self.reading = False
+            self.condition.notify_all()
+        if chunk is None:
+            self.exhausted = True
+        return chunk
+
+    def add_running(self, chunk, splittable):
+        self.running[chunk[0]] = {'start': None, 'pass': 0, 'process': None, 'splittable': splittable, 'stolen': False}
+        return chunk
+
+    def pass_started(self, name, number, process):
+        with self.condition:
+            record = self.running[name]
+            record['pass'] = number
+            record['process'] = process
+            if number == 0:
+                record['start'] = time.monotonic()
+            if record['stolen']:
+                # Got split while it was waiting for a free slot
+                kill_process_tree(process)
+
+    def steal(self):
+        """
+        Splits the running chunk with the highest cost which started within the window, returns False if there is none
+        """
+        now = time.monotonic()
+        candidates = [name for name, record in self.running.items() if record['splittable'] and record['pass'] == 0
+                      and (record['start'] is None or now - record['start'] < self.tail.window)]
+        for name in sorted(candidates, key=self.tail.get_cost, reverse=True):
+            record = self.running[name]
+            record['splittable'] = False
+            # The idle workers and the worker of the chunk encode the parts
+            sub_chunks = self.tail.split_chunk(name, self.idle + 1)
+            if sub_chunks:
+                record['stolen'] = True
+                if record['process'] is not None:
+                    kill_process_tree(record['process'])
+                self.sub_chunks.extend(sub_chunks)
+                self.log("Tail Split: " + name + " -> " + str(len(sub_chunks)) + " Chunks")
+                self.condition.notify_all()
+                return True
+        return False
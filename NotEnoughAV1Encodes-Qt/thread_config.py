@@ -0,0 +1,61 @@
+"""
+This script calculates the threading settings of a single chunk encode.
+
+Every worker runs its own ffmpeg decoder and encoder instance,
+the encoder threads and tiles are sized so that all workers together
+roughly match the amount of cpu threads of the machine.
+"""
+import math
+
+# Used if the resolution of the source is unknown
+DEFAULT_WIDTH = 1920
+DEFAULT_HEIGHT = 1080
+
+# Smallest useful tile size, smaller tiles cost efficiency without adding much speed
+MIN_TILE_WIDTH = 512
+MIN_TILE_HEIGHT = 256
+
+
+def get_thread_config(worker_count, physical_cores, logical_cores, width=None, height=None):
+    """
+    Returns the encoder threads and log2 of the tile columns / rows of one chunk
+
+    Attributes
+    ----------
+    worker_count : int - amount of chunks running at the same time
+    physical_cores : int - physical cpu cores
+    logical_cores : int - logical cpu cores (smt / hyperthreading)
+    width : int - width of the source
+    height : int - height of the source
+    """
+    threads = get_threads(worker_count, physical_cores, logical_cores)
+    tile_columns, tile_rows = get_tiles(threads, width or DEFAULT_WIDTH, height or DEFAULT_HEIGHT)
+    return {'threads': threads, 'tile_columns': tile_columns, 'tile_rows': tile_rows}
+
+
+def get_threads(worker_count, physical_cores, logical_cores):
+    """
+    Splits the cpu threads over the workers
+    """
+    logical_cores = logical_cores or physical_cores or 1
+    physical_cores = physical_cores or logical_cores
+    worker_count = max(worker_count, 1)
+    if worker_count >= physical_cores:
+        # The workers alone saturate the cores, more threads only add switching
+        return 1
+    # Every chunk also has a decoder, which keeps roughly half a thread busy
+    return max(int(logical_cores / worker_count - 0.5), 1)
+
+
+def get_tiles(threads, width, height):
+    """
+    Returns log2 of the tile columns and rows: enough tiles to keep
+    all threads busy, but not smaller than the minimum tile size
+    """
+    target = math.ceil(math.log2(threads)) if threads > 1 else 0
+    max_columns = int(math.log2(max(width // MIN_TILE_WIDTH, 1)))
+    max_rows = int(math.log2(max(height // MIN_TILE_HEIGHT, 1)))
+    # Columns first, they split the work more evenly than rows
+    tile_columns = min(target, max_columns)
+    tile_rows = min(target - tile_columns, max_rows)
+    return tile_columns, tile_rows
@@ -5,10 +5,8 @@ which runs n-workers async in the threading model of qt.
 Author: Alkl58
 Date: 05.03.2021
 """
-from multiprocessing.dummy import Pool
-from functools import partial
-from subprocess import call, DEVNULL
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+import encode_pool
 
 class Worker(QObject):
     """
@@ -17,20 +15,34 @@ class Worker(QObject):
     Signals
     ----------
     finished : returns if all work is finished
+    chunk_finished : returns the name of a chunk and if all of its passes succeeded
+    log : returns the finished chunks and the decisions of the adaptive worker count
     """
     finished = pyqtSignal()
+    chunk_finished = pyqtSignal(str, bool)
+    log = pyqtSignal(str)
     @pyqtSlot()
-    def run(self, pool_size, queue_first, queue_second):
+    def run(self, pool_size, queue_names, queue_first, queue_second, queue_costs, policy, adaptive_bounds, pin_cores=False, live_queue=None, tail=None):
         """
         Attributes
         ----------
         pool_size : sets the amount of workers
+        queue_names : chunk names
         queue_first : first pass queue list
         queue_second : second pass queue list
+        queue_costs : estimated cost of every chunk
+        policy : name of the scheduling policy
+        adaptive_bounds : None, or (min, max) workers if the worker count follows the system load
+        pin_cores : pins every chunk to its own slot of cpu cores
+        live_queue : queue.Queue - chunks which are added while encoding (lossless splitting, scene detection), replaces the queue lists
+        tail : tail_split.TailSplit - splits the last chunks for the idle workers, None = off
         """
-        pool = Pool(pool_size)
-        for i, _ in enumerate(pool.imap(partial(call, shell=True, stderr=DEVNULL), queue_first)):  # Multi Threaded Encoding
-            print("Finished Worker: " + str(i))
-        for i, _ in enumerate(pool.imap(partial(call, shell=True, stderr=DEVNULL), queue_second)):  # Multi Threaded Encoding
-            print("Finished Worker: " + str(i))
+        if live_queue is not None:
+            encode_pool.encode_live(pool_size, live_queue, adaptive_bounds, pin_cores, self.on_chunk_finished, self.log.emit, tail)
+        else:
+            encode_pool.encode_chunks(pool_size, queue_names, queue_first, queue_second, queue_costs, policy, adaptive_bounds, pin_cores, self.on_chunk_finished, self.log.emit, tail)
         self.finished.emit()
+
+    def on_chunk_finished(self, name, success):
+        self.log.emit("Finished Worker: " + name)
+        self.chunk_finished.emit(name, success)
@@ -1,10 +1,10 @@
 """
-This script uses ffmpeg to encode audio.
+This script watches the audio encode,
+which runs next to splitting and video encoding.
 
 Author: Alkl58
 Date: 05.03.2021
 """
-import subprocess
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
 
@@ -14,20 +14,21 @@ class WorkerAudio(QObject):
 
     Signals
     ----------
-    finished : emit a signal if work is finished
+    progress : emits the encoded part of all tracks in percent
+    finished : emits if all tracks are finished and if all of them were encoded
     """
-    finished = pyqtSignal()
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(bool)
     @pyqtSlot()
-    def run(self, video_input, audio_codec, audio_output, ffmpeg_path):
+    def run(self, audio_encode, get_duration):
         """
         Attributes
         ----------
-        video_input : string - path of the video input file
-        audio_codec : list - audio encoding parameters
-        audio_output : string - path of the audio output
-        ffmpeg_path : path to ffmpeg
+        audio_encode : audio.AudioEncode - started audio encode
+        get_duration : function - returns the duration of the source, None until the source is indexed
         """
-        cmd = "\"" + ffmpeg_path + "\" -i \"" + video_input + "\" -map_metadata -1 -vn -sn " + audio_codec + " \"" + audio_output + "\""
-        _ = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,universal_newlines=True, shell=True)
-
-        self.finished.emit()
+        # Checks the progress every 2 seconds until all tracks are done
+        while not audio_encode.wait(2) and audio_encode.is_running():
+            self.progress.emit(int(audio_encode.get_progress(get_duration()) * 100))
+        self.progress.emit(100)
+        self.finished.emit(audio_encode.wait())
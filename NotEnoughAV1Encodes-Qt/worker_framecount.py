@@ -4,9 +4,8 @@ This script calculates the framecount of the video source.
 Author: Alkl58
 Date: 06.03.2021
 """
-import re
-import subprocess
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+import source_index
 
 class WorkerFramecount(QObject):
     """
@@ -20,21 +19,15 @@ class WorkerFramecount(QObject):
     framecount = pyqtSignal(int)
     finished = pyqtSignal()
     @pyqtSlot()
-    def run(self, video_input, ffmpeg_path):
+    def run(self, video_input, ffmpeg_path, ffprobe_path, index_file):
         """
         Attributes
         ----------
         video_input : path to video input
         ffmpeg_path : path to ffmpeg
+        ffprobe_path : path to ffprobe
+        index_file : path of the source index
         """
-        cmd = "\"" + ffmpeg_path + "\"" + " -i " + "\"" + video_input + "\"" + " -hide_banner -loglevel 32 -map 0:v:0 -f null -"
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,universal_newlines=True, shell=True)
-        temp = []
-        for line in process.stdout:
-            temp.append(line)
-        lines = [line.strip() for line in temp]
-        idx = [i for i, item in enumerate(lines) if item.startswith('frame')]
-        temp = lines[idx[-1]]
-        result = re.search('frame=(.+?)fps=', str(temp))
-        self.framecount.emit(int(result.group(1)))
+        frame_count = source_index.get_frame_count(video_input, index_file, ffmpeg_path, ffprobe_path)
+        self.framecount.emit(frame_count)
         self.finished.emit()
@@ -0,0 +1,27 @@
+"""
+This script indexes the video source with ffprobe,
+or loads the index of a previous run.
+"""
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+import source_index
+
+class WorkerIndex(QObject):
+    """
+    WorkerIndex Class
+
+    Signals
+    ----------
+    finished : emit a signal if work is finished
+    """
+    finished = pyqtSignal()
+    @pyqtSlot()
+    def run(self, video_input, index_file, ffprobe_path):
+        """
+        Attributes
+        ----------
+        video_input : string - path of the video input file
+        index_file : string - path of the index sidecar
+        ffprobe_path : path to ffprobe
+        """
+        source_index.get_index(video_input, index_file, ffprobe_path)
+        self.finished.emit()
@@ -1,12 +1,19 @@
 """
 This script reads the progress of all ffmpeg instances.
 
+The -progress logs are read incrementally by progress.py,
+which is shared with the headless engine.
+
+Alternatively ffmpeg sends its -progress output over http to a
+local asyncio listener, without any log files.
+
 Author: Alkl58
 Date: 06.03.2021
 """
-import os
-import time
+import asyncio
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from progress import ProgressReader, LogWatcher
+
 
 class WorkerProgress(QObject):
     """
@@ -27,26 +34,119 @@ class WorkerProgress(QObject):
         ----------
         progress_path : path to where the log files are located
         """
+        reader = ProgressReader(progress_path)
+        watcher = LogWatcher(progress_path)
+        changed = None
         while self._is_running:
-            # Pulls the framecount every 2 seconds
-            total_encoded_frames = 0
+            # Pulls the framecount every 2 seconds, or earlier if inotify reports changes
             try:
-                for filename in os.listdir(progress_path):
-                    if filename.endswith(".log"):
-                        
-                            with open(os.path.join(progress_path, filename), 'r') as file_log:
-                                lines = [line.rstrip() for line in file_log]
-                            idx = [i for i, item in enumerate(lines) if item.startswith('frame')]
-                            total_encoded_frames += int(lines[idx[-1]][6:])
-            except:
+                reader.update(changed)
+            except OSError:
                 pass
             if self._is_running:
-                self.progress.emit(total_encoded_frames)
-            time.sleep(2)
+                self.progress.emit(reader.total_frames())
+            changed = watcher.wait(2)
+        watcher.close()
         self.finished.emit()
-    
+
     def stop(self):
         """
         Stops the while loop in run()
         """
         self._is_running = False
+
+
+class WorkerProgressSocket(QObject):
+    """
+    WorkerProgressSocket
+
+    Every ffmpeg instance posts its -progress output to
+    http://127.0.0.1:<port>/<log name>, the path identifies the chunk
+
+    Signals
+    ----------
+    progress : emits the total amount of encoded frames
+    speed : emits the summed fps of all running chunks
+    finished : emits if the run function is finished
+    """
+    progress = pyqtSignal(int)
+    speed = pyqtSignal(float)
+    finished = pyqtSignal()
+    _is_running = True
+    @pyqtSlot()
+    def run(self, server_socket, resumed_frames):
+        """
+        Attributes
+        ----------
+        server_socket : listening loopback socket, the port is used in the ffmpeg commands
+        resumed_frames : frames of the chunks which were already done in a previous run
+        """
+        self.frames = {}
+        self.fps = {}
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self.serve(server_socket, resumed_frames))
+        loop.close()
+        self.finished.emit()
+
+    def stop(self):
+        """
+        Stops the listener
+        """
+        self._is_running = False
+
+    async def serve(self, server_socket, resumed_frames):
+        server = await asyncio.start_server(self.handle_client, sock=server_socket)
+        while self._is_running:
+            # Publish the progress twice a second
+            self.progress.emit(resumed_frames + sum(self.frames.values()))
+            self.speed.emit(sum(self.fps.values()))
+            await asyncio.sleep(0.5)
+        server.close()
+        await server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        # Request line: POST /<log name> HTTP/1.1
+        request = (await reader.readline()).split()
+        name = request[1].decode(errors='replace').lstrip("/") if len(request) > 1 else ""
+        chunked = False
+        while True:
+            header = (await reader.readline()).lower()
+            if header.strip() == b"":
+                break
+            if header.startswith(b"transfer-encoding:") and b"chunked" in header:
+                chunked = True
+            elif header.startswith(b"expect:") and b"100-continue" in header:
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        remainder = b""
+        try:
+            while True:
+                if chunked:
+                    size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                    if size == 0:
+                        break
+                    data = await reader.readexactly(size)
+                    await reader.readline()
+                else:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                lines = (remainder + data).split(b"\n")
+                remainder = lines.pop()
+                for line in lines:
+                    self.parse_line(name, line.strip())
+        except (asyncio.IncompleteReadError, ValueError, ConnectionError):
+            pass
+        self.fps[name] = 0.0
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        writer.close()
+
+    def parse_line(self, name, line):
+        try:
+            if line.startswith(b"frame="):
+                self.frames[name] = int(line[6:])
+            elif line.startswith(b"fps="):
+                self.fps[name] = float(line[4:])
+            elif line.startswith(b"progress=end"):
+                self.fps[name] = 0.0
+        except ValueError:
+            pass
@@ -5,9 +5,8 @@ of the scenes from the video.
 Author: Alkl58
 Date: 05.03.2021
 """
-import subprocess
-import os
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+import splitting
 
 class WorkerScene(QObject):
     """
@@ -15,11 +14,13 @@ class WorkerScene(QObject):
 
     Signals
     ----------
-    finished : emit a signal if work is finished
+    scene_found : emits the number and the line of splits.txt of every chunk as soon as it is final
+    finished : emits the error of the detection if it failed, an empty string otherwise
     """
-    finished = pyqtSignal()
+    scene_found = pyqtSignal(int, str)
+    finished = pyqtSignal(str)
     @pyqtSlot()
-    def run(self, video_input, threshold, splitting_output, ffmpeg_path):
+    def run(self, video_input, threshold, splitting_output, ffmpeg_path, index_file, range_count=1, analysis=0, min_length=0, max_length=0, cache_dir=None):
         """
         Attributes
         ----------
@@ -27,34 +28,18 @@ class WorkerScene(QObject):
         threshold : float as string - scene detection threshold
         splitting_output : string - path of the split.txt output
         ffmpeg_path : path to ffmpeg
+        index_file : string - path of the source index
+        range_count : int - amount of time ranges which are analysed at the same time
+        analysis : int - full resolution or fast analysis (splitting.ANALYSIS_MODES)
+        min_length : int - scenes shorter than this (seconds) are merged, 0 = off
+        max_length : int - scenes longer than this (seconds) are split, 0 = off
+        cache_dir : string - folder of the scene cache
         """
-        cmd = "\"" + ffmpeg_path + "\"" + " -i " + "\"" + video_input + "\"" + " -hide_banner -loglevel 32 -filter_complex select=" + "\"" + "gt(scene\\," + threshold + "),select=eq(key\\,1),showinfo" + "\"" + " -an -f null -"
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,universal_newlines=True, shell=True)
-
-        temp = []
-        for line in process.stdout:
-            if "pts_time:" in line:
-                temp.append(line)
-
-        joined = ''.join(temp).split()
-        scenes = []
-        for value in joined:
-            if "pts_time:" in value:
-                scenes.append(value[9:])
-
-        # Delete splits.txt file to avoid conflicts from previous attempts
-        if os.path.exists(splitting_output):
-            os.remove(splitting_output)
-
-        # Create / Open split.txt file
-        out_file = open(splitting_output, "a")
-
-        # FFmpeg Args
-        previous_scene = "0.000"
-        for time_stamp in scenes:
-            out_file.write("-ss " + previous_scene + " -to  " + time_stamp + "\n")
-            previous_scene = time_stamp
-        # Add last seeking argument
-        out_file.write("-ss " + previous_scene)
-        out_file.close()
-        self.finished.emit()
+        # Like engine.stream_scenes(), the encode waits for the end of the live queue
+        error = ""
+        try:
+            splitting.detect_scenes(video_input, threshold, splitting_output, ffmpeg_path, index_file, range_count, analysis, min_length, max_length, cache_dir, self.scene_found.emit)
+        except (OSError, ValueError, RuntimeError) as exception:
+            error = str(exception) or type(exception).__name__
+        finally:
+            self.finished.emit(error)
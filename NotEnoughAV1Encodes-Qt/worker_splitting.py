@@ -1,11 +1,11 @@
 """
-This script splits the video into n-seconds long chunks.
-
-Author: Alkl58
-Date: 05.03.2021
+This script splits the source for the equal chunking: it writes splits.txt
+from the keyframes of the index, or the lossless chunk files, several ranges
+at the same time while the first chunks already encode.
 """
-import subprocess
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+import engine
+import splitting
 
 
 class WorkerSplitting(QObject):
@@ -14,20 +14,37 @@ class WorkerSplitting(QObject):
 
     Signals
     ----------
-    finished : emit a signal if work is finished
+    finished : emits the chunks which could not be split if work is finished
+    keyframes_split : emits the error of the keyframe splitting if it failed, an empty string otherwise
     """
-    finished = pyqtSignal()
+    finished = pyqtSignal(list)
+    keyframes_split = pyqtSignal(str)
+    @pyqtSlot()
+    def run(self, job, process_count, live_queue):
+        """
+        Attributes
+        ----------
+        job : engine.Job - job with the generated queue
+        process_count : int - amount of ffmpeg processes which split at the same time
+        live_queue : queue.Queue - receives every chunk as soon as its file is written
+        """
+        self.finished.emit(engine.split_into_queue(job, process_count, live_queue))
+
     @pyqtSlot()
-    def run(self, video_input, video_codec, seg_time, splitting_output, ffmpeg_path):
+    def run_keyframes(self, video_input, seg_time, splitting_output, index_file):
         """
         Attributes
         ----------
         video_input : string - path of the video input file
-        video_codec : string - video codec for reencoding while splitting (x264, utvideo, ffv1)
         seg_time : int as string - chunk length in seconds
-        splitting_output : string - path of the chunked video output
-        ffmpeg_path : path to ffmpeg
+        splitting_output : string - path of the split.txt output
+        index_file : string - path of the source index
         """
-        cmd = "\"" + ffmpeg_path + "\"" + " -i " + "\"" + video_input + "\"" + " -hide_banner -loglevel 32 -map_metadata -1 -c:v " + video_codec + " -f segment -segment_time " + seg_time + " \"" + splitting_output + "\""
-        subprocess.call(cmd, shell=True)
-        self.finished.emit()
+        # Reading a large index takes a while, the GUI thread stays responsive
+        error = ""
+        try:
+            splitting.split_keyframes(video_input, seg_time, splitting_output, index_file)
+        except (OSError, ValueError, TypeError) as exception:
+            error = str(exception) or type(exception).__name__
+        finally:
+            self.keyframes_split.emit(error)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the app are imported by name, like NotEnoughAV1Encodes-Qt.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "NotEnoughAV1Encodes-Qt"))
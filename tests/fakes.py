@@ -0,0 +1,16 @@
+"""
+Stand-ins for ffprobe / ffmpeg / the encoders, written as small python scripts
+"""
+import os
+import sys
+import stat
+
+
+def write_tool(path, source):
+    """
+    Writes an executable python script, returns its path
+    """
+    with open(path, 'w') as tool:
+        tool.write("#!" + sys.executable + "\n" + source)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return str(path)
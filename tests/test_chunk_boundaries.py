@@ -0,0 +1,143 @@
+import json
+import shlex
+from decimal import Decimal
+
+import pytest
+
+import commands
+import source_index
+import splitting
+from .fakes import write_tool
+
+TIMEBASE = 90000
+
+FFPROBE = """
+import json, sys
+data = json.load(open(%r))
+if "packet=pts_time,dts_time,flags" in " ".join(sys.argv):
+    for pts, flags in data['packets']:
+        print("%%.6f,N/A,%%s" %% (pts / data['timebase'], flags))
+else:
+    print(json.dumps({'format': {'start_time': "%%.6f" %% (data['start'] / data['timebase']), 'duration': "%%.6f" %% data['duration']},
+                      'streams': [{'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080, 'r_frame_rate': data['rate']}]}))
+"""
+
+
+def make_source(tmp_path, frame_ticks, start, frames, gop):
+    """
+    Returns (source, index, presentation timestamps in ticks) of a fake source with B-frames:
+    the packets are listed in decoding order, like ffprobe does
+    """
+    pts = [start + i * frame_ticks for i in range(frames)]
+    packets = []
+    for i in range(0, frames, gop):
+        packets.append((pts[i], "K_"))
+        # The reference frame of a group is decoded before the two frames shown ahead of it
+        rest = pts[i + 1:min(i + gop, frames)]
+        for j in range(0, len(rest), 3):
+            group = rest[j:j + 3]
+            packets += [(value, "__") for value in group[-1:] + group[:-1]]
+    data = {'timebase': TIMEBASE, 'start': start, 'duration': frames * frame_ticks / TIMEBASE, 'rate': "%d/%d" % (TIMEBASE, frame_ticks), 'packets': packets}
+    (tmp_path / "packets.json").write_text(json.dumps(data))
+    ffprobe = write_tool(tmp_path / "ffprobe", FFPROBE % str(tmp_path / "packets.json"))
+    source = tmp_path / "source.mkv"
+    source.write_bytes(b"\0")
+    index = source_index.get_index(str(source), str(tmp_path / "index.json"), ffprobe)
+    return str(source), index, pts
+
+
+def get_chunk_frames(seek_point, pts, start):
+    """
+    Returns the frames ffmpeg outputs for the seek arguments of a chunk: -ss / -t are relative to
+    the start of the source and frame accurate, in microseconds like AV_TIME_BASE
+    """
+    arguments = commands.get_seek_arguments(seek_point).split()
+    begin = int(Decimal(arguments[arguments.index("-ss") + 1]) * 1000000)
+    end = begin + int(Decimal(arguments[arguments.index("-t") + 1]) * 1000000) if "-t" in arguments else None
+    frames = []
+    for number, value in enumerate(pts):
+        time_us = (value - start) * 1000000 // TIMEBASE
+        if time_us >= begin and (end is None or time_us < end):
+            frames.append(number)
+    return frames
+
+
+def assert_tiled(seek_points, pts, start, keyframe_numbers):
+    covered = []
+    for seek_point in seek_points:
+        frames = get_chunk_frames(seek_point, pts, start)
+        assert frames, "empty chunk " + seek_point
+        # Every chunk starts at a keyframe and holds consecutive frames
+        assert frames[0] in keyframe_numbers
+        assert frames == list(range(frames[0], frames[-1] + 1))
+        covered += frames
+    # No gap and no overlap: every frame is in exactly one chunk
+    assert covered == list(range(len(pts)))
+
+
+SOURCES = [
+    # frame duration (ticks), start time (ticks)
+    (3600, 0),          # 25 fps
+    (3600, 126000),     # 25 fps, starts at 1.4 s
+    (3003, 7507),       # 29.97 fps, starts at 0.083411 s
+]
+
+
+@pytest.mark.parametrize("frame_ticks,start", SOURCES)
+def test_equal_chunks_tile_the_source(tmp_path, frame_ticks, start):
+    source, index, pts = make_source(tmp_path, frame_ticks, start, 600, 48)
+    assert index['start_time'] == pytest.approx(start / TIMEBASE, abs=1e-6)
+    splits_file = str(tmp_path / "splits.txt")
+    splitting.split_keyframes(source, "5", splits_file, str(tmp_path / "index.json"))
+    with open(splits_file) as file_splits:
+        seek_points = file_splits.read().split("\n")
+    assert len(seek_points) > 2
+    assert_tiled(seek_points, pts, start, {number for number, _ in index['keyframes']})
+
+
+@pytest.mark.parametrize("frame_ticks,start", SOURCES)
+def test_scene_chunks_tile_the_source(tmp_path, frame_ticks, start):
+    source, index, pts = make_source(tmp_path, frame_ticks, start, 600, 24)
+    # ffmpeg prints pts_time with 6 significant digits, relative to the start of the source
+    scenes = [splitting.snap_scene(index, "%g" % ((pts[number] - start) / TIMEBASE)) for number in (48, 120, 312, 576)]
+    assert_tiled(splitting.get_split_lines(scenes), pts, start, {number for number, _ in index['keyframes']})
+
+
+def get_command_range(command):
+    """
+    Returns (-ss, -t) of the ffmpeg call of a chunk command as Decimal, -t is None if the chunk runs to the end
+    """
+    arguments = shlex.split(command.split(" | ")[0])
+    start = Decimal(arguments[arguments.index("-ss") + 1])
+    duration = Decimal(arguments[arguments.index("-t") + 1]) if "-t" in arguments else None
+    return start, duration
+
+
+@pytest.mark.parametrize("frame_ticks,start", SOURCES)
+def test_chunk_commands_cover_every_frame_once(tmp_path, frame_ticks, start):
+    source, index, pts = make_source(tmp_path, frame_ticks, start, 600, 48)
+    splits_file = str(tmp_path / "splits.txt")
+    splitting.split_keyframes(source, "5", splits_file, str(tmp_path / "index.json"))
+    with open(splits_file) as file_splits:
+        seek_points = file_splits.read().split("\n")
+    preset = {'video_encoder': 0, 'video_passes': 0, 'video_bit_depth': 0, 'video_color_fmt': 0, 'video_speed': 4, 'video_q': True, 'video_q_amount': 30, 'video_vbr': False}
+    encoder = commands.get_encoder_settings(preset, {'aomenc': "aomenc"})
+    ranges = []
+    for seek_point in seek_points:
+        seek_args = commands.get_seek_arguments(seek_point)
+        command, _ = commands.get_chunk_commands("ffmpeg", seek_args + ' -i "' + source + '"', "yuv420p", "", encoder, False, False, "chunk.ivf", "chunk.stats", ["chunk.log"], "/dev/null")
+        ranges.append(get_command_range(command))
+        assert commands.get_seek_range(seek_args) == tuple(None if value is None else str(value) for value in ranges[-1])
+    # Every chunk ends exactly where the next one starts, the last one runs until the end of the source
+    assert ranges[0][0] == 0
+    for (first, duration), (second, _) in zip(ranges, ranges[1:]):
+        assert duration is not None and first + duration == second
+    assert ranges[-1][1] is None
+    # Frame accurate -ss / -t in microseconds, like AV_TIME_BASE
+    counts = []
+    for begin, duration in ranges:
+        begin = int(begin * 1000000)
+        end = begin + int(duration * 1000000) if duration is not None else None
+        counts.append(sum(1 for value in pts if (value - start) * 1000000 // TIMEBASE >= begin and (end is None or (value - start) * 1000000 // TIMEBASE < end)))
+    assert all(counts)
+    assert sum(counts) == index['frame_count'] == len(pts)
@@ -0,0 +1,82 @@
+import commands
+
+TOOLS = {'ffmpeg': "ffmpeg", 'ffprobe': "ffprobe", 'aomenc': "aomenc", 'rav1e': "rav1e", 'svtav1': "SvtAv1EncApp"}
+
+ADVANCED = {
+    'aomenc_threads': 8, 'aomenc_tile_rows': 1, 'aomenc_tile_cols': 2, 'aomenc_gop': 240, 'aomenc_lag_in_frames': 35,
+    'aomenc_tune': "ssim", 'aomenc_aq_mode': 1, 'aomenc_color_primaries': "bt709", 'aomenc_color_transfer': "bt709",
+    'aomenc_color_matrix': "bt709", 'aomenc_denoise': True, 'aomenc_denoise_level': 10,
+    'rav1e_threads': 4, 'rav1e_tile_rows': 0, 'rav1e_tile_cols': 1, 'rav1e_gop': 240, 'rav1e_range': "limited",
+    'rav1e_color_primaries': "BT709", 'rav1e_color_transfer': "BT709", 'rav1e_color_matrix': "BT709", 'rav1e_tune': "Psnr",
+    'rav1e_content_light': True, 'rav1e_cll': 1000, 'rav1e_fall': 400, 'rav1e_mastering': True,
+    'rav1e_mastering_display': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+    'svt_tile_cols': 1, 'svt_tile_rows': 0, 'svt_gop': 240, 'svt_aq': 2
+}
+
+
+def make_preset(encoder=0, advanced=False, **values):
+    preset = {'video_encoder': encoder, 'video_passes': 0, 'video_bit_depth': 0, 'video_color_fmt': 0, 'video_speed': 5,
+              'video_q': True, 'video_vbr': False, 'video_q_amount': 30, 'video_vbr_amount': 0, 'video_advanced': advanced}
+    preset.update(values)
+    return preset
+
+
+def test_advanced_settings_come_from_the_preset():
+    assert commands.get_advanced_settings(make_preset(0, False, **ADVANCED)) is None
+    aomenc = commands.get_advanced_settings(make_preset(0, True, **ADVANCED))
+    assert " --threads=8 --tile-rows=1 --tile-columns=2 --kf-max-dist=240" in aomenc
+    assert aomenc.endswith(" --denoise-noise-level=10")
+    rav1e = commands.get_advanced_settings(make_preset(1, True, **ADVANCED))
+    assert " --content-light 1000,400" in rav1e
+    assert rav1e.endswith(" --mastering-display G(1,2)B(3,4)R(5,6)WP(7,8)L(9,10)")
+    assert commands.get_advanced_settings(make_preset(2, True, **ADVANCED)) == " --tile-columns 1 --tile-rows 0 --keyint 240 --adaptive-quantization 2"
+
+
+def test_headless_advanced_encode_uses_the_stored_settings():
+    preset = make_preset(2, True, **ADVANCED)
+    settings = commands.get_encoder_settings(preset, TOOLS, None, commands.get_advanced_settings(preset))['settings']
+    assert settings == '"SvtAv1EncApp" -i stdin --preset 5 --rc 0 -q 30 --tile-columns 1 --tile-rows 0 --keyint 240 --adaptive-quantization 2'
+    assert commands.get_custom_settings(dict(preset, video_custom=False, command_line="custom")) is None
+    assert commands.get_custom_settings(dict(preset, video_custom=True, command_line="custom")) == "custom"
+
+
+def test_old_advanced_presets_use_the_command_line():
+    preset = make_preset(0, True, command_line="aomenc - --cpu-used=3")
+    assert commands.get_advanced_settings(preset) is None
+    assert commands.get_custom_settings(preset) == "aomenc - --cpu-used=3"
+    assert commands.get_custom_settings(make_preset(0, False, command_line="aomenc")) is None
+
+
+def make_audio_preset(enabled, layout=0):
+    preset = {}
+    for track in commands.AUDIO_TRACKS:
+        preset.update({'track_' + track: track in enabled, 'track_' + track + '_codec': 0, 'track_' + track + '_bitrate': 128,
+                       'track_' + track + '_layout': layout, 'track_' + track + '_language': 0})
+    return preset
+
+
+def test_audio_channel_layouts():
+    # Layout combo box: Mono, Stereo, 5.1, 7.1
+    channels = [commands.get_audio_tracks(make_audio_preset(["one"], layout))[0][1].split(" -ac:a:0 ")[1].split()[0] for layout in range(4)]
+    assert channels == ["1", "2", "6", "8"]
+
+
+def test_audio_track_four_does_not_depend_on_track_three():
+    assert [index for index, _ in commands.get_audio_tracks(make_audio_preset(["four"]))] == [3]
+    assert [index for index, _ in commands.get_audio_tracks(make_audio_preset(["three"]))] == [2]
+    # Every track command starts with a space, joined arguments stay separate
+    assert all(command.startswith(" -map 0:a:") for _, command in commands.get_audio_tracks(make_audio_preset(commands.AUDIO_TRACKS)))
+
+
+def test_crop_filter_uses_the_crop_values():
+    preset = {'filters_crop': True, 'filters_crop_top': 10, 'filters_crop_right': 20, 'filters_crop_bottom': 30, 'filters_crop_left': 40,
+              'filters_deinterlace': False, 'filters_rotate': False, 'filters_resize': False}
+    assert commands.get_video_filters(preset) == " -vf crop=iw-60:ih-40:40:10"
+
+
+def test_svt_options_follow_the_advanced_switch():
+    # They used to depend on the rav1e content light checkbox
+    basic = make_preset(2, False, **dict(ADVANCED, rav1e_content_light=False))
+    assert "--tile-columns" not in commands.get_encoder_settings(basic, TOOLS, None, commands.get_advanced_settings(basic))['settings']
+    advanced = make_preset(2, True, **dict(ADVANCED, rav1e_content_light=True))
+    assert "--tile-columns 1" in commands.get_encoder_settings(advanced, TOOLS, None, commands.get_advanced_settings(advanced))['settings']
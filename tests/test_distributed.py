@@ -0,0 +1,186 @@
+import os
+import json
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import commands
+import distributed
+import ivf
+from .fakes import write_tool
+
+TOKEN = "secret"
+
+# Writes the seek range as first line of the pipe and the progress of 10 frames per second
+FFMPEG = """
+import sys
+arguments = sys.argv[1:]
+start = float(arguments[arguments.index("-ss") + 1])
+duration = float(arguments[arguments.index("-t") + 1])
+open(arguments[arguments.index("-i") + 1], 'rb').close()
+frames = round(duration * 10)
+with open(arguments[arguments.index("-progress") + 1], 'w') as progress:
+    progress.write("frame=%d\\nprogress=end\\n" % frames)
+sys.stdout.write("%d %d\\n" % (round(start * 10), frames))
+"""
+
+# Writes an .ivf with the pts of the frames it got
+AOMENC = """
+import sys, struct
+first, count = [int(value) for value in sys.stdin.read().split()]
+output = [argument for argument in sys.argv if argument.startswith("--output=")][0][9:]
+with open(output, 'wb') as ivf_file:
+    ivf_file.write(b"DKIF" + struct.pack('<HH4sHHIIII', 0, 32, b"AV01", 1920, 1080, 24, 1, count, 0))
+    for pts in range(first, first + count):
+        ivf_file.write(struct.pack('<IQ', 1, pts) + b"\\0")
+"""
+
+
+class FakeJob:
+    def __init__(self, tmp_path, splits):
+        self.video_input = str(tmp_path / "source.mkv")
+        with open(self.video_input, 'wb') as source:
+            source.write(os.urandom(4096))
+        self.chunks_path = tmp_path / "Chunks"
+        self.chunks_path.mkdir()
+        self.preset = {'video_encoder': 0, 'video_passes': 0, 'video_color_fmt': 0, 'video_bit_depth': 1, 'video_speed': 4,
+                       'video_q': True, 'video_q_amount': 30, 'video_vbr': False, 'video_vbr_amount': 0}
+        self.preset.update({key: False if key in ('filters_crop', 'filters_resize', 'filters_rotate', 'filters_deinterlace') else 0 for key in distributed.FILTER_KEYS})
+        # Local paths of the coordinator, the agents use their own encoders
+        self.encoder = commands.get_encoder_settings(self.preset, {'aomenc': "/usr/local/bin/aomenc"})
+        self.pipe_color_fmt = commands.get_pipe_color_fmt(self.preset)
+        self.filter_command = commands.get_video_filters(self.preset)
+        self.splits = splits
+        self.queue_names = ["split%06d" % i for i in range(len(splits))]
+        self.queue_costs = [1] * len(splits)
+        self.lines = []
+
+    def get_chunk_inputs(self):
+        return [(name, self.video_input, commands.get_seek_arguments(seek_point), self.filter_command, 1) for name, seek_point in zip(self.queue_names, self.splits)]
+
+    def get_chunks_path(self):
+        return str(self.chunks_path)
+
+    def log(self, line):
+        self.lines.append(line)
+
+
+@pytest.fixture
+def agents(tmp_path, monkeypatch):
+    """
+    Returns two agents listening on 127.0.0.1 as (address, agent, log lines)
+    """
+    monkeypatch.setattr(distributed, "POLL_INTERVAL", 0.05)
+    tools = {'ffmpeg': write_tool(tmp_path / "ffmpeg", FFMPEG), 'aomenc': write_tool(tmp_path / "aomenc", AOMENC)}
+    tools['rav1e'] = tools['svtav1'] = tools['aomenc']
+    started = []
+    for number in range(2):
+        lines = []
+        agent = distributed.Agent(str(tmp_path / ("agent" + str(number))), tools, 1, TOKEN, lines.append)
+        server = distributed.start_server("127.0.0.1", 0, agent)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        started.append((server, agent, lines))
+    yield [("127.0.0.1:" + str(server.server_address[1]), agent, lines) for server, agent, lines in started]
+    for server, _, _ in started:
+        server.shutdown()
+        server.server_close()
+
+
+def post_chunk(address, data, token=TOKEN):
+    request = urllib.request.Request("http://" + address + "/chunks/00ff", json.dumps(data).encode(), {"X-Token": token}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def test_chunks_are_encoded_on_both_agents(tmp_path, agents):
+    splits = ["%d %d" % (second, second + 2) for second in range(0, 10, 2)] + ["10.0 11.5"]
+    job = FakeJob(tmp_path, splits)
+    finished = []
+    distributed.encode_chunks(job, [address for address, _, _ in agents], TOKEN, lambda name, success: finished.append((name, success)), lambda frames: None)
+    assert sorted(finished) == [(name, True) for name in job.queue_names]
+    for name, seek_point in zip(job.queue_names, splits):
+        start, end = [float(value) for value in seek_point.split()]
+        assert ivf.count_frames(str(job.chunks_path / (name + ".ivf"))) == round((end - start) * 10)
+    for _, agent, lines in agents:
+        assert any(line.startswith("Chunk done") for line in lines)
+        # The source is removed once the job is done
+        assert os.listdir(os.path.join(agent.work_dir, "Inputs")) == []
+        assert os.listdir(os.path.join(agent.work_dir, "Chunks")) == []
+
+
+def test_agent_refuses_commands_and_files(agents):
+    address = agents[0][0]
+    chunk = {'name': "split000000", 'input': "00aa", 'start': "0.0", 'duration': "2", 'filters': {}, 'color': {'video_color_fmt': 0, 'video_bit_depth': 1},
+             'encoder': "aomenc", 'passes': 1, 'arguments': ["--cpu-used=4"], 'delete_input': False}
+    # Valid, but the input was never uploaded
+    assert post_chunk(address, chunk) == 409
+    assert post_chunk(address, chunk, "wrong") == 403
+    assert post_chunk(address, {'name': "split000000", 'input': "00aa", 'commands': ["touch /tmp/x"]}) == 400
+    for changes in ({'arguments': ["--output=/tmp/x.ivf"]}, {'arguments': ["--fpf", "x"]}, {'arguments': ["$(touch x)"]}, {'arguments': ["a b"]},
+                    {'start': "0; touch x"}, {'encoder': "sh"}, {'encoder': "rav1e", 'passes': 2}, {'color': {'video_color_fmt': "0; touch x", 'video_bit_depth': 1}},
+                    {'name': "../x"}):
+        assert post_chunk(address, dict(chunk, **changes)) == 400
+
+
+def test_remote_arguments():
+    preset = {'video_encoder': 2, 'video_passes': 0, 'video_speed': 6, 'video_q': True, 'video_q_amount': 30, 'video_vbr': False}
+    encoder = commands.get_encoder_settings(preset, {'svtav1': "C:\\Program Files\\svt\\SvtAv1EncApp.exe"})
+    assert distributed.get_encoder_arguments(encoder['settings'], 2) == ["--preset", "6", "--rc", "0", "-q", "30"]
+    with pytest.raises(ValueError):
+        distributed.get_encoder_arguments('"svt" -i stdin --preset 6 --fgs-table table.txt', 2)
+
+
+def test_token_is_required_off_loopback(tmp_path):
+    agent = distributed.Agent(str(tmp_path / "agent"), {}, 1, None, lambda line: None)
+    with pytest.raises(ValueError):
+        distributed.start_server("0.0.0.0", 0, agent)
+    assert distributed.is_loopback("localhost") and distributed.is_loopback("::1")
+    assert not distributed.is_loopback("192.168.1.2")
+
+
+def test_rejected_chunk_fails_and_keeps_the_agent(tmp_path, agents):
+    job = FakeJob(tmp_path, ["%d %d" % (second, second + 1) for second in range(4)])
+    finished = []
+    coordinator = distributed.Coordinator(job, [address for address, _, _ in agents], TOKEN, lambda name, success: finished.append((name, success)), lambda frames: None)
+    # The agents refuse to set the stats file
+    coordinator.pending[0]['data'] = dict(coordinator.pending[0]['data'], arguments=["--fpf=stats.log"])
+    rejected = coordinator.pending[0]['name']
+    coordinator.run()
+    assert sorted(finished) == sorted((name, name != rejected) for name in job.queue_names)
+    assert not coordinator.lost
+    assert not any("lost" in line for line in job.lines)
+
+
+def put_input(address, key, body, headers=None):
+    request = urllib.request.Request("http://" + address + "/inputs/" + key, body, dict(headers or {}, **{"X-Token": TOKEN}), method="PUT")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def test_inputs_are_stored_by_content(tmp_path, agents):
+    address, agent, _ = agents[0]
+    body = b"source" * 100
+    key = hashlib.sha256(body).hexdigest()
+    assert put_input(address, hashlib.sha256(b"other").hexdigest(), body) == 400
+    assert put_input(address, key, body, {"Content-Length": str(1 << 60)}) == 413
+    assert put_input(address, key, body) == 201
+    assert os.listdir(os.path.join(agent.work_dir, "Inputs")) == [key]
+    # A copy of the same file at another path isn't uploaded again
+    first, second = tmp_path / "first.mkv", tmp_path / "second.mkv"
+    first.write_bytes(body)
+    second.write_bytes(body)
+    coordinator = distributed.Coordinator(FakeJob(tmp_path, ["0 1"]), [address], TOKEN, lambda name, success: None, lambda frames: None)
+    requests = []
+    request = coordinator.request
+    coordinator.request = lambda agent, method, path, *args: requests.append(method) or request(agent, method, path, *args)
+    assert coordinator.upload(address, str(first)) == coordinator.upload(address, str(second)) == key
+    assert requests == ["HEAD", "HEAD"]
@@ -0,0 +1,41 @@
+import fanout
+from .fakes import write_tool
+
+DECODER = """
+import sys
+sys.stdout.buffer.write(b"YUV4MPEG2 W4 H2 F24:1 C420jpeg\\n")
+for number in range(%d):
+    sys.stdout.buffer.write(b"FRAME\\n" + bytes([number %% 256]) * 12)
+"""
+
+ENCODER = """
+import sys
+sys.stdin.buffer.read()
+"""
+
+
+def test_frame_size():
+    assert fanout.get_frame_size(b"YUV4MPEG2 W4 H2 F24:1 C420jpeg\n") == 12
+    # 4K 10 bit: every sample takes 2 bytes
+    assert fanout.get_frame_size(b"YUV4MPEG2 W3840 H2160 F24:1 C420p10 XYSCSS=420P10\n") == 3840 * 2160 * 3
+    assert fanout.get_frame_size(b"YUV4MPEG2 W3840 H2160 F24:1 C444p12\n") == 3840 * 2160 * 6
+
+
+def test_parallel_encoders():
+    chunks = [("split%06d" % i, i * 240, 240) for i in range(8)] + [("split000008", 1920, None)]
+    frame_size = 3840 * 2160 * 3
+    # A quarter of 32 GiB holds one 10 s chunk of 4K 10 bit frames (6 GB)
+    assert fanout.get_parallel_encoders(8 * 1024 ** 3, frame_size, chunks) == 2
+    assert fanout.get_parallel_encoders(64 * 1024 ** 3, frame_size, chunks) == 12
+    assert fanout.get_parallel_encoders(1024, frame_size, [("split000000", 0, None)]) == 1
+
+
+def test_small_memory_limit_warns_and_encodes_all_chunks(tmp_path):
+    decoder = write_tool(tmp_path / "decoder", DECODER % 40)
+    encoder = write_tool(tmp_path / "encoder", ENCODER)
+    chunks = [("split%06d" % i, i * 10, 10 if i < 3 else None, "\"" + encoder + "\"", None, str(tmp_path / ("split%06d.log" % i))) for i in range(4)]
+    finished = []
+    log = []
+    fanout.FanOut(4, 200, lambda name, success: finished.append((name, success)), log.append).run("\"" + decoder + "\"", chunks)
+    assert sorted(finished) == [(chunk[0], True) for chunk in chunks]
+    assert any("only about 2 of 4 Encoders" in line for line in log)
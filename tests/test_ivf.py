@@ -0,0 +1,54 @@
+import struct
+
+import ivf
+
+
+def write_ivf(path, pts_values, frame_size=5):
+    """
+    Writes an .ivf with one frame per timestamp, returns its path
+    """
+    header = ivf.IVF_SIGNATURE + struct.pack('<HH4sHHIIII', 0, ivf.IVF_HEADER_SIZE, b"AV01", 1920, 1080, 24, 1, len(pts_values), 0)
+    with open(path, 'wb') as ivf_file:
+        ivf_file.write(header)
+        for pts in pts_values:
+            ivf_file.write(struct.pack('<IQ', frame_size, pts) + bytes([pts % 256]) * frame_size)
+    return str(path)
+
+
+def read_pts(path):
+    pts_values = []
+    with open(path, 'rb') as ivf_file:
+        ivf_file.seek(ivf.IVF_HEADER_SIZE)
+        while True:
+            frame_header = ivf_file.read(ivf.IVF_FRAME_HEADER_SIZE)
+            if not frame_header:
+                return pts_values
+            frame_size, pts = struct.unpack('<IQ', frame_header)
+            ivf_file.read(frame_size)
+            pts_values.append(pts)
+
+
+def test_count_frames(tmp_path):
+    path = write_ivf(tmp_path / "chunk.ivf", range(10))
+    assert ivf.count_frames(path) == 10
+    assert ivf.count_frames(str(tmp_path / "missing.ivf")) is None
+    assert ivf.count_frames(write_ivf(tmp_path / "empty.ivf", [])) is None
+
+
+def test_truncated_file_is_not_complete(tmp_path):
+    path = write_ivf(tmp_path / "chunk.ivf", range(10))
+    with open(path, 'rb+') as ivf_file:
+        ivf_file.truncate(ivf.IVF_HEADER_SIZE + 3 * (ivf.IVF_FRAME_HEADER_SIZE + 5) + 2)
+    assert ivf.count_frames(path) is None
+
+
+def test_join_files_continues_the_timestamps(tmp_path):
+    first = write_ivf(tmp_path / "a.ivf", [0, 2, 4])
+    second = write_ivf(tmp_path / "b.ivf", [100, 102])
+    output = str(tmp_path / "joined.ivf")
+    ivf.join_files([first, second], output)
+    assert ivf.count_frames(output) == 5
+    assert read_pts(output) == [0, 2, 4, 6, 8]
+    with open(output, 'rb') as ivf_file:
+        # Frame count of the stream header is unknown
+        assert struct.unpack('<I', ivf_file.read(ivf.IVF_HEADER_SIZE)[24:28])[0] == 0
@@ -0,0 +1,69 @@
+import sys
+import threading
+
+import job_queue
+
+
+def test_jobs_run_in_order_and_are_kept(tmp_path):
+    queue_file = str(tmp_path / "queue.json")
+    jobs = job_queue.JobQueue(queue_file)
+    first = jobs.add("a.mkv", "a.webm", "Default", {'worker_count': 4})
+    second = jobs.add("b.mkv", "b.webm", "Default", {'worker_count': 4})
+    assert (first, second) == (1, 2)
+    assert jobs.next_queued()['id'] == first
+    # Another process sees every change
+    assert [job['state'] for job in job_queue.JobQueue(queue_file).get_jobs()] == ['running', 'queued']
+    jobs.set_state(first, 'done')
+    assert jobs.next_queued()['id'] == second
+    assert jobs.next_queued() is None
+
+
+def test_running_jobs_are_queued_again(tmp_path):
+    jobs = job_queue.JobQueue(str(tmp_path / "queue.json"))
+    job_id = jobs.add("a.mkv", "a.webm", "Default", {})
+    jobs.next_queued()
+    jobs.reset_running()
+    assert jobs.get_jobs()[0]['state'] == 'queued'
+    assert jobs.remove(job_id)
+    assert not jobs.remove(job_id)
+    assert jobs.add("b.mkv", "b.webm", "Default", {}) == job_id + 1
+
+
+class SlowJob:
+    """
+    Records if the runner lock was free while a chunk got marked as finished
+    """
+    def __init__(self, runner):
+        self.runner = runner
+        self.lock_free = []
+
+    def chunk_finished(self, name, success):
+        # The lock is reentrant, it has to be taken from another thread
+        probe = threading.Thread(target=self.probe)
+        probe.start()
+        probe.join()
+        return success
+
+    def probe(self):
+        acquired = self.runner.condition.acquire(timeout=5)
+        if acquired:
+            self.runner.condition.release()
+        self.lock_free.append(acquired)
+
+
+def test_chunks_are_marked_finished_outside_the_runner_lock(tmp_path):
+    runner = job_queue.QueueRunner(job_queue.JobQueue(str(tmp_path / "queue.json")), 2, str(tmp_path), {}, lambda line: None)
+    finished = []
+    runner.finish = finished.append
+    job = SlowJob(runner)
+    command = '"' + sys.executable + '" -c pass'
+    state = {'id': 1, 'job': job, 'audio': None, 'pending': [("split%06d" % i, [command]) for i in range(4)], 'running': 0, 'failed': [], 'order': 0}
+    runner.active.append(state)
+    runner.prepared_all = True
+    workers = [threading.Thread(target=runner.work) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert job.lock_free == [True] * 4
+    assert finished == [state] and state['failed'] == []
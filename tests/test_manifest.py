@@ -0,0 +1,39 @@
+import manifest
+from .test_ivf import write_ivf
+
+SOURCE = {'path': "/videos/source.mkv", 'size': 100, 'mtime': 1.0}
+
+
+def test_round_trip_and_other_source(tmp_path):
+    manifest_file = str(tmp_path / "manifest.json")
+    assert manifest.load_manifest(manifest_file, SOURCE) == manifest.new_manifest(SOURCE)
+    job_manifest = manifest.new_manifest(SOURCE)
+    manifest.set_stage(job_manifest, 'splitting', "a", True, ["0.000 5.0", "5.0"])
+    manifest.save_manifest(job_manifest, manifest_file)
+    assert manifest.load_manifest(manifest_file, SOURCE) == job_manifest
+    # A modified source starts over
+    assert manifest.load_manifest(manifest_file, dict(SOURCE, size=101)) == manifest.new_manifest(dict(SOURCE, size=101))
+
+
+def test_changed_settings_reset_the_chunks():
+    job_manifest = manifest.new_manifest(SOURCE)
+    manifest.set_stage(job_manifest, 'splitting', "a", True)
+    manifest.set_stage(job_manifest, 'encoding', "b", False)
+    manifest.set_chunk_done(job_manifest, "split000000", 10)
+    assert manifest.is_stage_done(job_manifest, 'splitting', "a")
+    assert not manifest.is_stage_done(job_manifest, 'splitting', "c")
+    assert not manifest.is_stage_done(job_manifest, 'encoding', "b")
+    manifest.set_stage(job_manifest, 'encoding', "b", True)
+    assert manifest.get_chunk_frames(job_manifest, "split000000") == 10
+    manifest.set_stage(job_manifest, 'encoding', "c", False)
+    assert job_manifest['chunks'] == {}
+
+
+def test_chunk_done_needs_a_complete_ivf(tmp_path):
+    job_manifest = manifest.new_manifest(SOURCE)
+    path = write_ivf(tmp_path / "split000000.ivf", range(10))
+    assert not manifest.is_chunk_done(job_manifest, "split000000", path)
+    manifest.set_chunk_done(job_manifest, "split000000", 10)
+    assert manifest.is_chunk_done(job_manifest, "split000000", path)
+    manifest.set_chunk_done(job_manifest, "split000000", 11)
+    assert not manifest.is_chunk_done(job_manifest, "split000000", path)
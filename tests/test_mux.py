@@ -0,0 +1,36 @@
+import os
+
+import engine
+from .fakes import write_tool
+
+# Writes an output which passes the size check, then exits with the given code
+FFMPEG = """
+import sys
+with open(sys.argv[-1], 'wb') as output:
+    output.write(bytes(60000))
+sys.exit(%d)
+"""
+
+PRESET = {'filters_crop': False, 'filters_resize': False, 'filters_rotate': False, 'filters_deinterlace': False,
+          'video_color_fmt': 0, 'video_bit_depth': 0}
+
+
+def make_job(tmp_path, exit_code):
+    source = tmp_path / "source.mkv"
+    source.write_bytes(b"\0")
+    tools = {'ffmpeg': write_tool(tmp_path / "ffmpeg", FFMPEG % exit_code)}
+    job = engine.Job(str(source), str(tmp_path / "output.webm"), PRESET, str(tmp_path / "Temp"), tools, lambda line: None)
+    os.makedirs(job.get_chunks_path())
+    return job
+
+
+def test_failed_mux_keeps_the_temp_files(tmp_path):
+    job = make_job(tmp_path, 1)
+    assert not engine.finish_job(job, None, True)
+    assert os.path.isdir(job.temp_path)
+
+
+def test_mux(tmp_path):
+    job = make_job(tmp_path, 0)
+    assert engine.finish_job(job, None, True)
+    assert not os.path.isdir(job.temp_path)
@@ -0,0 +1,70 @@
+import sys
+import subprocess
+
+import pytest
+
+import placement
+
+
+def test_parse_cpu_list():
+    assert placement.parse_cpu_list("0-3,8-9,12\n") == [0, 1, 2, 3, 8, 9, 12]
+    assert placement.parse_cpu_list("") == []
+
+
+def test_split_evenly():
+    assert placement.split_evenly(list(range(7)), 3) == [[0, 1], [2, 3], [4, 5, 6]]
+    assert [len(part) for part in placement.split_evenly(list(range(10)), 4)] == [2, 2, 3, 3]
+
+
+def test_slots_share_cores_when_there_are_more_workers(monkeypatch):
+    monkeypatch.setattr(placement, "get_numa_nodes", lambda allowed: [list(allowed)])
+    monkeypatch.setattr(placement, "get_cores", lambda cpus: [[cpu] for cpu in cpus])
+    assert placement.get_slots(3, [0, 1]) == [[0], [1], [0]]
+
+
+def test_slot_pool():
+    pool = placement.SlotPool([[0, 1], [2, 3]])
+    slot = pool.acquire()
+    assert slot == [0, 1]
+    pool.release(slot)
+    assert pool.free == [[2, 3], [0, 1]]
+
+
+def flat_topology(monkeypatch, nodes):
+    monkeypatch.setattr(placement, "get_numa_nodes", lambda allowed: nodes)
+    monkeypatch.setattr(placement, "get_cores", lambda cpus: [[cpu] for cpu in cpus])
+
+
+def test_every_node_gets_a_slot(monkeypatch):
+    # The proportional split gave the single cpu node no slot and dropped cpu 0
+    flat_topology(monkeypatch, [[0], [1, 2, 3, 4, 5, 6, 7]])
+    slots = placement.get_slots(3, range(8))
+    assert sorted(cpu for slot in slots for cpu in slot) == list(range(8))
+    assert len(slots) == 3
+
+
+def test_slots_stay_within_their_node(monkeypatch):
+    flat_topology(monkeypatch, [list(range(8)), list(range(8, 16))])
+    for slot_count in range(2, 16):
+        slots = placement.get_slots(slot_count, range(16))
+        assert len(slots) == slot_count
+        assert sorted(cpu for slot in slots for cpu in slot) == list(range(16))
+        assert all(max(slot) < 8 or min(slot) >= 8 for slot in slots)
+
+
+@pytest.mark.skipif(sys.platform != "win32", reason="processes are only started suspended on Windows")
+def test_started_process_inherits_the_pinning():
+    cpus = placement.psutil.Process().cpu_affinity()
+    previous = list(cpus)
+    process = placement.start_pinned([sys.executable, "-c", "import psutil; print(psutil.Process().cpu_affinity())"], cpus[:1],
+                                     stdout=subprocess.PIPE, universal_newlines=True)
+    assert process.communicate()[0].strip() == str(cpus[:1])
+    # The program itself is never pinned
+    assert placement.psutil.Process().cpu_affinity() == previous
+
+
+def test_preexec_pinning():
+    cpus = placement.psutil.Process().cpu_affinity()
+    process = subprocess.Popen([sys.executable, "-c", "import os; print(sorted(os.sched_getaffinity(0)))"], stdout=subprocess.PIPE,
+                               universal_newlines=True, preexec_fn=placement.get_pinning(cpus[-1:]))
+    assert process.communicate()[0].strip() == str(cpus[-1:])
@@ -0,0 +1,87 @@
+import json
+import random
+
+import pytest
+
+import splitting
+from .fakes import write_tool
+
+RATE = 24
+
+# Scores like the select filter of ffmpeg: the difference to the previous decoded frame (mafd)
+# and its change against the previous difference, the first decoded frame scores 0
+FFMPEG = """
+import json, sys
+frames = json.load(open(%r))
+arguments = sys.argv[1:]
+seek = float(arguments[arguments.index("-ss") + 1]) if "-ss" in arguments else 0.0
+end = seek + float(arguments[arguments.index("-t") + 1]) if "-t" in arguments else float("inf")
+keyframes_only = "nokey" in arguments
+previous = None
+prev_mafd = 0.0
+for number, (time_stamp, key, value) in enumerate(frames):
+    if time_stamp < seek - 0.0000005 or time_stamp >= end - 0.0000005 or (keyframes_only and not key):
+        continue
+    score = 0.0
+    if previous is not None:
+        mafd = abs(value - previous)
+        score = min(mafd, abs(mafd - prev_mafd)) / 100
+        prev_mafd = mafd
+    previous = value
+    if key:
+        print("frame:%%d pts:%%d pts_time:%%g" %% (number, number, time_stamp))
+        print("lavfi.scene_score=%%.6f" %% score)
+"""
+
+
+def make_source(tmp_path):
+    """
+    Returns (source, ffmpeg, index) of a fake source with irregular keyframe intervals
+    """
+    generator = random.Random(7)
+    frames = []
+    keyframes = []
+    number = 0
+    while number < 40 * RATE:
+        gop = generator.choice((6, 12, 18, 30))
+        for offset in range(gop):
+            time_stamp = round((number + offset) / RATE, 6)
+            frames.append((time_stamp, offset == 0, generator.uniform(0, 255)))
+        keyframes.append([number, round(number / RATE, 6)])
+        number += gop
+    (tmp_path / "frames.json").write_text(json.dumps(frames))
+    ffmpeg = write_tool(tmp_path / "ffmpeg", FFMPEG % str(tmp_path / "frames.json"))
+    source = tmp_path / "source.mkv"
+    source.write_bytes(b"\0")
+    index = {'keyframes': keyframes, 'duration': len(frames) / RATE, 'streams': [{'codec_type': "video", 'height': 1080}]}
+    return str(source), ffmpeg, index
+
+
+@pytest.mark.parametrize("analysis", range(len(splitting.ANALYSIS_MODES)))
+def test_parallel_ranges_score_like_a_single_pass(tmp_path, analysis):
+    source, ffmpeg, index = make_source(tmp_path)
+    sequential = splitting.find_candidates(source, ffmpeg, index, 1, analysis)
+    assert len(sequential) == len(index['keyframes'])
+    for range_count in (2, 5):
+        assert splitting.find_candidates(source, ffmpeg, index, range_count, analysis) == sequential
+
+
+def test_failed_ffmpeg_raises(tmp_path):
+    source, _, index = make_source(tmp_path)
+    ffmpeg = write_tool(tmp_path / "broken", "import sys\nprint('Invalid data found when processing input')\nsys.exit(1)\n")
+    with pytest.raises(RuntimeError, match="Invalid data found"):
+        splitting.find_candidates(source, ffmpeg, index, 2)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_failed_detection_is_not_cached(tmp_path, streaming):
+    source, _, _ = make_source(tmp_path)
+    # Prints the keyframes of the whole source, then fails like a decoding error at the end
+    ffmpeg = write_tool(tmp_path / "truncated", FFMPEG % str(tmp_path / "frames.json") + "sys.exit(1)\n")
+    splits_file = tmp_path / "splits.txt"
+    cache_dir = tmp_path / "SceneCache"
+    found = []
+    with pytest.raises(RuntimeError):
+        splitting.detect_scenes(source, "0.3", str(splits_file), ffmpeg, str(tmp_path / "missing.json"), 1, 0, 0, 0, str(cache_dir), (lambda counter, line: found.append(line)) if streaming else None)
+    assert not splits_file.exists()
+    assert not cache_dir.exists() or not list(cache_dir.iterdir())
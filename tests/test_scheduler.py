@@ -0,0 +1,25 @@
+import scheduler
+
+
+def test_longest_first_beats_file_name_order():
+    # 40 short chunks and one long scene at the end of the source
+    costs = [1.0] * 40 + [30.0]
+    baseline = scheduler.simulate_makespan(costs, 8, scheduler.get_order('file_name', costs))
+    longest_first = scheduler.simulate_makespan(costs, 8, scheduler.get_order('longest_first', costs))
+    assert baseline == 35.0
+    assert longest_first == 30.0
+
+
+def test_longest_first_order():
+    assert scheduler.get_order('longest_first', [2.0, 5.0, 1.0, 3.0]) == [1, 3, 0, 2]
+
+
+def test_simulate_makespan_single_worker_is_the_sum():
+    costs = [3.0, 1.0, 2.0]
+    assert scheduler.simulate_makespan(costs, 1, scheduler.get_order('file_name', costs)) == 6.0
+
+
+def test_job_policies():
+    jobs = [{'order': 0, 'running': 3}, {'order': 1, 'running': 1}]
+    assert scheduler.get_job('fifo', jobs) == 0
+    assert scheduler.get_job('fair', jobs) == 1
@@ -0,0 +1,23 @@
+import source_index
+
+
+def make_index(times):
+    return {'keyframes': [[i * 48, time_stamp] for i, time_stamp in enumerate(times)], 'streams': []}
+
+
+def test_find_keyframe_closest_within_tolerance():
+    index = make_index([0.0, 2.0, 4.0, 6.0])
+    assert source_index.find_keyframe(index, 2.4) == [48, 2.0]
+    assert source_index.find_keyframe(index, 3.9) == [96, 4.0]
+    assert source_index.find_keyframe(index, 2.9) is None
+    assert source_index.find_keyframe(index, 2.9, 1.0) == [48, 2.0]
+    assert source_index.find_keyframe(index, 6.4) == [144, 6.0]
+    assert source_index.find_keyframe(make_index([]), 1.0) is None
+
+
+def test_keyframe_times_are_built_once():
+    index = make_index([0.0, 2.0, 4.0])
+    times = source_index.get_keyframe_times(index)
+    source_index.find_keyframe(index, 1.0)
+    assert source_index.get_keyframe_times(index) is times
+    assert times == [0.0, 2.0, 4.0]
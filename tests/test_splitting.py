@@ -0,0 +1,45 @@
+import pytest
+
+import splitting
+
+
+def every_second(count, score=0.5):
+    return [("%.6f" % second, score) for second in range(1, count)]
+
+
+def get_lengths(cuts, duration):
+    bounds = [0.0] + [float(cut) for cut in cuts] + [duration]
+    return [stop - start for start, stop in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("min_length", [1.5, 2, 3])
+def test_equal_scores_do_not_snowball(min_length):
+    # Every second is a cut of the same strength, the merged scenes stay close to the minimum
+    cuts = splitting.constrain_scenes(every_second(25), 0.3, 25.0, min_length)
+    lengths = get_lengths(cuts, 25.0)
+    assert min(lengths) >= min_length
+    assert max(lengths) < 2 * min_length + 1
+    assert len(cuts) >= 25 // (2 * min_length)
+
+
+def test_min_length_removes_the_weaker_cut():
+    candidates = [("10.000000", 0.9), ("11.000000", 0.5), ("20.000000", 0.8)]
+    assert splitting.constrain_scenes(candidates, 0.3, 30.0, 5) == ["10.000000", "20.000000"]
+
+
+def test_threshold_and_max_length():
+    candidates = [("%.6f" % second, 0.9 if second == 30 else 0.1) for second in range(1, 60)]
+    assert splitting.constrain_scenes(candidates, 0.3, 60.0) == ["30.000000"]
+    cuts = splitting.constrain_scenes(candidates, 0.3, 60.0, 0, 20)
+    assert "30.000000" in cuts
+    assert max(get_lengths(cuts, 60.0)) <= 20
+
+
+def test_split_lines():
+    assert splitting.get_split_lines(["2.5", "5.0"]) == ["0.000 2.5", "2.5 5.0", "5.0"]
+    assert splitting.get_split_lines([]) == ["0.000"]
+
+
+def test_keyframe_splits_end_at_the_first_keyframe_after_the_length():
+    keyframes = [[i * 24, i * 1.5] for i in range(10)]
+    assert splitting.get_keyframe_splits(keyframes, 4.0) == ["4.5", "9.0", "12.0"]
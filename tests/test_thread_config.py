@@ -0,0 +1,20 @@
+import thread_config
+
+
+def test_threads_are_split_over_the_workers():
+    assert thread_config.get_threads(4, 8, 16) == 3
+    assert thread_config.get_threads(1, 8, 16) == 15
+    # The workers alone saturate the cores
+    assert thread_config.get_threads(8, 8, 16) == 1
+    assert thread_config.get_threads(0, 0, 0) == 1
+
+
+def test_tiles_follow_the_threads_and_the_minimum_size():
+    assert thread_config.get_tiles(1, 1920, 1080) == (0, 0)
+    assert thread_config.get_tiles(4, 1920, 1080) == (1, 1)
+    assert thread_config.get_tiles(16, 3840, 2160) == (2, 2)
+    assert thread_config.get_tiles(16, 640, 360) == (0, 0)
+
+
+def test_unknown_resolution_uses_the_default():
+    assert thread_config.get_thread_config(2, 4, 8) == {'threads': 3, 'tile_columns': 1, 'tile_rows': 1}